@@ -0,0 +1,362 @@
+"""
+Write-behind audit log of fraud decisions
+Every scored claim is queued in memory together with its inputs, the model
+version and the prediction (risk level, top risk factors). A background
+thread writes the queue in batches, one SQLite transaction per batch, so
+scoring never waits for the disk. The table is append-only: UPDATE and
+DELETE are rejected by triggers, and claim_id is indexed for lookups.
+
+The queue is bounded. When writing falls behind, the overflow policy
+decides what is lost: 'block' waits up to block_timeout for room before
+dropping the new record, 'drop_newest' drops it at once, 'drop_oldest'
+makes room by dropping the oldest queued record. Dropped records are
+counted in stats(). close() writes everything still queued.
+
+Run: python audit_log.py --claim-id CLM-2025-1234 [...]  (look up decisions)
+     python audit_log.py --stats
+"""
+
+import argparse
+import collections
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+DEFAULT_PATH = 'prediction_audit.db'
+DEFAULT_MAX_QUEUE = 10000
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_FLUSH_INTERVAL = 1.0     # seconds
+DEFAULT_BLOCK_TIMEOUT = 0.05     # seconds, 'block' policy only
+
+OVERFLOW_POLICIES = ('block', 'drop_newest', 'drop_oldest')
+
+# Concurrent writers (pre-fork workers) wait this long for the database lock
+BUSY_TIMEOUT_MS = 5000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    id INTEGER PRIMARY KEY,
+    logged_at TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    claim_id TEXT,
+    model_version TEXT NOT NULL,
+    fraud_probability REAL NOT NULL,
+    is_fraud INTEGER NOT NULL,
+    risk_level TEXT,
+    claim TEXT NOT NULL,
+    features TEXT NOT NULL,
+    prediction TEXT NOT NULL,
+    duplicate_check TEXT
+);
+CREATE INDEX IF NOT EXISTS predictions_claim_id ON predictions (claim_id);
+CREATE TRIGGER IF NOT EXISTS predictions_no_update BEFORE UPDATE ON predictions
+BEGIN SELECT RAISE(ABORT, 'audit log is append-only'); END;
+CREATE TRIGGER IF NOT EXISTS predictions_no_delete BEFORE DELETE ON predictions
+BEGIN SELECT RAISE(ABORT, 'audit log is append-only'); END;
+"""
+
+COLUMNS = (
+    'logged_at', 'endpoint', 'claim_id', 'model_version', 'fraud_probability', 'is_fraud',
+    'risk_level', 'claim', 'features', 'prediction', 'duplicate_check'
+)
+INSERT = f"INSERT INTO predictions ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+# Columns stored as JSON text
+JSON_COLUMNS = ('claim', 'features', 'prediction', 'duplicate_check')
+
+
+class AuditLog:
+    """Bounded in-memory queue written to SQLite by a background thread"""
+
+    def __init__(self, path=DEFAULT_PATH, max_queue=DEFAULT_MAX_QUEUE, batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, overflow='block', block_timeout=DEFAULT_BLOCK_TIMEOUT):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown audit overflow policy: {overflow} (use one of {', '.join(OVERFLOW_POLICIES)})")
+
+        self.path = path
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+
+        self.queue = collections.deque()
+        self.condition = threading.Condition()
+        self.stopping = False
+        self.flush_requested = False
+        self._thread = None
+
+        self.queued = 0
+        self.written = 0
+        self.dropped = 0
+        self.evicted = 0       # queued, then dropped by 'drop_oldest'
+        self.failed = 0
+        self.max_queue_seen = 0
+        self.last_flush_ms = 0.0
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Create the table if needed and run the writer in a daemon thread"""
+        if self.running:
+            return
+
+        connection = connect(self.path)
+        connection.close()
+
+        self.stopping = False
+        self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+        self._thread.start()
+
+    def close(self, timeout=None):
+        """Stop the writer after it has written everything queued"""
+        if self._thread is None:
+            return
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def record(self, endpoint, claim, features, prediction, model_version, duplicate_check=None):
+        """Queue one decision; returns False if the overflow policy dropped a record
+
+        The dicts are serialized by the writer thread, so callers must not
+        modify them afterwards (predictions are shared with the cache).
+        """
+        return self.record_many([(endpoint, claim, features, prediction, model_version, duplicate_check)])
+
+    def record_many(self, entries):
+        """Queue (endpoint, claim, features, prediction, model_version, duplicate_check) tuples
+
+        'block' waits at most block_timeout for the whole call, not per entry.
+        """
+        logged_at = time.time()
+        deadline = time.monotonic() + self.block_timeout
+        accepted = 0
+        with self.condition:
+            dropped = self.dropped
+            for entry in entries:
+                if len(self.queue) >= self.max_queue and not self._make_room(deadline):
+                    self.dropped += 1
+                    continue
+                self.queue.append((logged_at, *entry))
+                accepted += 1
+
+            self.queued += accepted
+            self.max_queue_seen = max(self.max_queue_seen, len(self.queue))
+            if len(self.queue) >= self.batch_size:
+                self.condition.notify_all()
+            return self.dropped == dropped
+
+    def _make_room(self, deadline):
+        """Apply the overflow policy to a full queue (caller holds the condition)"""
+        if self.overflow == 'drop_oldest':
+            self.queue.popleft()
+            self.dropped += 1
+            self.evicted += 1
+            return True
+        if self.overflow == 'block' and self.running:
+            while len(self.queue) >= self.max_queue:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.condition.notify_all()
+                self.condition.wait(remaining)
+            return True
+        return False
+
+    def flush(self, timeout=None):
+        """Block until everything queued so far is written (or timeout)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            target = self.queued
+            self.flush_requested = True
+            self.condition.notify_all()
+            while self.written + self.failed + self.evicted < target and self.running:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+        return True
+
+    def stats(self):
+        with self.condition:
+            return {
+                'enabled': self.running,
+                'path': self.path,
+                'overflow': self.overflow,
+                'queue_depth': len(self.queue),
+                'max_queue': self.max_queue,
+                'max_queue_depth': self.max_queue_seen,
+                'records_queued': self.queued,
+                'records_written': self.written,
+                'records_dropped': self.dropped,
+                'records_failed': self.failed,
+                'last_flush_ms': round(self.last_flush_ms, 3)
+            }
+
+    def _run(self):
+        connection = connect(self.path)
+        try:
+            while True:
+                with self.condition:
+                    # Wait for a full batch, the flush interval, flush() or close()
+                    deadline = time.monotonic() + self.flush_interval
+                    while len(self.queue) < self.batch_size and not (self.stopping or self.flush_requested):
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self.condition.wait(remaining)
+
+                    if not self.queue:
+                        self.flush_requested = False
+                        if self.stopping:
+                            return
+                        continue
+                    batch = [self.queue.popleft() for _ in range(min(self.batch_size, len(self.queue)))]
+                    # Room for blocked producers
+                    self.condition.notify_all()
+
+                self._write(connection, batch)
+        finally:
+            connection.close()
+            with self.condition:
+                self.condition.notify_all()
+
+    def _write(self, connection, batch):
+        started = time.perf_counter()
+        try:
+            rows = [_row(*entry) for entry in batch]
+            with connection:
+                connection.executemany(INSERT, rows)
+            written, failed = len(batch), 0
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            print(f"⚠️  Audit log write failed, {len(batch)} records lost: {e}")
+            written, failed = 0, len(batch)
+
+        with self.condition:
+            self.written += written
+            self.failed += failed
+            self.last_flush_ms = (time.perf_counter() - started) * 1000.0
+            self.condition.notify_all()
+
+
+def connect(path):
+    """Connection with the audit table created, in WAL mode for concurrent readers"""
+    connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000.0)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def _row(logged_at, endpoint, claim, features, prediction, model_version, duplicate_check):
+    return (
+        datetime.fromtimestamp(logged_at).isoformat(timespec='milliseconds'),
+        endpoint,
+        None if claim.get('claim_id') is None else str(claim['claim_id']),
+        model_version,
+        float(prediction['fraud_probability']),
+        int(prediction['is_fraud']),
+        prediction.get('risk_level'),
+        json.dumps(claim, default=str),
+        json.dumps([float(value) for value in features]),
+        json.dumps(prediction, default=str),
+        None if duplicate_check is None else json.dumps(duplicate_check, default=str)
+    )
+
+
+def query(path, claim_ids=None, model_version=None, since=None, limit=None):
+    """Logged decisions as dicts, oldest first; claim_ids uses the index"""
+    conditions, params = [], []
+    if claim_ids:
+        conditions.append(f"claim_id IN ({', '.join('?' * len(claim_ids))})")
+        params.extend(str(claim_id) for claim_id in claim_ids)
+    if model_version:
+        conditions.append('model_version = ?')
+        params.append(model_version)
+    if since:
+        conditions.append('logged_at >= ?')
+        params.append(since)
+
+    sql = f"SELECT id, {', '.join(COLUMNS)} FROM predictions"
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    sql += ' ORDER BY id'
+    if limit:
+        sql += ' LIMIT ?'
+        params.append(int(limit))
+
+    connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        records = []
+        for row in connection.execute(sql, params):
+            record = dict(zip(('id',) + COLUMNS, row))
+            for column in JSON_COLUMNS:
+                if record[column] is not None:
+                    record[column] = json.loads(record[column])
+            records.append(record)
+        return records
+    finally:
+        connection.close()
+
+
+def summary(path):
+    """Record counts per model version and the logged time range"""
+    connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        total, first, last = connection.execute(
+            'SELECT COUNT(*), MIN(logged_at), MAX(logged_at) FROM predictions').fetchone()
+        versions = connection.execute(
+            'SELECT model_version, COUNT(*), SUM(is_fraud) FROM predictions GROUP BY model_version ORDER BY MIN(id)'
+        ).fetchall()
+    finally:
+        connection.close()
+    return {
+        'records': total,
+        'first_logged_at': first,
+        'last_logged_at': last,
+        'model_versions': [
+            {'model_version': version, 'records': count, 'flagged_fraud': flagged}
+            for version, count, flagged in versions
+        ]
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Look up fraud decisions in the audit log')
+    parser.add_argument('--db', default=DEFAULT_PATH, help='Audit log database')
+    parser.add_argument('--claim-id', nargs='+', help='Claim IDs to look up')
+    parser.add_argument('--model-version', help='Only decisions of this model version')
+    parser.add_argument('--since', help='Only decisions logged at or after this ISO timestamp')
+    parser.add_argument('--limit', type=int, help='Maximum records to print')
+    parser.add_argument('--stats', action='store_true', help='Print record counts instead of records')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if not os.path.exists(args.db):
+        print(f"❌ Audit log not found: {args.db}")
+        return
+
+    if args.stats:
+        print(json.dumps(summary(args.db), indent=2))
+        return
+
+    # One JSON object per line, for grep / jq
+    records = query(args.db, args.claim_id, args.model_version, args.since, args.limit)
+    for record in records:
+        print(json.dumps(record, ensure_ascii=False))
+    if args.claim_id:
+        missing = set(args.claim_id) - {record['claim_id'] for record in records}
+        for claim_id in sorted(missing):
+            print(f"⚠️  No audit record for {claim_id}")
+
+
+if __name__ == '__main__':
+    main()
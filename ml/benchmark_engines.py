@@ -0,0 +1,190 @@
+"""
+Side-by-side benchmark of the model engines
+Trains every engine on generated datasets of increasing size and reports fit
+time, peak training memory, compiled single-claim latency (and the speedup
+over sklearn's own predict_proba) and batch throughput, node visits per
+claim, model size and held-out ROC-AUC
+
+Each fit runs in a freshly forked process that inherits the dataset, so its
+memory growth is measured on its own and earlier fits cannot skew it.
+
+Run: python benchmark_engines.py
+     python benchmark_engines.py --sizes 10000 100000 1000000 --latency-repeats 500
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import numpy as np
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import train_test_split
+
+from benchmark_service import RESULTS_DIR, git_commit
+from compress_model import measure_latency, node_depths
+from forest_engine import compile_model
+from generate_fraud_data import generate_claims_data_vectorized
+from train_fraud_model import (
+    ENGINES, RANDOM_STATE, TEST_SIZE, current_memory_mb, engineer_features,
+    select_features, train_model
+)
+
+DEFAULT_SIZES = [10000, 50000, 200000]
+MEMORY_SAMPLE_SECONDS = 0.01
+
+# Dataset inherited by the forked fit processes (set before each pool starts)
+_data = None
+
+
+class PeakMemorySampler:
+    """Polls this process's RSS in a background thread and keeps the maximum"""
+
+    def __init__(self):
+        self.peak_mb = current_memory_mb() or 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(MEMORY_SAMPLE_SECONDS):
+            self.peak_mb = max(self.peak_mb, current_memory_mb() or 0.0)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, current_memory_mb() or 0.0)
+        return False
+
+
+def fit_and_measure(engine, latency_repeats):
+    """Train one engine on the inherited dataset and measure its compiled form"""
+    X_train, X_test, y_train, y_test = _data
+
+    baseline_mb = current_memory_mb() or 0.0
+    with PeakMemorySampler() as memory:
+        started = time.perf_counter()
+        model = train_model(X_train, y_train, oob_score=False, engine=engine)
+        fit_seconds = time.perf_counter() - started
+
+    compiled = compile_model(model)
+    X_eval = np.asarray(X_test, dtype=np.float64)
+    probabilities, _ = compiled.predict(X_eval)
+
+    # Nodes on each claim's actual path, summed over trees
+    depths = node_depths(compiled)
+    leaves = compiled.apply(X_eval[:1000])
+
+    return {
+        'engine': engine,
+        'fit_seconds': fit_seconds,
+        'fit_peak_memory_mb': memory.peak_mb - baseline_mb,
+        'test_roc_auc': float(roc_auc_score(y_test, probabilities)),
+        'n_trees': compiled.n_trees,
+        'max_depth': compiled.max_depth,
+        'n_nodes': compiled.n_nodes,
+        'model_bytes': compiled.nbytes,
+        'node_visits_per_claim': float(depths[leaves].sum(axis=1).mean()),
+        **measure_latency(compiled, X_eval, latency_repeats),
+        **sklearn_latency(model, X_eval, latency_repeats)
+    }
+
+
+def sklearn_latency(model, X, repeats):
+    """Single-claim p50/p99 of the sklearn model itself, what the compiled form replaces"""
+    timings = []
+    for i in range(repeats):
+        row = X[i % len(X)][None, :]
+        start = time.perf_counter()
+        model.predict_proba(row)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    p50, p99 = np.percentile(timings, [50, 99])
+    return {'sklearn_p50_ms': float(p50), 'sklearn_p99_ms': float(p99)}
+
+
+def benchmark_size(n_rows, engines, latency_repeats, seed):
+    """Generate n_rows claims and benchmark every engine on the same split"""
+    global _data
+
+    df, _, _ = engineer_features(generate_claims_data_vectorized(n_rows, seed=seed))
+    X, y, _ = select_features(df)
+    _data = train_test_split(
+        X.to_numpy(dtype=np.float32), y.to_numpy(),
+        test_size=TEST_SIZE, random_state=RANDOM_STATE, stratify=y
+    )
+    del df, X, y
+
+    results = []
+    context = multiprocessing.get_context('fork')
+    for engine in engines:
+        # A new single-worker pool per fit, so every fit starts from the same process image
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            result = pool.submit(fit_and_measure, engine, latency_repeats).result()
+        result['rows'] = n_rows
+        results.append(result)
+        print(f"   {engine:24s} fit {result['fit_seconds']:7.2f}s   AUC {result['test_roc_auc']:.4f}")
+
+    _data = None
+    return results
+
+
+def print_table(results):
+    print(f"\n{'rows':>9s} {'engine':24s}{'fit s':>8s}{'mem MB':>8s}{'AUC':>8s}{'trees':>7s}"
+          f"{'visits':>8s}{'KB':>9s}{'p50 ms':>8s}{'p99 ms':>8s}{'vs sk':>7s}{'batch/s':>10s}")
+    for r in results:
+        print(f"{r['rows']:9,d} {r['engine']:24s}{r['fit_seconds']:8.2f}{r['fit_peak_memory_mb']:8.1f}"
+              f"{r['test_roc_auc']:8.4f}{r['n_trees']:7d}{r['node_visits_per_claim']:8.0f}"
+              f"{r['model_bytes'] / 1024:9.1f}{r['p50_ms']:8.3f}{r['p99_ms']:8.3f}"
+              f"{r['sklearn_p99_ms'] / r['p99_ms']:6.1f}x{r['batch_claims_per_sec']:10,.0f}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark the model engines side by side')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help='Generated dataset sizes (rows)')
+    parser.add_argument('--engines', nargs='+', choices=ENGINES, default=list(ENGINES))
+    parser.add_argument('--latency-repeats', type=int, default=300,
+                        help='Single-claim predictions timed per model')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=None,
+                        help='Result JSON (default benchmark_results/<time>-engines.json)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    print("🚀 Model Engine Benchmark")
+    print("="*60)
+
+    results = []
+    for n_rows in sorted(args.sizes):
+        print(f"\n📊 {n_rows:,} generated claims")
+        results.extend(benchmark_size(n_rows, args.engines, args.latency_repeats, args.seed))
+
+    print_table(results)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-engines.json")
+    with open(output, 'w') as f:
+        json.dump({
+            'git_commit': git_commit(),
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'cpu_count': os.cpu_count(),
+            'config': {key: value for key, value in vars(args).items() if key != 'output'},
+            'results': results
+        }, f, indent=2)
+    print(f"\n💾 Results saved: {output}")
+
+
+if __name__ == '__main__':
+    main()
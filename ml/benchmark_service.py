@@ -0,0 +1,368 @@
+"""
+Load-testing and latency benchmark for the ML fraud detection service
+Drives /predict or /predict_batch at a fixed concurrency, either in-process
+through the Flask test client or over HTTP against a running service, and
+reports p50/p95/p99 latency, throughput and memory as JSON
+
+Run: python benchmark_service.py --concurrency 8 --requests 2000
+     python benchmark_service.py --mode http --url http://localhost:5001 --duration 30
+     python benchmark_service.py --endpoint predict_batch --batch-size 100
+     python benchmark_service.py --compare benchmark_results/<old>.json
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import resource
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlparse
+import numpy as np
+import pandas as pd
+
+DATASET_PATH = 'claims_fraud_dataset.csv'
+RESULTS_DIR = 'benchmark_results'
+
+# Request fields taken from each dataset row
+CLAIM_COLUMNS = [
+    'claim_id', 'hospital_code', 'doctor_id', 'patient_id', 'patient_age', 'patient_gender',
+    'icd10_code', 'procedures', 'num_procedures', 'care_class', 'los_days',
+    'admission_date', 'discharge_date', 'tarif_inacbg', 'tarif_rs'
+]
+
+
+def claims_from_dataframe(df):
+    """Request payloads from rows shaped like claims_fraud_dataset.csv"""
+    df = df[CLAIM_COLUMNS].fillna({'procedures': ''})
+    return json.loads(df.to_json(orient='records'))
+
+
+def sample_claims(n=200, path=DATASET_PATH, seed=0):
+    """Request payloads built from rows of the training dataset"""
+    df = pd.read_csv(path).sample(n=n, random_state=seed, replace=True)
+    return claims_from_dataframe(df)
+
+
+def generated_claims(n=200, seed=0):
+    """Request payloads from the vectorized synthetic generator"""
+    from generate_fraud_data import generate_claims_data_vectorized
+    return claims_from_dataframe(generate_claims_data_vectorized(n, seed=seed))
+
+
+def bust_cache(claims, seed=0):
+    """Unique claim_id and a tiny tarif_rs jitter per claim so no request is a cache hit"""
+    rng = np.random.default_rng(seed)
+    jitter = rng.uniform(0, 1000, size=len(claims))
+    busted = []
+    for i, (claim, extra) in enumerate(zip(claims, jitter)):
+        claim = dict(claim)
+        claim['claim_id'] = f"BENCH-{seed}-{i}"
+        claim['tarif_rs'] = float(claim['tarif_rs']) + float(extra)
+        busted.append(claim)
+    return busted
+
+
+def build_payloads(claims, endpoint, batch_size):
+    """JSON request bodies for the chosen endpoint"""
+    if endpoint == 'predict':
+        return [json.dumps(claim).encode() for claim in claims]
+    return [
+        json.dumps({'claims': claims[i:i + batch_size]}).encode()
+        for i in range(0, len(claims), batch_size)
+    ]
+
+
+class InProcessTarget:
+    """Sends requests through Flask's test client, one client per thread"""
+
+    def __init__(self, path):
+        import ml_service
+        if ml_service.active_model is None and not ml_service.load_model_artifacts():
+            raise RuntimeError('Model could not be loaded')
+        self.service = ml_service
+        self.path = path
+        self.local = threading.local()
+
+    def send(self, body):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.service.app.test_client()
+        response = client.post(self.path, data=body, content_type='application/json')
+        response.get_data()
+        return response.status_code
+
+    def health(self):
+        return self.service.app.test_client().get('/health').get_json()
+
+
+class HttpTarget:
+    """Sends requests to a running service over keep-alive HTTP connections"""
+
+    def __init__(self, url, path, timeout=30):
+        parsed = urlparse(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.path = path
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = self.local.connection = http.client.HTTPConnection(
+                self.host, self.port, timeout=self.timeout
+            )
+        return connection
+
+    def send(self, body):
+        connection = self._connection()
+        try:
+            connection.request('POST', self.path, body, {'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            self.local.connection = None
+            raise
+
+    def health(self):
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            connection.request('GET', '/health')
+            return json.loads(connection.getresponse().read())
+        finally:
+            connection.close()
+
+
+def rss_mb(pid='self'):
+    """Current resident set size of a process in MB (Linux), None if unavailable"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_load(target, payloads, concurrency, total_requests=None, duration=None):
+    """Send payloads round-robin from concurrency threads
+
+    Stops after total_requests or duration seconds, whichever is given.
+    Returns (latencies in ms, status codes, exceptions, elapsed seconds).
+    """
+    lock = threading.Lock()
+    counter = [0]
+    latencies = [[] for _ in range(concurrency)]
+    statuses = [[] for _ in range(concurrency)]
+    failures = [0] * concurrency
+    deadline = time.perf_counter() + duration if duration else None
+
+    def next_index():
+        with lock:
+            index = counter[0]
+            counter[0] += 1
+        if total_requests is not None and index >= total_requests:
+            return None
+        if deadline is not None and time.perf_counter() >= deadline:
+            return None
+        return index
+
+    def worker(slot):
+        while True:
+            index = next_index()
+            if index is None:
+                return
+            start = time.perf_counter()
+            try:
+                status = target.send(payloads[index % len(payloads)])
+            except Exception:
+                failures[slot] += 1
+                continue
+            latencies[slot].append((time.perf_counter() - start) * 1000.0)
+            statuses[slot].append(status)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return (
+        np.concatenate([np.asarray(l, dtype=np.float64) for l in latencies]),
+        [s for slot in statuses for s in slot],
+        sum(failures),
+        elapsed
+    )
+
+
+def summarize(latencies, statuses, failures, elapsed, claims_per_request):
+    """Latency percentiles, throughput and error counts"""
+    ok = sum(1 for s in statuses if 200 <= s < 300)
+    summary = {
+        'requests': len(statuses) + failures,
+        'succeeded': ok,
+        'http_errors': len(statuses) - ok,
+        'connection_errors': failures,
+        'elapsed_seconds': elapsed,
+        'requests_per_second': len(statuses) / elapsed if elapsed else 0.0,
+        'claims_per_second': ok * claims_per_request / elapsed if elapsed else 0.0
+    }
+    if len(latencies):
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        summary['latency_ms'] = {
+            'mean': float(latencies.mean()),
+            'min': float(latencies.min()),
+            'p50': float(p50),
+            'p95': float(p95),
+            'p99': float(p99),
+            'max': float(latencies.max())
+        }
+    return summary
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline_path):
+    """Print latency and throughput changes against an earlier result file"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    print(f"\n📊 Compared with {baseline_path} (commit {baseline.get('commit')})")
+    rows = [('requests_per_second', None), ('latency_ms', 'p50'),
+            ('latency_ms', 'p95'), ('latency_ms', 'p99')]
+    for key, sub in rows:
+        old = baseline['results'].get(key)
+        new = current['results'].get(key)
+        if sub:
+            old = old.get(sub) if old else None
+            new = new.get(sub) if new else None
+        if old is None or new is None:
+            continue
+        change = (new - old) / old * 100 if old else 0.0
+        label = f"{key}.{sub}" if sub else key
+        print(f"   {label:<22} {old:10.3f} → {new:10.3f}  ({change:+.1f}%)")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Load test the ML fraud detection service')
+    parser.add_argument('--mode', choices=['inprocess', 'http'], default='inprocess')
+    parser.add_argument('--url', default='http://localhost:5001', help='Service URL for --mode http')
+    parser.add_argument('--endpoint', choices=['predict', 'predict_batch'], default='predict')
+    parser.add_argument('--batch-size', type=int, default=100, help='Claims per /predict_batch request')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=1000, help='Total requests (ignored with --duration)')
+    parser.add_argument('--duration', type=float, default=None, help='Run for this many seconds instead')
+    parser.add_argument('--warmup', type=int, default=50, help='Requests sent before measuring')
+    parser.add_argument('--source', choices=['dataset', 'generator'], default='dataset')
+    parser.add_argument('--claims', type=int, default=1000, help='Distinct claims to cycle through')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--bust-cache', action='store_true',
+                        help='Make every claim unique so the prediction cache never hits')
+    parser.add_argument('--query', default='', help='Query string, e.g. "explain=false"')
+    parser.add_argument('--server-pid', type=int, default=None,
+                        help='Report this process\'s memory (http mode)')
+    parser.add_argument('--output', default=None, help='Result JSON (default benchmark_results/<time>.json)')
+    parser.add_argument('--compare', default=None, help='Earlier result JSON to compare against')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    print("🚀 ML Service Load Test")
+    print("="*60)
+
+    if args.source == 'dataset':
+        claims = sample_claims(args.claims, seed=args.seed)
+    else:
+        claims = generated_claims(args.claims, seed=args.seed)
+    if args.bust_cache:
+        claims = bust_cache(claims, args.seed)
+
+    payloads = build_payloads(claims, args.endpoint, args.batch_size)
+    claims_per_request = 1 if args.endpoint == 'predict' else args.batch_size
+    path = f'/{args.endpoint}' + (f'?{args.query}' if args.query else '')
+
+    if args.mode == 'inprocess':
+        target = InProcessTarget(path)
+    else:
+        target = HttpTarget(args.url, path)
+
+    memory_before = rss_mb(args.server_pid) if args.server_pid else rss_mb()
+
+    if args.warmup:
+        run_load(target, payloads, args.concurrency, total_requests=args.warmup)
+
+    total = None if args.duration else args.requests
+    print(f"📡 {args.mode} {path}: concurrency {args.concurrency}, "
+          f"{f'{args.duration:.0f}s' if args.duration else f'{total} requests'}")
+    latencies, statuses, failures, elapsed = run_load(
+        target, payloads, args.concurrency, total_requests=total, duration=args.duration
+    )
+
+    results = summarize(latencies, statuses, failures, elapsed, claims_per_request)
+    results['memory_mb'] = {
+        'client_peak_rss': peak_rss_mb(),
+        'before_rss': memory_before,
+        'after_rss': rss_mb(args.server_pid) if args.server_pid else rss_mb()
+    }
+    try:
+        health = target.health()
+        results['prediction_cache'] = health.get('prediction_cache')
+        results['micro_batching'] = health.get('micro_batching')
+        model_version = health.get('model_version')
+    except Exception:
+        model_version = None
+
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'model_version': model_version,
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'cpus': os.cpu_count()
+        },
+        'results': results
+    }
+
+    latency = results.get('latency_ms', {})
+    print(f"\n✅ {results['succeeded']}/{results['requests']} ok in {elapsed:.1f}s")
+    print(f"   {results['requests_per_second']:.1f} req/s, {results['claims_per_second']:.1f} claims/s")
+    if latency:
+        print(f"   p50 {latency['p50']:.2f} ms   p95 {latency['p95']:.2f} ms   p99 {latency['p99']:.2f} ms")
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{args.endpoint}.json")
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"💾 Results saved: {output}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == '__main__':
+    main()
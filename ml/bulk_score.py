@@ -0,0 +1,303 @@
+"""
+Offline bulk scoring for full claim histories
+Streams a claims CSV in chunks, scores the chunks in a process pool that
+shares the loaded model and appends results to a CSV as they complete, with
+a checkpoint so an interrupted run can resume where it stopped
+
+Features come from the columnar kernel of feature_spec (the vectorized twin
+of the serving path), risk levels and risk factors from ml_service, so
+offline scores are identical to what /predict_batch returns. An empty cell
+is a field the claim did not send: optional fields take their defaults,
+required ones fail validation. The rolling 30/90-day provider history of
+each claim is computed up front over all inputs, as of its submitted_date,
+like training does.
+
+Run: python bulk_score.py --input claims_fraud_dataset.csv --output scores.csv
+     python bulk_score.py --input generated_claims/*.csv --workers 8 --resume
+"""
+
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+import ml_service
+from feature_spec import INPUTS, columnar_features
+from provider_store import rolling_provider_columns
+
+DEFAULT_CHUNK_SIZE = 20000
+DEFAULT_OUTPUT = 'bulk_scores.csv'
+CHECKPOINT_SUFFIX = '.checkpoint.json'
+
+OUTPUT_COLUMNS = [
+    'claim_id', 'success', 'fraud_probability', 'is_fraud', 'risk_score',
+    'risk_level', 'action', 'priority', 'top_risk_factors', 'error'
+]
+
+# /predict defaults of the optional numeric fields, for empty CSV cells
+OPTIONAL_DEFAULTS = {field.name: field.default for field in INPUTS if field.default is not None}
+
+# Columns read up front for the rolling provider history
+HISTORY_COLUMNS = ('doctor_id', 'hospital_code', 'tarif_rs', 'tarif_inacbg', 'submitted_date')
+
+# Model and rolling history inherited by forked workers (set in the parent before the pool starts)
+_model = None
+_top_k = ml_service.DEFAULT_TOP_K
+_rolling = None
+
+
+def format_factors(explanation):
+    """'feature:+0.1234|feature:-0.0100' for the top risk factors"""
+    if explanation is None:
+        return ''
+    return '|'.join(
+        f"{factor['feature']}:{factor['contribution_score']:+.4f}"
+        for factor in explanation['top_risk_factors']
+    )
+
+
+def score_chunk(task):
+    """Score one chunk of claims, returns (chunk index, rows, CSV text without header)"""
+    index, first_row, df = task
+    model = _model
+
+    # An empty cell is a field the claim did not send, exactly as in a /predict request
+    claims = [
+        {field: value for field, value in claim.items() if value is not None}
+        for claim in df.replace({np.nan: None}).to_dict('records')
+    ]
+    output = []
+
+    errors = [ml_service.validate_claim(claim) for claim in claims]
+    valid = [i for i, error in enumerate(errors) if error is None]
+
+    predictions = {}
+    if valid:
+        # Columnar kernel of feature_spec, identical to prepare_features row by row
+        frame = df.iloc[valid].fillna({field: default for field, default in OPTIONAL_DEFAULTS.items()
+                                       if field in df.columns})
+        columns = {column: frame[column] for column in frame.columns}
+        columns.update(ml_service.encode_categorical_columns(frame, model))
+        columns.update(model.peer_groups.lookup_many(frame))
+        rows = first_row + np.asarray(valid)
+        columns.update({field: values[rows] for field, values in _rolling.items()})
+        X = columnar_features(columns)
+
+        probabilities, labels = model.forest.predict(X)
+        explanations = (ml_service.get_feature_contributions(X, model, _top_k)
+                        if _top_k else [None] * len(valid))
+        for i, proba, label, explanation in zip(valid, probabilities, labels, explanations):
+            predictions[i] = (ml_service.build_prediction(proba, label), explanation)
+
+    for i, claim in enumerate(claims):
+        claim_id = claim.get('claim_id')
+        if claim_id is None:
+            claim_id = first_row + i
+
+        if i in predictions:
+            prediction, explanation = predictions[i]
+            output.append({
+                'claim_id': claim_id,
+                'success': True,
+                'fraud_probability': prediction['fraud_probability'],
+                'is_fraud': prediction['is_fraud'],
+                'risk_score': prediction['risk_score'],
+                'risk_level': prediction['risk_level'],
+                'action': prediction['recommendation']['action'],
+                'priority': prediction['recommendation']['priority'],
+                'top_risk_factors': format_factors(explanation),
+                'error': ''
+            })
+        else:
+            output.append({'claim_id': claim_id, 'success': False, 'error': errors[i]})
+
+    text = pd.DataFrame(output, columns=OUTPUT_COLUMNS).to_csv(index=False, header=False)
+    return index, len(claims), text
+
+
+def iter_chunks(paths, chunksize, skip_rows=0):
+    """Yield (chunk index, first global row, DataFrame) across all input files"""
+    index = 0
+    row = 0
+    for path in paths:
+        for chunk in pd.read_csv(path, chunksize=chunksize):
+            if row + len(chunk) <= skip_rows:
+                row += len(chunk)
+                index += 1
+                continue
+            yield index, row, chunk
+            row += len(chunk)
+            index += 1
+
+
+def rolling_history(paths, chunksize):
+    """Rolling provider history for every row of paths, in file order"""
+    chunks = [
+        chunk
+        for path in paths
+        for chunk in pd.read_csv(path, usecols=lambda column: column in HISTORY_COLUMNS,
+                                 dtype={'doctor_id': 'category', 'hospital_code': 'category',
+                                        'submitted_date': 'category'},
+                                 chunksize=chunksize)
+    ]
+    history = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=HISTORY_COLUMNS)
+    # Unparseable tariffs fail validation when scored; here they just are not high cost
+    for column in ('tarif_rs', 'tarif_inacbg'):
+        history[column] = pd.to_numeric(history[column], errors='coerce')
+    return rolling_provider_columns(history)
+
+
+def read_checkpoint(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_checkpoint(path, state):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def bulk_score(paths, output_path, chunksize=DEFAULT_CHUNK_SIZE, workers=None,
+               top_k=ml_service.DEFAULT_TOP_K, resume=False):
+    """Score every claim in paths into output_path, returns the final checkpoint state"""
+    global _model, _top_k, _rolling
+
+    if not ml_service.load_model_artifacts():
+        raise RuntimeError('Model could not be loaded. Please train the model first.')
+    _model = ml_service.active_model
+    _top_k = top_k
+    _rolling = rolling_history(paths, chunksize)
+    workers = workers or os.cpu_count()
+
+    checkpoint_path = output_path + CHECKPOINT_SUFFIX
+    state = {
+        'inputs': [os.path.abspath(p) for p in paths],
+        'output': os.path.abspath(output_path),
+        'chunksize': chunksize,
+        'top_k': top_k,
+        'model_version': _model.version,
+        'chunks_done': 0,
+        'rows_done': 0,
+        'output_bytes': 0,
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'completed': False
+    }
+
+    previous = read_checkpoint(checkpoint_path) if resume else None
+    if previous:
+        for key in ('inputs', 'chunksize', 'top_k', 'model_version'):
+            if previous[key] != state[key]:
+                raise ValueError(
+                    f'Checkpoint {checkpoint_path} was written with a different {key}: '
+                    f'{previous[key]!r} (now {state[key]!r})'
+                )
+        if previous.get('completed'):
+            print(f"✅ {output_path} is already complete ({previous['rows_done']:,} claims)")
+            return previous
+        state.update({k: previous[k] for k in ('chunks_done', 'rows_done', 'output_bytes', 'started_at')})
+
+        # Drop anything written after the last checkpoint
+        with open(output_path, 'r+b') as f:
+            f.truncate(state['output_bytes'])
+        print(f"↩️  Resuming after {state['rows_done']:,} claims ({state['chunks_done']} chunks)")
+        out = open(output_path, 'ab')
+    else:
+        out = open(output_path, 'wb')
+        out.write((','.join(OUTPUT_COLUMNS) + '\n').encode())
+        state['output_bytes'] = out.tell()
+        write_checkpoint(checkpoint_path, state)
+
+    started = time.perf_counter()
+    scored = 0
+    # fork shares the loaded (memory-mapped) model with every worker
+    context = multiprocessing.get_context('fork')
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            chunks = iter_chunks(paths, chunksize, skip_rows=state['rows_done'])
+            pending = {}
+            next_index = state['chunks_done']
+
+            def submit_next():
+                task = next(chunks, None)
+                if task is not None:
+                    pending[task[0]] = pool.submit(score_chunk, task)
+                return task is not None
+
+            # Keep a bounded number of chunks in flight
+            for _ in range(workers * 2):
+                if not submit_next():
+                    break
+
+            while pending:
+                index, rows, text = pending.pop(next_index).result()
+                out.write(text.encode())
+                out.flush()
+                os.fsync(out.fileno())
+
+                scored += rows
+                next_index += 1
+                state.update({
+                    'chunks_done': next_index,
+                    'rows_done': state['rows_done'] + rows,
+                    'output_bytes': out.tell()
+                })
+                write_checkpoint(checkpoint_path, state)
+
+                elapsed = time.perf_counter() - started
+                print(f"   chunk {index}: {state['rows_done']:,} claims "
+                      f"({scored / elapsed:,.0f} claims/s)")
+                submit_next()
+    finally:
+        out.close()
+
+    state['completed'] = True
+    state['finished_at'] = datetime.now().isoformat(timespec='seconds')
+    write_checkpoint(checkpoint_path, state)
+    return state
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Bulk score a claims CSV offline')
+    parser.add_argument('--input', nargs='+', default=[ml_service.DATASET_PATH],
+                        help='Claims CSV file(s) or glob patterns')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--top-k', type=int, default=ml_service.DEFAULT_TOP_K,
+                        help='Risk factors per claim (0 = scores only)')
+    parser.add_argument('--resume', action='store_true', help='Continue from the checkpoint')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    paths = []
+    for pattern in args.input:
+        paths.extend(sorted(glob.glob(pattern)) or [pattern])
+
+    print("🚀 Bulk Fraud Scoring")
+    print("="*60)
+    print(f"📂 {len(paths)} input file(s), chunks of {args.chunksize:,}, {args.workers} workers")
+
+    started = time.perf_counter()
+    state = bulk_score(paths, args.output, args.chunksize, args.workers, args.top_k, args.resume)
+    elapsed = time.perf_counter() - started
+
+    print(f"\n✅ {state['rows_done']:,} claims scored in {elapsed:.1f}s")
+    print(f"💾 Results: {args.output} (checkpoint {args.output}{CHECKPOINT_SUFFIX})")
+
+
+if __name__ == '__main__':
+    main()
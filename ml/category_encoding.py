@@ -0,0 +1,111 @@
+"""
+Precomputed lookup tables for categorical encoding
+Compiles the fitted LabelEncoders once at load time into dict tables so
+serving never calls encoder.transform on the hot path
+"""
+
+import numpy as np
+import pandas as pd
+
+# Code used for categories the encoder never saw during training
+UNKNOWN_CODE = 0
+
+
+def normalize_category(value):
+    """Canonical string key for a category value ("2", 2 and 2.0 are the same)"""
+    if isinstance(value, (float, np.floating)) and float(value).is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+class CategoryTable:
+    """O(1) category -> code table built from a LabelEncoder's classes_
+
+    Incremental training extends a table instead of the encoder (see
+    extend): LabelEncoder needs sorted classes_, appended classes are not.
+    Classes that normalize to the same key (" RS001" and "RS001") cannot be
+    told apart when encoding: the later one's code wins. Such collisions are
+    reported, or raise ValueError with strict=True (training, where the
+    encoder is still being fitted).
+    """
+
+    def __init__(self, classes, unknown_code=UNKNOWN_CODE, strict=False):
+        self.classes = np.asarray(classes)
+        self.unknown_code = unknown_code
+        # classes_ order defines the codes, exactly like LabelEncoder.transform
+        self.codes = {}
+        self.collisions = {}
+        for i, c in enumerate(self.classes):
+            key = normalize_category(c)
+            if key in self.codes:
+                self.collisions.setdefault(key, [self.classes[self.codes[key]]]).append(c)
+            self.codes[key] = i
+        self.categories = pd.Index(list(self.codes))
+
+        if self.collisions:
+            message = f'Categories that normalize to the same key: {self.collisions}'
+            if strict:
+                raise ValueError(message)
+            print(f"⚠️  {message}")
+
+    @classmethod
+    def from_encoder(cls, encoder, strict=False):
+        """Table for a fitted LabelEncoder, or a copy of an (extended) CategoryTable"""
+        if isinstance(encoder, CategoryTable):
+            return cls(encoder.classes, encoder.unknown_code, strict)
+        return cls(encoder.classes_, strict=strict)
+
+    def extend(self, values):
+        """(table, added): a new table with the unseen values appended
+
+        Existing codes keep their meaning; new categories get the next codes
+        in order of first appearance, in normalized form.
+        """
+        _, known = self.encode_many(values)
+        unseen = pd.Series(values)[~known]
+        added = list(dict.fromkeys(normalize_category(value) for value in unseen))
+        if not added:
+            return self, 0
+        classes = np.concatenate([self.classes.astype(object), np.asarray(added, dtype=object)])
+        return CategoryTable(classes, self.unknown_code), len(added)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def encode(self, value):
+        """Return (code, known) for a single value"""
+        code = self.codes.get(normalize_category(value))
+        if code is None:
+            return self.unknown_code, False
+        return code, True
+
+    def encode_many(self, values):
+        """Vectorized encoding, returns (codes, known mask) arrays"""
+        values = pd.Series(values)
+        if values.dtype == object:
+            # Strings already in canonical form match directly; only the
+            # misses (numbers, padded or unknown values) are normalized
+            codes = self.categories.get_indexer(values)
+            misses = np.flatnonzero(codes < 0)
+            if len(misses):
+                codes[misses] = self.categories.get_indexer(
+                    [normalize_category(value) for value in values.iloc[misses]]
+                )
+        elif values.dtype.kind == 'f':
+            # Whole floats encode like the integer they equal (2.0 -> "2")
+            keys = values.astype(str)
+            whole = (values % 1 == 0) & (values.abs() < 2 ** 53)
+            keys[whole] = values[whole].astype(np.int64).astype(str)
+            codes = self.categories.get_indexer(keys)
+        else:
+            codes = self.categories.get_indexer(values.astype(str).str.strip())
+
+        codes = codes.astype(np.int64)
+        known = codes >= 0
+        codes[~known] = self.unknown_code
+        return codes, known
+
+
+def compile_encoders(encoders):
+    """Compile a dict of fitted LabelEncoders (or CategoryTables) into CategoryTables"""
+    return {name: CategoryTable.from_encoder(encoder) for name, encoder in encoders.items()}
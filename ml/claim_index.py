@@ -0,0 +1,331 @@
+"""
+In-memory duplicate and overlapping-stay index for serving
+Flags claims the model cannot see on its own: the same claim billed twice
+(hashed claim signature) and a patient's hospital stays that overlap, at the
+same or another hospital (sorted per-patient admission intervals)
+
+Each check is one hash lookup plus a binary search in the patient's stays.
+The index is seeded from claims_fraud_dataset.csv-shaped history and grows
+with every scored claim, up to max_claims (oldest claims are evicted first).
+
+In the pre-fork server (serve.py) every worker keeps its own index and
+share() replicates the claims each worker indexes to the others through a
+SharedLog (shared_log.py).
+"""
+
+import bisect
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import date
+import pandas as pd
+
+from category_encoding import normalize_category
+from shared_log import SYNC_INTERVAL, SharedLog
+
+# Identifies the patient across hospitals (e.g. the BPJS card number)
+PATIENT_ID_FIELD = 'patient_id'
+
+# Fields hashed into the duplicate signature. With a patient ID the same
+# patient, hospital, diagnosis and admission day is a duplicate; without one
+# every identifying field of the claim has to match. Billed amounts are never
+# part of it: a resubmission with a changed tariff is still the same claim.
+SIGNATURE_FIELDS = ('hospital_code', 'icd10_code', 'admission_date')
+ANONYMOUS_SIGNATURE_FIELDS = (
+    'hospital_code', 'doctor_id', 'icd10_code', 'patient_gender', 'patient_age',
+    'admission_date', 'discharge_date'
+)
+
+MAX_INDEXED_CLAIMS = 1000000
+# Matches listed per claim in a response
+MAX_REPORTED_MATCHES = 10
+
+class ClaimIndex:
+    """Thread-safe signature hash index plus per-patient stay intervals"""
+
+    def __init__(self, max_claims=MAX_INDEXED_CLAIMS):
+        self.max_claims = max_claims
+        self.signatures = {}      # signature -> [claim keys]
+        self.patients = {}        # patient_id -> PatientStays
+        self.claims = OrderedDict()  # claim key -> (signature, patient_id, stay, hospital), oldest first
+        self.lock = threading.Lock()
+        self._anonymous = 0
+        self.duplicates = 0
+        self.overlaps = 0
+        self.log = None           # SharedLog once share() is called
+
+    def check(self, claim, record=True):
+        """Duplicate and overlap matches for claim, then (optionally) index it
+
+        A claim_id that is already indexed is not compared with itself, so
+        retries and re-scoring never flag a claim as its own duplicate.
+        """
+        signature = claim_signature(claim)
+        patient_id = _patient_id(claim)
+        stay = claim_stay(claim)
+        claim_id = claim.get('claim_id')
+
+        with self.lock:
+            known = claim_id is not None and claim_id in self.claims
+            duplicates = [
+                key for key in self.signatures.get(signature, ())
+                if key != claim_id
+            ][:MAX_REPORTED_MATCHES]
+
+            overlaps = []
+            patient = self.patients.get(patient_id) if patient_id is not None else None
+            if patient is not None and stay is not None:
+                overlaps = [
+                    entry for entry in patient.overlapping(stay[0], stay[1])
+                    if entry[2] != claim_id
+                ][:MAX_REPORTED_MATCHES]
+
+            if not known:
+                self.duplicates += bool(duplicates)
+                self.overlaps += bool(overlaps)
+                if record:
+                    entry = (claim_id, signature, patient_id, stay, claim.get('hospital_code'))
+                    self._add(*entry)
+                    if self.log is not None:
+                        self.log.append(entry)
+
+        hospital = normalize_category(claim.get('hospital_code'))
+        return {
+            'is_duplicate': bool(duplicates),
+            'duplicate_of': duplicates,
+            'has_overlapping_stay': bool(overlaps),
+            'overlapping_stays': [
+                {
+                    'claim_id': other_id,
+                    'hospital_code': other_hospital,
+                    'admission_date': date.fromordinal(start).isoformat(),
+                    'discharge_date': date.fromordinal(discharge).isoformat(),
+                    'same_hospital': normalize_category(other_hospital) == hospital
+                }
+                for start, _, other_id, other_hospital, discharge in overlaps
+            ]
+        }
+
+    def _add(self, claim_id, signature, patient_id, stay, hospital_code):
+        if claim_id is None:
+            self._anonymous += 1
+            claim_id = ('anonymous', self._anonymous)
+
+        self.signatures.setdefault(signature, []).append(claim_id)
+        if patient_id is not None and stay is not None:
+            patient = self.patients.get(patient_id)
+            if patient is None:
+                patient = self.patients[patient_id] = PatientStays()
+            patient.add(_stay_entry(stay, claim_id, hospital_code))
+        self.claims[claim_id] = (signature, patient_id, stay, hospital_code)
+
+        while len(self.claims) > self.max_claims:
+            self._evict_oldest()
+
+    def _evict_oldest(self):
+        claim_id, (signature, patient_id, stay, hospital_code) = self.claims.popitem(last=False)
+
+        keys = self.signatures.get(signature)
+        if keys is not None:
+            keys.remove(claim_id)
+            if not keys:
+                del self.signatures[signature]
+
+        if patient_id is not None and stay is not None:
+            patient = self.patients[patient_id]
+            patient.remove(_stay_entry(stay, claim_id, hospital_code))
+            if not patient.stays:
+                del self.patients[patient_id]
+
+    def load_history(self, df):
+        """Index historical claims (claims_fraud_dataset.csv shape), returns rows indexed
+
+        Signatures and stay bounds are computed column-wise; duplicates within
+        the history itself are indexed, not reported.
+        """
+        records = df.to_dict('records')
+        signatures = claim_signatures(df)
+        starts, discharges = claim_stays(df)
+        patient_ids = (df[PATIENT_ID_FIELD] if PATIENT_ID_FIELD in df
+                       else pd.Series([None] * len(df), index=df.index))
+
+        with self.lock:
+            for record, signature, start, discharge, patient_id in zip(
+                    records, signatures, starts, discharges, patient_ids):
+                claim_id = record.get('claim_id')
+                if claim_id is not None and claim_id in self.claims:
+                    continue
+                stay = (start, discharge) if start >= 0 else None
+                patient_id = None if pd.isna(patient_id) else normalize_category(patient_id)
+                self._add(claim_id, signature, patient_id, stay, record.get('hospital_code'))
+
+        return len(records)
+
+    def stats(self):
+        with self.lock:
+            stats = {
+                'indexed_claims': len(self.claims),
+                'max_claims': self.max_claims,
+                'signatures': len(self.signatures),
+                'patients': len(self.patients),
+                'duplicates_flagged': self.duplicates,
+                'overlaps_flagged': self.overlaps
+            }
+        if self.log is not None:
+            stats['shared'] = self.log.stats()
+        return stats
+
+    def share(self, path):
+        """Replicate indexed claims with the other pre-fork workers through a new log at path
+
+        Checks stay in memory; start_sync() in each worker exchanges the
+        indexed claims every SYNC_INTERVAL, so a claim billed again through
+        another worker is flagged once that interval has passed. The
+        flagged counters are per worker.
+        """
+        self.log = SharedLog.create(path)
+
+    def start_sync(self, interval_seconds=SYNC_INTERVAL):
+        """Exchange claims through the shared log in a background thread (in each worker)"""
+        self.log.start(self.apply, interval_seconds)
+
+    def stop_sync(self):
+        """Stop the sync thread and write the claims still queued"""
+        self.log.stop(self.apply)
+
+    def sync(self):
+        """One exchange through the shared log (the parent, between restarts)"""
+        self.apply(self.log.sync())
+
+    def apply(self, entries):
+        """Index claims other workers checked, skipping claim_ids already indexed"""
+        with self.lock:
+            for entry in entries:
+                if entry[0] is None or entry[0] not in self.claims:
+                    self._add(*entry)
+
+
+class PatientStays:
+    """One patient's stays as [start, end) day ordinals, sorted by start
+
+    Entries are (start, end, claim_id, hospital_code, discharge ordinal).
+
+    longest bounds how far back a stay that still covers a given day can
+    start, so an overlap query is a binary search plus a short scan.
+    """
+
+    __slots__ = ('stays', 'longest')
+
+    def __init__(self):
+        self.stays = []
+        self.longest = 0
+
+    def add(self, entry):
+        bisect.insort(self.stays, entry, key=_stay_sort_key)
+        self.longest = max(self.longest, entry[1] - entry[0])
+
+    def remove(self, entry):
+        index = bisect.bisect_left(self.stays, _stay_sort_key(entry), key=_stay_sort_key)
+        while self.stays[index] != entry:
+            index += 1
+        del self.stays[index]
+
+    def overlapping(self, start, end):
+        """Stays sharing at least one night with [start, end)"""
+        # Stays starting before end, newest first
+        index = bisect.bisect_left(self.stays, (end,), key=lambda entry: (entry[0],))
+        matches = []
+        earliest = start - self.longest
+        while index > 0:
+            index -= 1
+            entry = self.stays[index]
+            if entry[0] < earliest:
+                break
+            if entry[1] > start:
+                matches.append(entry)
+        return matches
+
+
+def _stay_entry(stay, claim_id, hospital_code):
+    """A same-day (day-care) stay occupies its admission day; a transfer
+    discharged and admitted on the same day does not overlap"""
+    admission, discharge = stay
+    return (admission, max(discharge, admission + 1), claim_id, hospital_code, discharge)
+
+
+def _stay_sort_key(entry):
+    return (entry[0], entry[1], str(entry[2]))
+
+
+def _patient_id(claim):
+    value = claim.get(PATIENT_ID_FIELD)
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    return normalize_category(value)
+
+
+def _hash(values):
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update('\x1f'.join(values).encode())
+    return digest.digest()
+
+
+def claim_signature(claim):
+    """Hashed duplicate signature of one claim"""
+    patient_id = _patient_id(claim)
+    if patient_id is not None:
+        values = [patient_id] + [normalize_category(claim.get(field)) for field in SIGNATURE_FIELDS]
+    else:
+        values = ['~'] + [normalize_category(claim.get(field)) for field in ANONYMOUS_SIGNATURE_FIELDS]
+    return _hash(values)
+
+
+def claim_signatures(df):
+    """claim_signature for every row of a DataFrame"""
+    def column(field):
+        if field not in df:
+            return pd.Series(['None'] * len(df), index=df.index)
+        return df[field].map(normalize_category, na_action='ignore').fillna('None')
+
+    if PATIENT_ID_FIELD in df:
+        has_patient = df[PATIENT_ID_FIELD].notna()
+        with_id = column(PATIENT_ID_FIELD)
+        for field in SIGNATURE_FIELDS:
+            with_id = with_id + '\x1f' + column(field)
+    else:
+        has_patient = pd.Series(False, index=df.index)
+        with_id = None
+
+    anonymous = pd.Series('~', index=df.index)
+    for field in ANONYMOUS_SIGNATURE_FIELDS:
+        anonymous = anonymous + '\x1f' + column(field)
+
+    joined = with_id.where(has_patient, anonymous) if with_id is not None else anonymous
+    return [_hash([value]) for value in joined]
+
+
+def claim_stay(claim):
+    """(admission, discharge) day ordinals, None without valid dates"""
+    try:
+        admission = date.fromisoformat(str(claim.get('admission_date'))[:10]).toordinal()
+        discharge = date.fromisoformat(str(claim.get('discharge_date'))[:10]).toordinal()
+    except ValueError:
+        return None
+    if discharge < admission:
+        return None
+    return admission, discharge
+
+
+def claim_stays(df):
+    """claim_stay for every row as (admissions, discharges) lists, -1 where invalid"""
+    if 'admission_date' not in df or 'discharge_date' not in df:
+        return [-1] * len(df), [-1] * len(df)
+
+    epoch = pd.Timestamp('1970-01-01')
+    offset = date(1970, 1, 1).toordinal()
+    admission = (pd.to_datetime(df['admission_date'], errors='coerce') - epoch).dt.days + offset
+    discharge = (pd.to_datetime(df['discharge_date'], errors='coerce') - epoch).dt.days + offset
+
+    valid = admission.notna() & discharge.notna() & (discharge >= admission)
+    return (admission.where(valid, -1).astype(int).tolist(),
+            discharge.where(valid, -1).astype(int).tolist())
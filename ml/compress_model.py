@@ -0,0 +1,360 @@
+"""
+Accuracy-budgeted compression of the compiled Random Forest
+Searches for the smallest forest whose held-out ROC-AUC stays within a given
+loss of the full model: trees are ranked by greedy forward selection, every
+tree is pruned to a depth limit and the flat buffers are narrowed (float32
+thresholds, float16/float32 leaf values, int16/int32 indices)
+
+The held-out set is the same stratified split train_fraud_model.py evaluates
+on. It is halved: one half ranks the trees, the other half decides whether a
+candidate is within budget, so the reported AUC is not the one that was
+optimized.
+
+Run: python compress_model.py --max-auc-loss 0.005
+     python compress_model.py --max-auc-loss 0.01 --install   (replace the served bundle)
+"""
+
+import argparse
+import os
+import time
+import numpy as np
+import pandas as pd
+from scipy.stats import rankdata
+from sklearn.model_selection import train_test_split
+
+from forest_engine import CompiledForest
+from model_bundle import BUNDLE_PATH, load_bundle, load_legacy_artifacts, save_bundle
+from train_fraud_model import (
+    CATEGORICAL_COLUMNS, DEFAULT_DATA_PATH, DRIFT_BASELINE_PATH, ENCODERS_PATH, FEATURES_PATH,
+    MODEL_PATH, PEER_GROUPS_PATH, RANDOM_STATE, TEST_SIZE, add_engineered_columns, add_peer_columns,
+    add_rolling_columns
+)
+from provider_store import rolling_provider_columns
+
+DEFAULT_MAX_AUC_LOSS = 0.005
+DEFAULT_OUTPUT = 'fraud_model_bundle_compressed'
+MIN_DEPTH = 3
+# Fewer trees give too few distinct probabilities for the risk-level bands
+DEFAULT_MIN_TREES = 10
+LATENCY_REPEATS = 300
+
+
+def node_depths(forest):
+    """Depth of every node reachable from a root (-1 for unreachable nodes)"""
+    depth = np.full(forest.n_nodes, -1, dtype=np.int64)
+    frontier = np.asarray(forest.roots)
+    level = 0
+    while len(frontier):
+        depth[frontier] = level
+        internal = frontier[forest.left[frontier] != frontier]
+        frontier = np.concatenate([forest.left[internal], forest.right[internal]])
+        level += 1
+    return depth
+
+
+def compact(forest, keep, roots):
+    """Drop nodes outside keep and renumber children and roots
+
+    keep must contain every child of every kept internal node.
+    """
+    new_index = np.cumsum(keep) - 1
+    compacted = CompiledForest(
+        feature=forest.feature[keep],
+        threshold=forest.threshold[keep],
+        left=new_index[forest.left[keep]],
+        right=new_index[forest.right[keep]],
+        value=forest.value[keep],
+        roots=new_index[roots],
+        classes=forest.classes,
+        max_depth=forest.max_depth
+    )
+    compacted.max_depth = int(node_depths(compacted).max()) if compacted.n_nodes else 0
+    return compacted
+
+
+def select_trees(forest, tree_ids):
+    """Forest made of the given trees only (kept in their original order)"""
+    tree_ids = np.sort(np.asarray(tree_ids, dtype=np.intp))
+    # Trees are stored contiguously, root first
+    sizes = np.diff(np.append(forest.roots, forest.n_nodes))
+    tree_of_node = np.repeat(np.arange(forest.n_trees), sizes)
+    keep = np.isin(tree_of_node, tree_ids)
+    return compact(forest, keep, forest.roots[tree_ids])
+
+
+def prune_depth(forest, max_depth):
+    """Turn every node at max_depth into a leaf and drop everything below it
+
+    Each node already stores the class distribution of the training samples
+    that reached it, so the cut node's value is the new leaf's prediction.
+    """
+    depth = node_depths(forest)
+    node_ids = np.arange(forest.n_nodes)
+    cut = depth == max_depth
+
+    pruned = CompiledForest(
+        feature=np.where(cut, 0, forest.feature),
+        threshold=forest.threshold,
+        left=np.where(cut, node_ids, forest.left),
+        right=np.where(cut, node_ids, forest.right),
+        value=forest.value,
+        roots=forest.roots,
+        classes=forest.classes,
+        max_depth=forest.max_depth
+    )
+    keep = (depth >= 0) & (depth <= max_depth)
+    return compact(pruned, keep, forest.roots)
+
+
+def quantize(forest, value_dtype=np.float16):
+    """Narrow the flat buffers
+
+    Thresholds are rounded down to float32. Claims are compared as float32,
+    and for any float32 x, x <= t exactly when x <= the largest float32 not
+    above t, so every split takes the same branch. Leaf values are the only
+    lossy part.
+    """
+    threshold = forest.threshold.astype(np.float32)
+    above = threshold.astype(np.float64) > forest.threshold
+    threshold[above] = np.nextafter(threshold[above], np.float32(-np.inf))
+
+    feature_dtype = np.int16 if forest.n_nodes == 0 or forest.feature.max() < np.iinfo(np.int16).max else np.intp
+    index_dtype = np.int32 if forest.n_nodes < np.iinfo(np.int32).max else np.intp
+
+    return CompiledForest(
+        feature=forest.feature.astype(feature_dtype),
+        threshold=threshold,
+        left=forest.left.astype(index_dtype),
+        right=forest.right.astype(index_dtype),
+        value=forest.value.astype(value_dtype),
+        roots=forest.roots.astype(index_dtype),
+        classes=forest.classes,
+        max_depth=forest.max_depth
+    )
+
+
+def auc_columns(scores, y):
+    """ROC-AUC of every column of scores (rank formulation, ties count half)"""
+    scores = np.asarray(scores, dtype=np.float64)
+    if scores.ndim == 1:
+        scores = scores[:, None]
+    positive = np.asarray(y) == 1
+    n_pos = positive.sum()
+    n_neg = len(positive) - n_pos
+    ranks = rankdata(scores, axis=0)
+    return (ranks[positive].sum(axis=0) - n_pos * (n_pos + 1) / 2) / (n_pos * n_neg)
+
+
+def tree_scores(forest, X):
+    """Fraud probability of every tree for every row, shape (rows, trees)"""
+    return forest.value[forest.apply(X), 1].astype(np.float64)
+
+
+def greedy_tree_order(per_tree, y, target_auc):
+    """Order trees by greedy forward selection on AUC
+
+    Adds the tree that most improves the running ensemble until it reaches
+    target_auc, then appends the remaining trees in their original order.
+    """
+    n_rows, n_trees = per_tree.shape
+    remaining = list(range(n_trees))
+    order = []
+    total = np.zeros(n_rows)
+
+    while remaining:
+        candidates = total[:, None] + per_tree[:, remaining]
+        scores = auc_columns(candidates, y)
+        best = int(np.argmax(scores))
+        order.append(remaining.pop(best))
+        total = candidates[:, best]
+        if scores[best] >= target_auc:
+            break
+
+    return order + remaining
+
+
+def prefix_aucs(per_tree, order, y):
+    """AUC of the ensemble of the first k trees in order, for every k"""
+    return auc_columns(np.cumsum(per_tree[:, order], axis=1), y)
+
+
+def measure_latency(forest, X, repeats=LATENCY_REPEATS):
+    """Single-claim p50/p99 and batch throughput of forest.predict"""
+    timings = []
+    for i in range(repeats):
+        row = X[i % len(X)]
+        start = time.perf_counter()
+        forest.predict(row)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    forest.predict(X)
+    batch_seconds = time.perf_counter() - start
+
+    p50, p99 = np.percentile(timings, [50, 99])
+    return {
+        'p50_ms': float(p50),
+        'p99_ms': float(p99),
+        'batch_claims_per_sec': len(X) / batch_seconds if batch_seconds else 0.0
+    }
+
+
+def describe(forest, auc):
+    return {
+        'n_trees': forest.n_trees,
+        'max_depth': forest.max_depth,
+        'n_nodes': forest.n_nodes,
+        'bytes': forest.nbytes,
+        'auc': float(auc)
+    }
+
+
+def search(forest, X_select, y_select, X_eval, y_eval, max_auc_loss, min_trees):
+    """Smallest (trees, depth) candidate within max_auc_loss on the evaluation half
+
+    Returns (forest, candidates, full-model AUC), where candidates lists the
+    best tree count found for every depth tried.
+    """
+    base_select = auc_columns(forest.predict(X_select)[0], y_select)[0]
+    base_eval = auc_columns(forest.predict(X_eval)[0], y_eval)[0]
+    target = base_eval - max_auc_loss
+
+    candidates = []
+    best = None
+    for depth in range(forest.max_depth, MIN_DEPTH - 1, -1):
+        pruned = prune_depth(forest, depth)
+        order = greedy_tree_order(tree_scores(pruned, X_select), y_select, base_select)
+        aucs = prefix_aucs(tree_scores(pruned, X_eval), order, y_eval)
+
+        # Smallest tree count >= min_trees whose ensemble is within budget
+        smallest = min(min_trees, forest.n_trees)
+        within = np.flatnonzero(aucs[smallest - 1:] >= target)
+        if not len(within):
+            print(f"   depth {depth:2d}: no tree count within budget (all trees: AUC {aucs[-1]:.4f})")
+            # Shallower trees only lose more accuracy
+            break
+
+        n_trees = int(within[0]) + smallest
+        candidate = select_trees(pruned, order[:n_trees])
+        summary = describe(candidate, aucs[n_trees - 1])
+        candidates.append(summary)
+        print(f"   depth {depth:2d}: {n_trees:4d} trees, {candidate.n_nodes:7,} nodes, "
+              f"AUC {aucs[n_trees - 1]:.4f}")
+
+        if best is None or candidate.n_nodes < best.n_nodes:
+            best = candidate
+
+    return best, candidates, base_eval
+
+
+def load_model(bundle_path):
+    if os.path.exists(bundle_path):
+        return load_bundle(bundle_path, mmap=False)
+    return load_legacy_artifacts(MODEL_PATH, ENCODERS_PATH, FEATURES_PATH, PEER_GROUPS_PATH,
+                                 DRIFT_BASELINE_PATH)
+
+
+def training_split(paths, model):
+    """Recreate train_fraud_model.py's train/test split, encoded with the model's tables"""
+    df = pd.concat([pd.read_csv(path) for path in paths], ignore_index=True)
+    for name, column in CATEGORICAL_COLUMNS.items():
+        df[f'{name}_encoded'] = model.encoders[name].encode_many(df[column])[0]
+    add_peer_columns(df, model.peer_groups)
+    add_rolling_columns(df, rolling_provider_columns(df))
+    add_engineered_columns(df)
+
+    X = df[model.feature_names].to_numpy(dtype=np.float64)
+    y = df['is_fraud'].to_numpy()
+    return train_test_split(X, y, test_size=TEST_SIZE, random_state=RANDOM_STATE, stratify=y)
+
+
+def held_out_split(paths, model):
+    """The training held-out set, halved into a selection and a check set"""
+    _, X_test, _, y_test = training_split(paths, model)
+    return train_test_split(X_test, y_test, test_size=0.5, random_state=RANDOM_STATE, stratify=y_test)
+
+
+def compress(model, paths, max_auc_loss=DEFAULT_MAX_AUC_LOSS, min_trees=DEFAULT_MIN_TREES):
+    """Compress model.forest within max_auc_loss, returns (forest, report)"""
+    X_select, X_eval, y_select, y_eval = held_out_split(paths, model)
+    print(f"📊 Held-out: {len(X_select)} claims rank trees, {len(X_eval)} check the budget")
+
+    print(f"\n🌲 Searching tree count x depth (max AUC loss {max_auc_loss}):")
+    pruned, candidates, base_auc = search(
+        model.forest, X_select, y_select, X_eval, y_eval, max_auc_loss, min_trees
+    )
+
+    # float16 leaf values if they still fit the budget, float32 otherwise
+    for value_dtype in (np.float16, np.float32):
+        compressed = quantize(pruned, value_dtype)
+        auc = auc_columns(compressed.predict(X_eval)[0], y_eval)[0]
+        if auc >= base_auc - max_auc_loss:
+            break
+
+    X_latency = np.concatenate([X_select, X_eval])
+    report = {
+        'max_auc_loss': max_auc_loss,
+        'auc_loss': float(base_auc - auc),
+        'value_dtype': np.dtype(value_dtype).name,
+        'evaluation_claims': int(len(X_eval)),
+        'original': {**describe(model.forest, base_auc), **measure_latency(model.forest, X_latency)},
+        'compressed': {**describe(compressed, auc), **measure_latency(compressed, X_latency)},
+        'candidates': candidates
+    }
+    return compressed, report
+
+
+def print_report(report):
+    original, compressed = report['original'], report['compressed']
+    print(f"\n{'':12s}{'trees':>7s}{'depth':>7s}{'nodes':>10s}{'KB':>10s}"
+          f"{'AUC':>9s}{'p50 ms':>9s}{'p99 ms':>9s}{'batch/s':>11s}")
+    for name, row in (('original', original), ('compressed', compressed)):
+        print(f"{name:12s}{row['n_trees']:7d}{row['max_depth']:7d}{row['n_nodes']:10,d}"
+              f"{row['bytes'] / 1024:10.1f}{row['auc']:9.4f}{row['p50_ms']:9.3f}"
+              f"{row['p99_ms']:9.3f}{row['batch_claims_per_sec']:11,.0f}")
+    print(f"\nSize: {original['bytes'] / compressed['bytes']:.1f}x smaller, "
+          f"p99: {original['p99_ms'] / compressed['p99_ms']:.1f}x faster, "
+          f"AUC loss: {report['auc_loss']:+.4f} (budget {report['max_auc_loss']}), "
+          f"leaf values: {report['value_dtype']}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Compress the fraud model within an AUC budget')
+    parser.add_argument('--bundle', default=BUNDLE_PATH, help='Model bundle to compress')
+    parser.add_argument('--data', nargs='+', default=[DEFAULT_DATA_PATH],
+                        help='Training CSV file(s), used to recreate the held-out split')
+    parser.add_argument('--max-auc-loss', type=float, default=DEFAULT_MAX_AUC_LOSS)
+    parser.add_argument('--min-trees', type=int, default=DEFAULT_MIN_TREES,
+                        help='Keep at least this many trees even if fewer fit the budget')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='Where to write the compressed bundle')
+    parser.add_argument('--install', action='store_true',
+                        help=f'Write to {BUNDLE_PATH} instead, so running services hot reload it')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    print("🚀 Fraud Model Compression")
+    print("="*60)
+
+    model = load_model(args.bundle)
+    if model.forest.engine != 'random_forest':
+        raise SystemExit(f"❌ Compression supports random_forest models, not {model.forest.engine}")
+    print(f"✅ Loaded model {model.version}: {model.forest.n_trees} trees, "
+          f"{model.forest.n_nodes:,} nodes, depth {model.forest.max_depth}")
+
+    compressed, report = compress(model, args.data, args.max_auc_loss, args.min_trees)
+    print_report(report)
+
+    output = BUNDLE_PATH if args.install else args.output
+    metadata = dict(model.manifest.get('metadata', {}))
+    metadata['compression'] = {**report, 'source_model_version': model.version}
+    manifest = save_bundle(compressed, model.encoders, model.feature_names, output, metadata,
+                           feature_importances=model.feature_importances, peer_groups=model.peer_groups,
+                           drift_baseline=model.drift_baseline)
+    print(f"\n💾 Compressed bundle saved: {output} (version {manifest['model_version']})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,302 @@
+"""
+Streaming drift monitoring for served claims
+Training saves a baseline of the model inputs: per numeric feature the
+decile edges of the training data, per encoded categorical its code table,
+and a histogram of held-out fraud probabilities. Serving counts every scored
+feature vector into the same fixed bins, so memory is constant and one
+observation is a binary search per feature.
+
+Drift is the population stability index (PSI) between the baseline and the
+served shares of each bin.
+
+Run: python drift_monitor.py  (build drift_baseline.pkl for the existing model artifacts)
+"""
+
+import bisect
+import threading
+import numpy as np
+
+NUMERIC_BINS = 10
+# Encoded categoricals with more codes than this are binned like numbers
+MAX_CATEGORY_BINS = 256
+PROBABILITY_BINS = 20
+
+# Share used for empty bins, so PSI stays finite
+PSI_EPSILON = 1e-4
+# Usual PSI reading: below 0.1 stable, up to 0.25 moderate shift, above significant
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.25
+MIN_DRIFT_CLAIMS = 500
+TOP_CATEGORY_SHIFTS = 3
+
+BASELINE_VERSION = 1
+
+
+class DriftBaseline:
+    """Bin edges and expected bin shares of the training data"""
+
+    def __init__(self, feature_names, kinds, edges, expected, probability_expected, rows):
+        self.feature_names = list(feature_names)
+        self.kinds = list(kinds)                    # 'numeric' or 'categorical'
+        self.edges = [np.asarray(e, dtype=np.float64) for e in edges]
+        self.expected = [np.asarray(e, dtype=np.float64) for e in expected]
+        self.probability_expected = np.asarray(probability_expected, dtype=np.float64)
+        self.rows = rows
+
+    @classmethod
+    def build(cls, X, feature_names, probabilities, category_counts=None):
+        """Baseline from the training matrix and held-out fraud probabilities
+
+        category_counts: feature name -> number of codes for the encoded categoricals
+        """
+        X = np.asarray(X, dtype=np.float64)
+        category_counts = category_counts or {}
+        kinds, edges, expected = [], [], []
+
+        for j, name in enumerate(feature_names):
+            column = X[:, j]
+            n_codes = category_counts.get(name)
+            if n_codes is not None and n_codes <= MAX_CATEGORY_BINS:
+                # One bin per code
+                kinds.append('categorical')
+                column_edges = np.arange(n_codes - 1) + 0.5
+            else:
+                kinds.append('numeric')
+                column_edges = np.unique(np.quantile(column, np.arange(1, NUMERIC_BINS) / NUMERIC_BINS))
+            edges.append(column_edges)
+            expected.append(_shares(np.bincount(_bins(column_edges, column), minlength=len(column_edges) + 1)))
+
+        probability_counts = np.bincount(_probability_bins(probabilities), minlength=PROBABILITY_BINS)
+        return cls(feature_names, kinds, edges, expected, _shares(probability_counts), len(X))
+
+    def to_dict(self):
+        return {
+            'version': BASELINE_VERSION,
+            'feature_names': self.feature_names,
+            'kinds': self.kinds,
+            'edges': [e.tolist() for e in self.edges],
+            'expected': [e.tolist() for e in self.expected],
+            'probability_expected': self.probability_expected.tolist(),
+            'rows': self.rows
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('version') != BASELINE_VERSION:
+            raise ValueError(f"Unsupported drift baseline version: {data.get('version')}")
+        return cls(data['feature_names'], data['kinds'], data['edges'], data['expected'],
+                   data['probability_expected'], data['rows'])
+
+
+class DriftMonitor:
+    """Thread-safe fixed-size bin counts of served features and probabilities
+
+    With window_claims set, counts cover the current and the previous
+    window, so the report follows recent traffic instead of everything
+    since start.
+    """
+
+    def __init__(self, baseline, window_claims=0):
+        self.baseline = baseline
+        self.window_claims = window_claims
+
+        # Every feature's bins in one flat count vector; plain lists, since
+        # bisect over ~20 short lists beats NumPy call overhead for one claim
+        self.edge_lists = [e.tolist() for e in baseline.edges]
+        sizes = [len(e) + 1 for e in self.edge_lists]
+        self.offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64).tolist()
+        self.n_counts = sum(sizes)
+
+        self.lock = threading.Lock()
+        self.current = self._empty()
+        self.previous = self._empty()
+
+    def _empty(self):
+        return {
+            'features': [0] * self.n_counts,
+            'probabilities': [0] * PROBABILITY_BINS,
+            'claims': 0
+        }
+
+    def _window(self):
+        """Counts to add to (caller holds the lock)"""
+        if self.window_claims and self.current['claims'] >= self.window_claims:
+            self.previous = self.current
+            self.current = self._empty()
+        return self.current
+
+    def observe(self, features, probability):
+        """Count one scored claim (features in model order)"""
+        index = [
+            offset + bisect.bisect_right(edges, value)
+            for offset, edges, value in zip(self.offsets, self.edge_lists, features)
+        ]
+        probability_bin = min(int(probability * PROBABILITY_BINS), PROBABILITY_BINS - 1)
+
+        with self.lock:
+            window = self._window()
+            counts = window['features']
+            for i in index:
+                counts[i] += 1
+            window['probabilities'][probability_bin] += 1
+            window['claims'] += 1
+
+    def observe_many(self, X, probabilities):
+        """Count a batch of scored claims"""
+        X = np.asarray(X, dtype=np.float64)
+        if not len(X):
+            return
+        index = np.concatenate([
+            offset + _bins(self.baseline.edges[j], X[:, j])
+            for j, offset in enumerate(self.offsets)
+        ])
+        feature_counts = np.bincount(index, minlength=self.n_counts).tolist()
+        probability_counts = np.bincount(_probability_bins(probabilities), minlength=PROBABILITY_BINS).tolist()
+
+        with self.lock:
+            window = self._window()
+            window['features'] = [a + b for a, b in zip(window['features'], feature_counts)]
+            window['probabilities'] = [a + b for a, b in zip(window['probabilities'], probability_counts)]
+            window['claims'] += len(X)
+
+    def reset(self):
+        with self.lock:
+            self.current = self._empty()
+            self.previous = self._empty()
+
+    def snapshot(self):
+        """(feature counts per feature, probability counts, claims) over both windows"""
+        with self.lock:
+            features = np.add(self.current['features'], self.previous['features'])
+            probabilities = np.add(self.current['probabilities'], self.previous['probabilities'])
+            claims = self.current['claims'] + self.previous['claims']
+        per_feature = [
+            features[offset:offset + len(edges) + 1]
+            for offset, edges in zip(self.offsets, self.edge_lists)
+        ]
+        return per_feature, probabilities, claims
+
+    def report(self, category_names=None):
+        """PSI per feature and for the fraud probability, most drifted features first
+
+        category_names: feature name -> sequence of category labels by code
+        """
+        counts, probability_counts, claims = self.snapshot()
+        category_names = category_names or {}
+        baseline = self.baseline
+
+        features = []
+        for j, name in enumerate(baseline.feature_names):
+            expected = baseline.expected[j]
+            observed = _shares(counts[j])
+            entry = {
+                'feature': name,
+                'kind': baseline.kinds[j],
+                'psi': round(psi(expected, observed), 6) if claims else None
+            }
+            entry['status'] = drift_status(entry['psi'], claims)
+            if baseline.kinds[j] == 'categorical' and claims:
+                entry['top_shifts'] = category_shifts(expected, observed, category_names.get(name))
+            features.append(entry)
+        features.sort(key=lambda f: -(f['psi'] or 0.0))
+
+        probability_observed = _shares(probability_counts)
+        probability_psi = round(psi(baseline.probability_expected, probability_observed), 6) if claims else None
+        return {
+            'claims_observed': int(claims),
+            'baseline_rows': baseline.rows,
+            'window_claims': self.window_claims or None,
+            'drifted_features': sum(f['status'] == 'significant' for f in features),
+            'features': features,
+            'fraud_probability': {
+                'psi': probability_psi,
+                'status': drift_status(probability_psi, claims),
+                'bin_edges': np.linspace(0, 1, PROBABILITY_BINS + 1).round(4).tolist(),
+                'baseline_share': baseline.probability_expected.round(6).tolist(),
+                'served_share': probability_observed.round(6).tolist()
+            }
+        }
+
+    def psi_by_feature(self):
+        """{feature: psi} for the metrics gauges, empty before the first claim"""
+        counts, _, claims = self.snapshot()
+        if not claims:
+            return {}
+        return {
+            name: psi(expected, _shares(counts[j]))
+            for j, (name, expected) in enumerate(zip(self.baseline.feature_names, self.baseline.expected))
+        }
+
+
+def psi(expected, observed):
+    """Population stability index between two share vectors"""
+    expected = np.maximum(expected, PSI_EPSILON)
+    observed = np.maximum(observed, PSI_EPSILON)
+    return float(np.sum((observed - expected) * np.log(observed / expected)))
+
+
+def drift_status(value, claims):
+    if value is None or claims < MIN_DRIFT_CLAIMS:
+        return 'insufficient_data'
+    if value >= PSI_SIGNIFICANT:
+        return 'significant'
+    if value >= PSI_MODERATE:
+        return 'moderate'
+    return 'stable'
+
+
+def category_shifts(expected, observed, labels=None):
+    """Codes whose share moved the most"""
+    order = np.argsort(-np.abs(observed - expected))[:TOP_CATEGORY_SHIFTS]
+    return [
+        {
+            'category': str(labels[code]) if labels is not None and code < len(labels) else int(code),
+            'baseline_share': round(float(expected[code]), 6),
+            'served_share': round(float(observed[code]), 6)
+        }
+        for code in order
+    ]
+
+
+def _bins(edges, values):
+    # Same bins as bisect_right in DriftMonitor.observe: number of edges <= value
+    return np.searchsorted(edges, values, side='right')
+
+
+def _probability_bins(probabilities):
+    bins = (np.asarray(probabilities, dtype=np.float64) * PROBABILITY_BINS).astype(np.int64)
+    return np.clip(bins, 0, PROBABILITY_BINS - 1)
+
+
+def _shares(counts):
+    total = counts.sum()
+    return counts / total if total else np.zeros(len(counts))
+
+
+def category_counts(encoders, feature_names):
+    """Feature name -> number of codes, for the '<name>_encoded' features"""
+    counts = {}
+    for name, encoder in encoders.items():
+        feature = f'{name}_encoded'
+        if feature in feature_names:
+            counts[feature] = len(encoder.classes_) if hasattr(encoder, 'classes_') else len(encoder)
+    return counts
+
+
+if __name__ == '__main__':
+    import pickle
+    from compress_model import load_model, training_split
+    from model_bundle import BUNDLE_PATH
+    # Imported, so the pickle refers to drift_monitor.DriftBaseline rather than __main__
+    from train_fraud_model import DEFAULT_DATA_PATH, DRIFT_BASELINE_PATH, build_drift_baseline
+
+    print("📊 Building drift baseline for the existing model artifacts")
+    model = load_model(BUNDLE_PATH)
+    X_train, X_test, _, _ = training_split([DEFAULT_DATA_PATH], model)
+    probabilities, _ = model.forest.predict(X_test)
+
+    baseline = build_drift_baseline(X_train, model.feature_names, probabilities, model.encoders)
+    with open(DRIFT_BASELINE_PATH, 'wb') as f:
+        pickle.dump(baseline, f)
+    print(f"✅ Drift baseline saved: {DRIFT_BASELINE_PATH} ({baseline.rows} training rows)")
+    print("   Rebuild the bundle to include it: python model_bundle.py")
@@ -0,0 +1,322 @@
+"""
+Declarative feature spec shared by training and serving
+Every model input is defined once below, in model order. The spec is
+compiled into two kernels that evaluate the same expressions in the same
+order:
+
+- scalar_features(data, encoded): straight-line Python for one claim dict
+- columnar_features(columns): NumPy over whole columns (DataFrame or dict of
+  arrays) for batches, bulk scoring and training
+
+Run: python feature_spec.py  (print the generated kernels)
+"""
+
+import linecache
+from abc import ABC, abstractmethod
+import numpy as np
+
+# Filename of the generated kernels in tracebacks
+KERNEL_FILENAME = '<feature_spec>'
+
+
+class Expr(ABC):
+    """Node of a feature expression; renders itself as scalar or NumPy source"""
+
+    def __add__(self, other):
+        return BinOp('+', self, other)
+
+    def __sub__(self, other):
+        return BinOp('-', self, other)
+
+    def __mul__(self, other):
+        return BinOp('*', self, other)
+
+    def __truediv__(self, other):
+        return BinOp('/', self, other)
+
+    def __gt__(self, other):
+        return Compare('>', self, other)
+
+    def __le__(self, other):
+        return Compare('<=', self, other)
+
+    @abstractmethod
+    def scalar(self):
+        """Python source evaluating this expression for one claim"""
+
+    @abstractmethod
+    def columnar(self):
+        """NumPy source evaluating this expression over whole columns"""
+
+    def names(self):
+        """Variable names this expression reads"""
+        return set()
+
+
+def _expr(value):
+    return value if isinstance(value, Expr) else Const(value)
+
+
+class Const(Expr):
+    def __init__(self, value):
+        self.value = value
+
+    def scalar(self):
+        return repr(self.value)
+
+    columnar = scalar
+
+
+class Var(Expr):
+    """A parsed input or an earlier feature, read from a local variable"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def scalar(self):
+        return self.name
+
+    columnar = scalar
+
+    def names(self):
+        return {self.name}
+
+
+class BinOp(Expr):
+    def __init__(self, op, left, right):
+        self.op, self.left, self.right = op, _expr(left), _expr(right)
+
+    def scalar(self):
+        return f'({self.left.scalar()} {self.op} {self.right.scalar()})'
+
+    def columnar(self):
+        return f'({self.left.columnar()} {self.op} {self.right.columnar()})'
+
+    def names(self):
+        return self.left.names() | self.right.names()
+
+
+class Compare(BinOp):
+    """Boolean condition; use flag() to turn it into a 0/1 feature"""
+
+
+class Where(Expr):
+    def __init__(self, condition, then, otherwise):
+        self.condition, self.then, self.otherwise = condition, _expr(then), _expr(otherwise)
+
+    def scalar(self):
+        # Lazy, so e.g. a division by zero in the unused branch never runs
+        return f'({self.then.scalar()} if {self.condition.scalar()} else {self.otherwise.scalar()})'
+
+    def columnar(self):
+        return f'np.where({self.condition.columnar()}, {self.then.columnar()}, {self.otherwise.columnar()})'
+
+    def names(self):
+        return self.condition.names() | self.then.names() | self.otherwise.names()
+
+
+class Flag(Expr):
+    def __init__(self, condition):
+        self.condition = condition
+
+    def scalar(self):
+        return f'int({self.condition.scalar()})'
+
+    def columnar(self):
+        return f'{self.condition.columnar()}.astype(np.float64)'
+
+    def names(self):
+        return self.condition.names()
+
+
+class Input(Var):
+    """Raw numeric claim field; default None means the field is required"""
+
+    def __init__(self, name, parse, default=None):
+        super().__init__(name)
+        self.parse = parse
+        self.default = default
+
+
+class Encoded(Var):
+    """Categorical code from the model's encoders (column '<name>_encoded')"""
+
+    def __init__(self, name):
+        super().__init__(f'{name}_encoded')
+        self.category = name
+
+
+class Feature(Var):
+    """Named model input; can be referenced by later features"""
+
+    def __init__(self, name, expr):
+        super().__init__(name)
+        self.expr = expr
+
+    @property
+    def derived(self):
+        """False when the feature is an input or code passed through unchanged"""
+        return not (isinstance(self.expr, Var) and self.expr.name == self.name)
+
+
+def safe_div(numerator, denominator, fallback):
+    """numerator / denominator, or fallback when denominator <= 0"""
+    return Where(denominator > 0, numerator / denominator, fallback)
+
+
+def flag(condition):
+    return Flag(condition)
+
+
+# Raw claim fields and how serving parses them
+tarif_rs = Input('tarif_rs', float)
+tarif_inacbg = Input('tarif_inacbg', float)
+los_days = Input('los_days', int, default=1)
+num_procedures = Input('num_procedures', int, default=0)
+patient_age = Input('patient_age', int, default=50)
+provider_claims_count = Input('provider_claims_count', int, default=1)
+provider_high_cost_rate = Input('provider_high_cost_rate', float, default=0.0)
+
+# Point-in-time provider history: claims of the doctor / hospital submitted in
+# the 30 or 90 days before this claim's submitted_date (see provider_store.py)
+provider_claims_30d = Input('provider_claims_30d', int, default=0)
+provider_high_cost_rate_30d = Input('provider_high_cost_rate_30d', float, default=0.0)
+provider_claims_90d = Input('provider_claims_90d', int, default=0)
+provider_high_cost_rate_90d = Input('provider_high_cost_rate_90d', float, default=0.0)
+hospital_claims_30d = Input('hospital_claims_30d', int, default=0)
+hospital_high_cost_rate_30d = Input('hospital_high_cost_rate_30d', float, default=0.0)
+hospital_claims_90d = Input('hospital_claims_90d', int, default=0)
+hospital_high_cost_rate_90d = Input('hospital_high_cost_rate_90d', float, default=0.0)
+ROLLING_HISTORY = [
+    provider_claims_30d, provider_high_cost_rate_30d, provider_claims_90d, provider_high_cost_rate_90d,
+    hospital_claims_30d, hospital_high_cost_rate_30d, hospital_claims_90d, hospital_high_cost_rate_90d
+]
+
+# Filled from the model's peer-group table (peer_groups.py); a zero scale
+# means no peers and turns the deviation features off
+peer_tariff_median = Input('peer_tariff_median', float, default=0.0)
+peer_tariff_scale = Input('peer_tariff_scale', float, default=0.0)
+peer_los_median = Input('peer_los_median', float, default=0.0)
+peer_los_scale = Input('peer_los_scale', float, default=0.0)
+
+INPUTS = [tarif_rs, tarif_inacbg, los_days, num_procedures, patient_age,
+          provider_claims_count, provider_high_cost_rate,
+          *ROLLING_HISTORY,
+          peer_tariff_median, peer_tariff_scale, peer_los_median, peer_los_scale]
+ENCODED = [Encoded(name) for name in ('hospital', 'doctor', 'icd10', 'gender', 'care_class')]
+
+tariff_ratio = Feature('tariff_ratio', safe_div(tarif_rs, tarif_inacbg, 1.0))
+
+# Model inputs in the order the model was trained on
+FEATURES = [
+    # Tariff features (derived from the two tariffs, never taken from the claim)
+    tariff_ratio,
+    Feature('tariff_diff_percentage', safe_div(tarif_rs - tarif_inacbg, tarif_inacbg, 0.0) * 100),
+    Feature('tariff_difference', tarif_rs - tarif_inacbg),
+    Feature('tarif_inacbg', tarif_inacbg),
+    Feature('tarif_rs', tarif_rs),
+    # A zero-day stay counts as one day
+    Feature('tariff_per_day', safe_div(tarif_rs, los_days, tarif_rs)),
+
+    # Clinical features
+    Feature('los_days', los_days),
+    Feature('num_procedures', num_procedures),
+    Feature('procedure_intensity', safe_div(num_procedures, los_days, num_procedures)),
+    Feature('patient_age', patient_age),
+
+    # Provider features
+    Feature('provider_claims_count', provider_claims_count),
+    Feature('provider_high_cost_rate', provider_high_cost_rate),
+    *[Feature(field.name, field) for field in ROLLING_HISTORY],
+
+    # Deviation from the claim's (icd10, care_class, hospital) peers, in robust standard deviations
+    Feature('tariff_peer_deviation', safe_div(tarif_rs - peer_tariff_median, peer_tariff_scale, 0.0)),
+    Feature('los_peer_deviation', safe_div(los_days - peer_los_median, peer_los_scale, 0.0)),
+
+    # Encoded categoricals
+    *[Feature(code.name, code) for code in ENCODED],
+
+    # Binary flags
+    Feature('is_high_cost', flag(tariff_ratio > 1.3)),
+    Feature('is_long_stay', flag(los_days > 5)),
+    Feature('has_procedures', flag(num_procedures > 0))
+]
+
+FEATURE_NAMES = [feature.name for feature in FEATURES]
+DERIVED_FEATURES = [feature.name for feature in FEATURES if feature.derived]
+
+
+def _check_spec(features):
+    """Every expression may only read inputs, codes and earlier features"""
+    available = {i.name for i in INPUTS} | {code.name for code in ENCODED}
+    for feature in features:
+        unknown = feature.expr.names() - available
+        if unknown:
+            raise ValueError(f'Feature {feature.name} reads undefined {sorted(unknown)}')
+        available.add(feature.name)
+
+
+def scalar_source(features=FEATURES):
+    lines = ['def scalar_features(data, encoded):']
+    for field in INPUTS:
+        parse = field.parse.__name__
+        if field.default is None:
+            lines.append(f"    {field.name} = {parse}(data['{field.name}'])")
+        else:
+            lines.append(f"    {field.name} = {parse}(data.get('{field.name}', {field.default!r}))")
+    for code in ENCODED:
+        lines.append(f"    {code.name} = encoded['{code.category}']")
+    for feature in features:
+        if feature.derived:
+            lines.append(f'    {feature.name} = {feature.expr.scalar()}')
+    lines.append(f"    return [{', '.join(f.name for f in features)}]")
+    return '\n'.join(lines) + '\n'
+
+
+def columnar_source(features=FEATURES):
+    required = next(field.name for field in INPUTS if field.default is None)
+    lines = [
+        'def columnar_features(columns):',
+        f"    n_rows = len(columns['{required}'])"
+    ]
+    for field in INPUTS:
+        lines.append(f"    {field.name} = _column(columns, '{field.name}', {field.default!r}, "
+                     f"{field.parse is int}, n_rows)")
+    for code in ENCODED:
+        lines.append(f"    {code.name} = _column(columns, '{code.name}', None, False, n_rows)")
+    lines.append("    with np.errstate(divide='ignore', invalid='ignore'):")
+    for feature in features:
+        if feature.derived:
+            lines.append(f'        {feature.name} = {feature.expr.columnar()}')
+    lines.append(f"    return np.column_stack([{', '.join(f.name for f in features)}])")
+    return '\n'.join(lines) + '\n'
+
+
+def _column(columns, name, default, integer, n_rows):
+    """One input column as float64; missing optional columns take the default"""
+    if default is not None and name not in columns:
+        return np.full(n_rows, float(default))
+    values = np.asarray(columns[name], dtype=np.float64)
+    # int() in the scalar kernel truncates
+    return np.trunc(values) if integer else values
+
+
+def compile_kernels(features=FEATURES):
+    """Compile the spec, returns (scalar_features, columnar_features)"""
+    _check_spec(features)
+    source = scalar_source(features) + '\n\n' + columnar_source(features)
+    code = compile(source, KERNEL_FILENAME, 'exec')
+    # Tracebacks through the kernels show the generated line
+    linecache.cache[KERNEL_FILENAME] = (len(source), None, source.splitlines(True), KERNEL_FILENAME)
+
+    namespace = {'np': np, '_column': _column}
+    exec(code, namespace)
+    return namespace['scalar_features'], namespace['columnar_features']
+
+
+scalar_features, columnar_features = compile_kernels()
+
+
+if __name__ == '__main__':
+    print(scalar_source())
+    print(columnar_source())
@@ -1,10 +1,16 @@
 """
 Generate synthetic claims data for fraud detection training
 Creates 1000 rows with realistic patterns and fraud cases
+
+Run: python generate_fraud_data.py
+     python generate_fraud_data.py --rows 10000000 --shards 8 --workers 8
 """
 
+import argparse
+import os
 import pandas as pd
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 import random
 
@@ -26,6 +32,14 @@ DOCTORS = [
     f'DR{str(i).zfill(3)}' for i in range(1, 51)
 ]
 
+# Patients (BPJS card holders); the pool is small enough that patients come
+# back, so the data has repeat and overlapping stays (see claim_index.py)
+NUM_PATIENTS = 400
+VECTORIZED_NUM_PATIENTS = 1000000
+
+def patient_ids(indices):
+    return 'P' + pd.Series(indices).astype(str).str.zfill(7)
+
 ICD10_CODES = [
     ('J18.9', 'Pneumonia', 4850000, 3),  # (ICD, name, avg_tariff, avg_los)
     ('I10', 'Hipertensi', 2500000, 1),
@@ -53,6 +67,15 @@ ICD9_PROCEDURES = [
 
 CARE_CLASSES = ['1', '2', '3']
 
+FRAUD_TYPES = [
+    'legitimate', 'overcharging', 'hospital_fraud',
+    'upcoding', 'unnecessary_procedures', 'extended_stay'
+]
+
+# Vectorized generator settings
+DEFAULT_CHUNK_SIZE = 500000
+DEFAULT_OUTPUT_DIR = 'generated_claims'
+
 def generate_claims_data():
     """Generate synthetic claims dataset with fraud patterns"""
 
@@ -66,6 +89,10 @@ def generate_claims_data():
     fraudulent_providers = random.sample(DOCTORS, 8)  # 8 out of 50 doctors
     fraudulent_hospitals = random.sample(HOSPITALS, 2)  # 2 out of 10 hospitals
 
+    # Own generator, so every other column draws the same numbers as without patients
+    patient_rng = random.Random(42)
+    patients = patient_ids(range(1, NUM_PATIENTS + 1)).tolist()
+
     for i in range(NUM_CLAIMS):
         # Random selection
         hospital_code = random.choice(HOSPITALS)
@@ -147,6 +174,7 @@ def generate_claims_data():
             'claim_id': f'CLM-2025-{str(i+2000).zfill(4)}',
             'hospital_code': hospital_code,
             'doctor_id': doctor_id,
+            'patient_id': patient_rng.choice(patients),
             'patient_age': random.randint(18, 85),
             'patient_gender': random.choice(['L', 'P']),
             'icd10_code': icd10_code,
@@ -184,7 +212,258 @@ def generate_claims_data():
 
     return df
 
-if __name__ == '__main__':
+def _fraudulent_entities(seed):
+    """Pick the fraudulent doctors and hospitals shared by every shard"""
+    rng = np.random.default_rng([seed, 0])
+    fraud_doctors = np.zeros(len(DOCTORS), dtype=bool)
+    fraud_doctors[rng.choice(len(DOCTORS), 8, replace=False)] = True
+    fraud_hospitals = np.zeros(len(HOSPITALS), dtype=bool)
+    fraud_hospitals[rng.choice(len(HOSPITALS), 2, replace=False)] = True
+    return fraud_doctors, fraud_hospitals
+
+def _draw_chunk(seed, shard, chunk, num_rows):
+    """Draw the numeric columns of one chunk, deterministic per (seed, shard, chunk)"""
+    rng = np.random.default_rng([seed, shard + 1, chunk])
+    fraud_doctors, fraud_hospitals = _fraudulent_entities(seed)
+
+    base_tariffs = np.array([d[2] for d in ICD10_CODES], dtype=np.float64)
+    base_los = np.array([d[3] for d in ICD10_CODES], dtype=np.int64)
+
+    hospital = rng.integers(0, len(HOSPITALS), num_rows)
+    doctor = rng.integers(0, len(DOCTORS), num_rows)
+    diagnosis = rng.integers(0, len(ICD10_CODES), num_rows)
+    care_class = rng.integers(0, len(CARE_CLASSES), num_rows)
+
+    # Base values
+    tarif_inacbg = base_tariffs[diagnosis] * (1 + rng.normal(0, 0.1, num_rows))
+    los = np.maximum(1, (base_los[diagnosis] + rng.normal(0, 1, num_rows)).astype(np.int64))
+
+    # 0-3 distinct procedures: the first k columns of a random permutation
+    num_procedures = rng.integers(0, 4, num_rows)
+    procedure_order = np.argsort(rng.random((num_rows, len(ICD9_PROCEDURES))), axis=1)[:, :3]
+
+    tarif_rs = tarif_inacbg * (1 + rng.normal(0, 0.15, num_rows))
+    fraud_type = np.zeros(num_rows, dtype=np.int8)
+
+    def inject(mask, multiplier, type_index):
+        tarif_rs[mask] = (tarif_inacbg * multiplier)[mask]
+        fraud_type[mask] = type_index
+
+    # Same five patterns, in the same order, as generate_claims_data
+    inject(fraud_doctors[doctor] & (rng.random(num_rows) < 0.7),
+           1.3 + rng.random(num_rows) * 0.5, 1)
+    inject(fraud_hospitals[hospital] & (rng.random(num_rows) < 0.6),
+           1.4 + rng.random(num_rows) * 0.6, 2)
+    inject(rng.random(num_rows) < 0.05, 1.5 * 1.3, 3)
+    inject((num_procedures >= 3) & (tarif_inacbg < 3000000),
+           1.5 + rng.random(num_rows) * 0.5, 4)
+    inject(los > base_los[diagnosis] * 2, 1.3 + rng.random(num_rows) * 0.4, 5)
+
+    return {
+        'hospital': hospital,
+        'doctor': doctor,
+        'diagnosis': diagnosis,
+        'care_class': care_class,
+        'tarif_inacbg': tarif_inacbg,
+        'tarif_rs': tarif_rs,
+        'los': los,
+        'num_procedures': num_procedures,
+        'procedure_order': procedure_order,
+        'fraud_type': fraud_type,
+        'patient_age': rng.integers(18, 86, num_rows),
+        'gender': rng.integers(0, 2, num_rows),
+        'submitted_offset': rng.integers(0, 91, num_rows),
+        'admission_gap': rng.integers(1, 6, num_rows),
+        # Drawn last so the draws above are the same as before patients were added
+        'patient': rng.integers(1, VECTORIZED_NUM_PATIENTS + 1, num_rows)
+    }
+
+def _is_high_cost(arrays):
+    return arrays['tarif_rs'] / arrays['tarif_inacbg'] > 1.2
+
+def _chunk_bounds(num_rows, chunk_size):
+    return [(start, min(chunk_size, num_rows - start)) for start in range(0, num_rows, chunk_size)]
+
+def _shard_provider_totals(seed, shard, num_rows, chunk_size):
+    """Per-doctor (claims, high cost claims) produced by one shard"""
+    counts = np.zeros(len(DOCTORS), dtype=np.int64)
+    high = np.zeros(len(DOCTORS), dtype=np.int64)
+
+    for chunk, (_, n) in enumerate(_chunk_bounds(num_rows, chunk_size)):
+        arrays = _draw_chunk(seed, shard, chunk, n)
+        counts += np.bincount(arrays['doctor'], minlength=len(DOCTORS))
+        high += np.bincount(arrays['doctor'], weights=_is_high_cost(arrays),
+                            minlength=len(DOCTORS)).astype(np.int64)
+
+    return counts, high
+
+def _build_chunk_frame(arrays, first_index, doctor_counts, doctor_high, reference_date):
+    """Format one chunk as a DataFrame, advancing the running provider counters"""
+    num_rows = len(arrays['doctor'])
+    doctor = arrays['doctor']
+    tarif_inacbg = arrays['tarif_inacbg']
+    tarif_rs = arrays['tarif_rs']
+    los = arrays['los']
+
+    tariff_ratio = tarif_rs / tarif_inacbg
+    tariff_difference = tarif_rs - tarif_inacbg
+    tariff_diff_percentage = (tarif_rs - tarif_inacbg) / tarif_inacbg * 100
+
+    # Running provider statistics, continuing from the counters of earlier rows
+    high_cost = (tariff_ratio > 1.2).astype(np.int64)
+    by_doctor = pd.Series(high_cost).groupby(doctor)
+    provider_claims_count = doctor_counts[doctor] + by_doctor.cumcount().to_numpy() + 1
+    provider_high_count = doctor_high[doctor] + by_doctor.cumsum().to_numpy()
+    doctor_counts += np.bincount(doctor, minlength=len(DOCTORS))
+    doctor_high += np.bincount(doctor, weights=high_cost, minlength=len(DOCTORS)).astype(np.int64)
+
+    # Procedure code lists
+    procedure_codes = np.array([p[0] for p in ICD9_PROCEDURES], dtype=object)[arrays['procedure_order']]
+    num_procedures = arrays['num_procedures']
+    procedures = np.where(num_procedures >= 1, procedure_codes[:, 0], '')
+    procedures = np.where(num_procedures >= 2, procedures + ',' + procedure_codes[:, 1], procedures)
+    procedures = np.where(num_procedures >= 3, procedures + ',' + procedure_codes[:, 2], procedures)
+
+    # Dates
+    submitted_date = np.datetime64(reference_date, 'D') - arrays['submitted_offset'].astype('timedelta64[D]')
+    admission_date = submitted_date - (los + arrays['admission_gap']).astype('timedelta64[D]')
+    discharge_date = admission_date + los.astype('timedelta64[D]')
+
+    claim_numbers = pd.Series(np.arange(first_index, first_index + num_rows) + 2000).astype(str).str.zfill(4)
+
+    return pd.DataFrame({
+        'claim_id': 'CLM-2025-' + claim_numbers,
+        'hospital_code': np.array(HOSPITALS)[arrays['hospital']],
+        'doctor_id': np.array(DOCTORS)[doctor],
+        'patient_id': patient_ids(arrays['patient']).to_numpy(),
+        'patient_age': arrays['patient_age'],
+        'patient_gender': np.array(['L', 'P'])[arrays['gender']],
+        'icd10_code': np.array([d[0] for d in ICD10_CODES])[arrays['diagnosis']],
+        'diagnosis_name': np.array([d[1] for d in ICD10_CODES])[arrays['diagnosis']],
+        'procedures': procedures,
+        'num_procedures': num_procedures,
+        'care_class': np.array(CARE_CLASSES)[arrays['care_class']],
+        'los_days': los,
+        'admission_date': np.datetime_as_string(admission_date, unit='D'),
+        'discharge_date': np.datetime_as_string(discharge_date, unit='D'),
+        'submitted_date': np.datetime_as_string(submitted_date, unit='D'),
+        'tarif_inacbg': np.round(tarif_inacbg, 2),
+        'tarif_rs': np.round(tarif_rs, 2),
+        'tariff_difference': np.round(tariff_difference, 2),
+        'tariff_ratio': np.round(tariff_ratio, 4),
+        'tariff_diff_percentage': np.round(tariff_diff_percentage, 2),
+        'provider_claims_count': provider_claims_count,
+        'provider_high_cost_rate': np.round(provider_high_count / provider_claims_count, 4),
+        'is_fraud': (arrays['fraud_type'] > 0).astype(np.int8),
+        'fraud_type': np.array(FRAUD_TYPES)[arrays['fraud_type']]
+    })
+
+def iter_shard_chunks(seed, shard, first_index, num_rows, doctor_counts, doctor_high,
+                      reference_date, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield the DataFrame chunks of one shard
+
+    doctor_counts/doctor_high hold the per-doctor counters of all rows before
+    this shard and are advanced in place.
+    """
+    for chunk, (start, n) in enumerate(_chunk_bounds(num_rows, chunk_size)):
+        arrays = _draw_chunk(seed, shard, chunk, n)
+        yield _build_chunk_frame(arrays, first_index + start, doctor_counts, doctor_high, reference_date)
+
+def _write_shard(args):
+    seed, shard, first_index, num_rows, doctor_counts, doctor_high, reference_date, chunk_size, path = args
+
+    for i, chunk in enumerate(iter_shard_chunks(seed, shard, first_index, num_rows,
+                                                doctor_counts, doctor_high,
+                                                reference_date, chunk_size)):
+        chunk.to_csv(path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+
+    return path
+
+def _shard_sizes(num_rows, num_shards):
+    base, extra = divmod(num_rows, num_shards)
+    return [base + (1 if shard < extra else 0) for shard in range(num_shards)]
+
+def generate_claims_data_vectorized(num_claims, seed=42, reference_date=None,
+                                    chunk_size=DEFAULT_CHUNK_SIZE):
+    """In-memory vectorized generator, same columns as generate_claims_data"""
+    reference_date = reference_date or datetime.now().strftime('%Y-%m-%d')
+    doctor_counts = np.zeros(len(DOCTORS), dtype=np.int64)
+    doctor_high = np.zeros(len(DOCTORS), dtype=np.int64)
+
+    chunks = iter_shard_chunks(seed, 0, 0, num_claims, doctor_counts, doctor_high,
+                               reference_date, chunk_size)
+    return pd.concat(chunks, ignore_index=True)
+
+def generate_sharded_dataset(num_claims, num_shards=1, workers=1, seed=42,
+                             output_dir=DEFAULT_OUTPUT_DIR, reference_date=None,
+                             chunk_size=DEFAULT_CHUNK_SIZE):
+    """Generate num_claims rows into num_shards CSV files, in parallel
+
+    The output depends only on (num_claims, num_shards, seed, reference_date),
+    not on the number of workers. Provider statistics run across shard
+    boundaries exactly as if the rows were generated in one stream: a cheap
+    first pass computes each shard's per-doctor totals, and every shard then
+    starts from the totals of the shards before it.
+    """
+    reference_date = reference_date or datetime.now().strftime('%Y-%m-%d')
+    os.makedirs(output_dir, exist_ok=True)
+
+    sizes = _shard_sizes(num_claims, num_shards)
+    first_indices = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Pass 1: per-shard provider totals (numeric draws only, no formatting)
+        totals = list(pool.map(
+            _shard_provider_totals,
+            [seed] * num_shards, range(num_shards), sizes, [chunk_size] * num_shards
+        ))
+
+        # Pass 2: each shard starts from the counters of all preceding shards
+        tasks = []
+        doctor_counts = np.zeros(len(DOCTORS), dtype=np.int64)
+        doctor_high = np.zeros(len(DOCTORS), dtype=np.int64)
+        for shard in range(num_shards):
+            path = os.path.join(output_dir, f'claims_part-{shard:05d}.csv')
+            tasks.append((seed, shard, int(first_indices[shard]), sizes[shard],
+                          doctor_counts.copy(), doctor_high.copy(),
+                          reference_date, chunk_size, path))
+            doctor_counts += totals[shard][0]
+            doctor_high += totals[shard][1]
+
+        paths = list(pool.map(_write_shard, tasks))
+
+    return paths
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Generate synthetic claims data')
+    parser.add_argument('--rows', type=int, default=None,
+                        help='Rows to generate with the vectorized generator '
+                             f'(default: {NUM_CLAIMS} rows with the original generator)')
+    parser.add_argument('--shards', type=int, default=1, help='Number of output files')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Parallel processes')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Rows per write')
+    parser.add_argument('--seed', type=int, default=42, help='Base random seed')
+    parser.add_argument('--reference-date', default=None,
+                        help='Latest submitted_date, YYYY-MM-DD (default: today)')
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR, help='Directory for shard files')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    if args.rows is not None:
+        start = datetime.now()
+        paths = generate_sharded_dataset(
+            args.rows, num_shards=args.shards, workers=args.workers, seed=args.seed,
+            output_dir=args.output_dir, reference_date=args.reference_date,
+            chunk_size=args.chunk_size
+        )
+        elapsed = (datetime.now() - start).total_seconds()
+        print(f"✅ Generated {args.rows:,} claims in {len(paths)} shard(s) ({elapsed:.1f}s)")
+        for path in paths:
+            print(f"   {path}")
+        return
+
     # Generate data
     df = generate_claims_data()
 
@@ -199,3 +478,6 @@ if __name__ == '__main__':
 
     print("\n🚨 Fraud examples:")
     print(df[df['is_fraud']==1].head(5)[['claim_id', 'doctor_id', 'tariff_ratio', 'fraud_type']])
+
+if __name__ == '__main__':
+    main()
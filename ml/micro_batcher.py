@@ -0,0 +1,174 @@
+"""
+Asyncio micro-batching for single-claim scoring
+Concurrent /predict requests hand their feature row to one event loop that
+coalesces them into a single vectorized forest call, flushed when the batch
+is full, the oldest request has waited max_wait_ms or no other request is on
+its way (a lone request never waits)
+"""
+
+import asyncio
+import threading
+import time
+import numpy as np
+
+DEFAULT_MAX_BATCH_SIZE = 64
+DEFAULT_MAX_WAIT_MS = 2.0
+
+# Upper bounds of the batch size histogram buckets
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class MicroBatcher:
+    """Coalesces concurrent predict calls into batched predict_fn calls
+
+    predict_fn(X) must return (probabilities, labels) for a 2-D array, like
+    CompiledForest.predict. Callers may pass their own predict_fn per row;
+    rows are only ever batched with rows for the same function, so requests
+    pinned to different model versions are never mixed in one forest call.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+                 max_wait_ms=DEFAULT_MAX_WAIT_MS):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.loop = None
+        self.queue = None
+        self._thread = None
+        self._ready = threading.Event()
+
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.max_pending = 0
+        self.batches = 0
+        self.claims = 0
+        self.max_batch_seen = 0
+        self.histogram = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Run the event loop in a daemon thread"""
+        if self.running:
+            return
+
+        self._ready.clear()
+        self._thread = threading.Thread(target=self._run_loop, name='micro-batcher', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def stop(self):
+        if not self.running:
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self._thread = None
+
+    def predict(self, row, predict_fn=None, timeout=None):
+        """Score one feature row, blocking the calling thread until its batch is done
+
+        Returns (fraud probability, label).
+        """
+        predict_fn = predict_fn or self.predict_fn
+        with self.lock:
+            self.pending += 1
+            self.max_pending = max(self.max_pending, self.pending)
+        try:
+            future = asyncio.run_coroutine_threadsafe(self._submit(row, predict_fn), self.loop)
+            return future.result(timeout)
+        finally:
+            with self.lock:
+                self.pending -= 1
+
+    def stats(self):
+        with self.lock:
+            histogram = {
+                f'<={bound}': count for bound, count in zip(BATCH_SIZE_BUCKETS, self.histogram)
+            }
+            histogram[f'>{BATCH_SIZE_BUCKETS[-1]}'] = self.histogram[-1]
+            return {
+                'enabled': self.running,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.0,
+                'queue_depth': self.pending,
+                'max_queue_depth': self.max_pending,
+                'batches': self.batches,
+                'claims': self.claims,
+                'avg_batch_size': self.claims / self.batches if self.batches else 0.0,
+                'max_batch_size_seen': self.max_batch_seen,
+                'batch_size_histogram': histogram
+            }
+
+    def _run_loop(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.queue = asyncio.Queue()
+        task = self.loop.create_task(self._collect())
+        self.loop.call_soon(self._ready.set)
+        try:
+            self.loop.run_forever()
+        finally:
+            task.cancel()
+            self.loop.run_until_complete(asyncio.gather(task, return_exceptions=True))
+            self.loop.close()
+
+    async def _submit(self, row, predict_fn):
+        future = self.loop.create_future()
+        await self.queue.put((row, predict_fn, future))
+        return await future
+
+    async def _collect(self):
+        """Gather requests until the batch is full or the first one has waited max_wait
+
+        Only requests already inside predict() are waited for: when every
+        pending caller is in the batch it is flushed at once.
+        """
+        while True:
+            batch = [await self.queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                # Take whatever is already queued without yielding to the timer
+                if not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+                    continue
+                if self.pending <= len(batch):
+                    break
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            self._flush(batch)
+
+    def _flush(self, batch):
+        groups = {}
+        for row, predict_fn, future in batch:
+            groups.setdefault(predict_fn, []).append((row, future))
+
+        for predict_fn, items in groups.items():
+            futures = [future for _, future in items]
+            try:
+                X = np.asarray([row for row, _ in items], dtype=np.float64)
+                probabilities, labels = predict_fn(X)
+                for future, proba, label in zip(futures, probabilities, labels):
+                    if not future.done():
+                        future.set_result((proba, label))
+            except Exception as e:
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+
+        size = len(batch)
+        bucket = next((i for i, bound in enumerate(BATCH_SIZE_BUCKETS) if size <= bound),
+                      len(BATCH_SIZE_BUCKETS))
+        with self.lock:
+            self.batches += 1
+            self.claims += size
+            self.max_batch_seen = max(self.max_batch_seen, size)
+            self.histogram[bucket] += 1
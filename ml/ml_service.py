@@ -1,67 +1,509 @@
 """
 Flask microservice for ML fraud detection
-Serves predictions from trained Random Forest model
+Serves predictions from the trained model (Random Forest or gradient boosting)
 
 Run: python ml_service.py
 API: POST http://localhost:5001/predict
+     POST http://localhost:5001/predict_batch
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
-import pickle
 import pandas as pd
 import numpy as np
 import os
+import threading
+import time
+from datetime import datetime
+
+from audit_log import AuditLog
+from claim_index import PATIENT_ID_FIELD, ClaimIndex
+from drift_monitor import DriftMonitor
+from feature_spec import FEATURE_NAMES, ROLLING_HISTORY, scalar_features
+from micro_batcher import MicroBatcher
+from prediction_cache import PredictionCache, claim_key
+from model_bundle import BUNDLE_PATH, BundleError, load_bundle, load_legacy_artifacts
+from provider_store import HISTORY_FIELDS, ProviderFeatureStore
+from service_metrics import MetricsRegistry, SamplingProfiler
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for Next.js
 
-# Load trained model and artifacts
+# Load trained model and artifacts (the bundle at BUNDLE_PATH is preferred,
+# the separate pickle files are a fallback for models trained before bundles)
 MODEL_PATH = 'fraud_detection_model.pkl'
 ENCODERS_PATH = 'label_encoders.pkl'
 FEATURES_PATH = 'feature_names.pkl'
+PEER_GROUPS_PATH = 'peer_groups.pkl'
+DRIFT_BASELINE_PATH = 'drift_baseline.pkl'
+
+# Provider history snapshot, seeded from the training dataset on first start
+PROVIDER_SNAPSHOT_PATH = 'provider_history.pkl'
+PROVIDER_SNAPSHOT_INTERVAL = 60  # seconds
+# Pre-fork workers exchange the claims they count through this file (see serve.py)
+PROVIDER_SHARED_PATH = 'provider_history.db'
+# Seconds between those exchanges (see shared_log.py)
+SHARED_SYNC_INTERVAL = float(os.environ.get('SHARED_SYNC_INTERVAL', 0.5))
+DATASET_PATH = 'claims_fraud_dataset.csv'
+
+# Duplicate / overlapping-stay index (see claim_index.py), seeded from DATASET_PATH
+CLAIM_INDEX_SIZE = int(os.environ.get('CLAIM_INDEX_SIZE', 1000000))
+# Pre-fork workers exchange the claims they index through this file (see serve.py)
+CLAIM_INDEX_SHARED_PATH = 'claim_index.db'
+
+# Claims that /predict and /predict_batch require
+REQUIRED_FIELDS = [
+    'hospital_code', 'doctor_id', 'icd10_code',
+    'patient_gender', 'care_class', 'tarif_inacbg', 'tarif_rs'
+]
+
+# Optional numeric fields and the type prepare_features parses them as
+NUMERIC_FIELDS = {
+    'tarif_inacbg': float,
+    'tarif_rs': float,
+    'los_days': int,
+    'num_procedures': int,
+    'patient_age': int,
+    'provider_claims_count': int,
+    'provider_high_cost_rate': float,
+    **{field.name: field.parse for field in ROLLING_HISTORY}
+}
+
+# Upper bound on claims per /predict_batch request
+MAX_BATCH_SIZE = 10000
+
+# Micro-batching of concurrent /predict calls (see micro_batcher.py)
+MICRO_BATCH_ENABLED = os.environ.get('MICRO_BATCH_ENABLED', '1') == '1'
+MICRO_BATCH_MAX_SIZE = int(os.environ.get('MICRO_BATCH_MAX_SIZE', 64))
+MICRO_BATCH_MAX_WAIT_MS = float(os.environ.get('MICRO_BATCH_MAX_WAIT_MS', 2.0))
+
+# Cache of prediction payloads for re-scored, unchanged claims
+PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', 10000))
+PREDICTION_CACHE_TTL = float(os.environ.get('PREDICTION_CACHE_TTL', 300))
+
+# Drift monitoring against the model's training baseline (see drift_monitor.py):
+# report over the last one to two windows of this many claims (0 = since start)
+DRIFT_WINDOW_CLAIMS = int(os.environ.get('DRIFT_WINDOW_CLAIMS', 50000))
+
+# Write-behind audit log of every decision (see audit_log.py)
+AUDIT_LOG_ENABLED = os.environ.get('AUDIT_LOG_ENABLED', '1') == '1'
+AUDIT_LOG_PATH = os.environ.get('AUDIT_LOG_PATH', 'prediction_audit.db')
+AUDIT_QUEUE_SIZE = int(os.environ.get('AUDIT_QUEUE_SIZE', 10000))
+# block (up to AUDIT_BLOCK_TIMEOUT_MS), drop_newest or drop_oldest when the queue is full
+AUDIT_OVERFLOW = os.environ.get('AUDIT_OVERFLOW', 'block')
+AUDIT_BLOCK_TIMEOUT_MS = float(os.environ.get('AUDIT_BLOCK_TIMEOUT_MS', 50))
+
+# Hot reload: poll the artifacts on disk every MODEL_WATCH_INTERVAL seconds
+# (0 disables the watcher, POST /admin/reload still works)
+MODEL_WATCH_INTERVAL = float(os.environ.get('MODEL_WATCH_INTERVAL', 10))
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+WARMUP_CLAIMS = 16
+
+# Risk factors returned per prediction (override with ?top_k=, ?explain=false skips them)
+DEFAULT_TOP_K = 5
+
+# Encoder name -> request field for each categorical feature
+CATEGORICAL_FIELDS = {
+    'hospital': 'hospital_code',
+    'doctor': 'doctor_id',
+    'icd10': 'icd10_code',
+    'gender': 'patient_gender',
+    'care_class': 'care_class'
+}
+
+# The serving model: one ModelBundle, replaced as a whole on reload, with
+# its drift monitor attached. Handlers read it once per request, so
+# in-flight requests finish (and count drift) on the version they started with.
+active_model = None
 
-model = None
-encoders = None
-feature_names = None
+reload_lock = threading.Lock()
+reload_status = {
+    'state': 'idle',
+    'trigger': None,
+    'started_at': None,
+    'finished_at': None,
+    'previous_version': None,
+    'model_version': None,
+    'error': None
+}
+
+# Categories seen at serving time that the encoders do not know
+unknown_category_counts = {name: 0 for name in CATEGORICAL_FIELDS}
+unknown_category_lock = threading.Lock()
+
+provider_store = ProviderFeatureStore(PROVIDER_SNAPSHOT_PATH)
+
+claim_index = ClaimIndex(CLAIM_INDEX_SIZE)
+
+prediction_cache = PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL)
+
+audit_log = AuditLog(AUDIT_LOG_PATH, AUDIT_QUEUE_SIZE, overflow=AUDIT_OVERFLOW,
+                     block_timeout=AUDIT_BLOCK_TIMEOUT_MS / 1000.0)
+
+metrics = MetricsRegistry()
+profiler = SamplingProfiler()
+
+# /predict passes the predict function of its pinned model with every row
+batcher = MicroBatcher(lambda X: active_model.forest.predict(X), MICRO_BATCH_MAX_SIZE, MICRO_BATCH_MAX_WAIT_MS)
+
+def read_model_artifacts():
+    """Load, validate and warm up the model on disk without installing it"""
+    if os.path.exists(BUNDLE_PATH):
+        bundle = load_bundle(BUNDLE_PATH)
+        print(f"✅ Loaded model bundle from {BUNDLE_PATH} (memory-mapped)")
+    elif os.path.exists(MODEL_PATH):
+        bundle = load_legacy_artifacts(MODEL_PATH, ENCODERS_PATH, FEATURES_PATH, PEER_GROUPS_PATH,
+                                       DRIFT_BASELINE_PATH)
+        print(f"✅ Loaded model from {MODEL_PATH}, {ENCODERS_PATH}, {FEATURES_PATH}, {PEER_GROUPS_PATH}")
+    else:
+        return None
+
+    missing = set(CATEGORICAL_FIELDS) - set(bundle.encoders)
+    if missing:
+        raise BundleError(f'Model has no encoders for: {sorted(missing)}')
+    if bundle.feature_names != FEATURE_NAMES:
+        raise BundleError('Model features do not match feature_spec.FEATURE_NAMES; retrain the model')
+    if bundle.peer_groups is None:
+        raise BundleError('Model has no peer-group table; retrain the model')
+
+    warm_up_model(bundle)
+    return bundle
+
+def install_model(bundle):
+    """Make bundle the serving model with a single reference swap
+
+    The drift monitor is attached to the bundle before the swap, so no
+    handler can pair one model with another model's drift counts.
+    """
+    global active_model
+
+    # Drift is measured against the baseline of the model that scored the claims
+    bundle.drift_monitor = (DriftMonitor(bundle.drift_baseline, DRIFT_WINDOW_CLAIMS)
+                            if bundle.drift_baseline is not None else None)
+    active_model = bundle
+
+    # Cached predictions belong to the previous model
+    prediction_cache.clear()
 
 def load_model_artifacts():
     """Load model, encoders, and feature names"""
-    global model, encoders, feature_names
-
     try:
         print("📂 Loading model artifacts...")
 
-        if not os.path.exists(MODEL_PATH):
-            print(f"⚠️  Model file not found: {MODEL_PATH}")
+        bundle = read_model_artifacts()
+        if bundle is None:
+            print(f"⚠️  Model not found: {BUNDLE_PATH} or {MODEL_PATH}")
             print("⚠️  Please train the model first: python train_fraud_model.py")
             return False
 
-        with open(MODEL_PATH, 'rb') as f:
-            model = pickle.load(f)
-        print(f"✅ Loaded model from {MODEL_PATH}")
-
-        with open(ENCODERS_PATH, 'rb') as f:
-            encoders = pickle.load(f)
-        print(f"✅ Loaded encoders from {ENCODERS_PATH}")
-
-        with open(FEATURES_PATH, 'rb') as f:
-            feature_names = pickle.load(f)
-        print(f"✅ Loaded feature names from {FEATURES_PATH}")
+        install_model(bundle)
+        print(f"✅ Model version {bundle.version}: {bundle.forest.engine}, {bundle.forest.n_trees} trees, "
+              f"{len(bundle.feature_names)} features")
 
         return True
 
+    except BundleError as e:
+        print(f"❌ Rejected model bundle: {e}")
+        return False
+
     except Exception as e:
         print(f"❌ Error loading model: {e}")
         return False
 
+def warm_up_model(bundle):
+    """Score a few synthetic claims with a freshly loaded model before it serves traffic
+
+    Touches the memory-mapped pages the first predictions need and rejects
+    a model whose output is not a valid probability.
+    """
+    claims = []
+    for i in range(WARMUP_CLAIMS):
+        claim = {
+            field: bundle.encoders[name].classes[i % len(bundle.encoders[name])]
+            for name, field in CATEGORICAL_FIELDS.items()
+        }
+        claim.update({
+            'tarif_inacbg': 5000000,
+            'tarif_rs': 5000000 * (0.9 + 0.1 * (i % 8)),
+            'los_days': i % 10,
+            'num_procedures': i % 4,
+            'patient_age': 20 + 4 * i
+        })
+        claims.append(claim)
+
+    rows = [prepare_features(claim, bundle) for claim in claims]
+    probabilities, _ = bundle.forest.predict(np.asarray(rows, dtype=np.float64))
+    single, _ = bundle.forest.predict(rows[0])
+    get_feature_contributions(rows[:2], bundle, DEFAULT_TOP_K)
+
+    if not np.all(np.isfinite(probabilities)) or probabilities.min() < 0 or probabilities.max() > 1:
+        raise BundleError('Warm-up predictions are not valid probabilities')
+    if single[0] != probabilities[0]:
+        raise BundleError('Warm-up single and batch predictions disagree')
+
+def artifact_signature():
+    """(path, mtime, size) of the files that define the model on disk"""
+    if os.path.exists(BUNDLE_PATH):
+        # Resolved, so publishing a new version always changes the signature
+        paths = [os.path.realpath(os.path.join(BUNDLE_PATH, 'manifest.json'))]
+    else:
+        paths = [MODEL_PATH, ENCODERS_PATH, FEATURES_PATH, PEER_GROUPS_PATH, DRIFT_BASELINE_PATH]
+
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((path, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append((path, None, None))
+    return tuple(signature)
+
+def reload_model(trigger):
+    """Load, validate and warm the model on disk, then swap it in
+
+    The current model keeps serving until the swap and stays active if the
+    new one fails validation. Returns False if a reload is already running.
+    """
+    if not reload_lock.acquire(blocking=False):
+        return False
+
+    try:
+        previous = active_model
+        reload_status.update({
+            'state': 'loading',
+            'trigger': trigger,
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'finished_at': None,
+            'previous_version': previous.version if previous else None,
+            'model_version': None,
+            'error': None
+        })
+        print(f"🔄 Reloading model ({trigger})...")
+
+        try:
+            bundle = read_model_artifacts()
+            if bundle is None:
+                raise BundleError(f'Model not found: {BUNDLE_PATH} or {MODEL_PATH}')
+            install_model(bundle)
+            reload_status.update({'state': 'succeeded', 'model_version': bundle.version})
+            print(f"✅ Now serving model version {bundle.version}")
+        except Exception as e:
+            reload_status.update({'state': 'failed', 'error': str(e)})
+            print(f"❌ Reload failed, still serving {reload_status['previous_version']}: {e}")
+
+        reload_status['finished_at'] = datetime.now().isoformat(timespec='seconds')
+        return True
+
+    finally:
+        reload_lock.release()
+
+def start_model_watcher(interval_seconds):
+    """Reload in a background thread when the artifacts on disk change
+
+    A change must be stable for one full interval before it is loaded, so a
+    model that is still being written is not picked up half-way.
+    """
+    def run():
+        loaded = artifact_signature()
+        candidate = loaded
+        while True:
+            time.sleep(interval_seconds)
+            current = artifact_signature()
+            if current != loaded and current == candidate:
+                reload_model('artifacts changed on disk')
+                loaded = current
+            candidate = current
+
+    thread = threading.Thread(target=run, name='model-watcher', daemon=True)
+    thread.start()
+    return thread
+
+def load_provider_history():
+    """Restore provider history from the last snapshot or the training dataset"""
+    try:
+        if provider_store.load_snapshot():
+            print(f"✅ Loaded provider history from {PROVIDER_SNAPSHOT_PATH}")
+        elif os.path.exists(DATASET_PATH):
+            provider_store.seed_from_dataframe(pd.read_csv(DATASET_PATH))
+            print(f"✅ Seeded provider history from {DATASET_PATH}")
+
+        stats = provider_store.stats()
+        print(f"   {stats['doctors']} doctors, {stats['hospitals']} hospitals tracked")
+
+    except Exception as e:
+        print(f"⚠️  Could not load provider history: {e}")
+
+def load_claim_history():
+    """Seed the duplicate / overlap index with the historical claims"""
+    try:
+        if os.path.exists(DATASET_PATH):
+            indexed = claim_index.load_history(pd.read_csv(DATASET_PATH))
+            print(f"✅ Indexed {indexed} historical claims for duplicate checks")
+
+    except Exception as e:
+        print(f"⚠️  Could not load claim history: {e}")
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = request.endpoint or 'unknown'
+    started = g.get('request_started')
+    if started is not None:
+        metrics.observe(endpoint, 'total', (time.perf_counter() - started) * 1000.0)
+    metrics.inc('requests_total', endpoint=endpoint, status=response.status_code)
+    if response.status_code >= 500:
+        metrics.inc('errors_total', endpoint=endpoint)
+    return response
+
+def admin_authorized():
+    """True when ADMIN_TOKEN is unset or the request carries it"""
+    return not ADMIN_TOKEN or request.headers.get('X-Admin-Token') == ADMIN_TOKEN
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Stage latency histograms and counters in Prometheus text format"""
+    model = active_model
+    cache = prediction_cache.stats()
+    batching = batcher.stats()
+    providers = provider_store.stats()
+    claims_indexed = claim_index.stats()
+    audit = audit_log.stats()
+
+    gauges = {
+        ('model_loaded', ()): int(model is not None),
+        ('prediction_cache_entries', ()): cache['entries'],
+        ('prediction_cache_hits', ()): cache['hits'],
+        ('prediction_cache_misses', ()): cache['misses'],
+        ('micro_batch_queue_depth', ()): batching['queue_depth'],
+        ('micro_batch_batches', ()): batching['batches'],
+        ('micro_batch_avg_size', ()): batching['avg_batch_size'],
+        ('provider_doctors_tracked', ()): providers['doctors'],
+        ('provider_hospitals_tracked', ()): providers['hospitals'],
+        ('claim_index_entries', ()): claims_indexed['indexed_claims'],
+        ('claim_index_duplicates_flagged', ()): claims_indexed['duplicates_flagged'],
+        ('claim_index_overlaps_flagged', ()): claims_indexed['overlaps_flagged'],
+        ('audit_queue_depth', ()): audit['queue_depth'],
+        ('audit_records_written', ()): audit['records_written'],
+        ('audit_records_dropped', ()): audit['records_dropped'],
+        ('audit_records_failed', ()): audit['records_failed']
+    }
+    if model is not None:
+        gauges[('model_info', (('version', model.version),))] = 1
+    monitor = model.drift_monitor if model is not None else None
+    if monitor is not None:
+        gauges[('drift_claims_observed', ())] = monitor.snapshot()[2]
+        for feature, value in monitor.psi_by_feature().items():
+            gauges[('feature_drift_psi', (('feature', feature),))] = value
+
+    return Response(metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/profile', methods=['GET', 'POST'])
+def admin_profile():
+    """
+    Opt-in sampling profiler for live traffic
+
+    POST ?seconds=30&interval_ms=5 starts sampling every thread's stack.
+    GET returns the status, or the collapsed stacks with ?format=collapsed
+    (input for flamegraph.pl / speedscope).
+    """
+
+    if not admin_authorized():
+        return jsonify({
+            'success': False,
+            'error': 'Invalid admin token'
+        }), 403
+
+    if request.method == 'POST':
+        try:
+            seconds = float(request.args.get('seconds', 30))
+            interval_ms = float(request.args.get('interval_ms', 5))
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'error': 'seconds and interval_ms must be numbers'
+            }), 400
+
+        try:
+            started = profiler.start(seconds, interval_ms)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+
+        if not started:
+            return jsonify({
+                'success': False,
+                'error': 'Profiler is already running',
+                'profile': profiler.status()
+            }), 409
+
+        return jsonify({
+            'success': True,
+            'profile': profiler.status()
+        }), 202
+
+    if request.args.get('format') == 'collapsed':
+        top = request.args.get('top', type=int)
+        return Response(profiler.collapsed(top), mimetype='text/plain')
+
+    return jsonify({
+        'success': True,
+        'profile': profiler.status(),
+        'stage_latency': metrics.stage_summary()
+    })
+
+@app.route('/drift', methods=['GET'])
+def drift_report():
+    """Drift of served features and fraud probabilities against the training baseline"""
+    model = active_model
+    monitor = model.drift_monitor if model is not None else None
+    if monitor is None:
+        return jsonify({
+            'success': False,
+            'error': 'No drift baseline for the serving model. Retrain, or run python drift_monitor.py.'
+        }), 404
+
+    category_names = {f'{name}_encoded': table.classes.tolist() for name, table in model.encoders.items()}
+    return jsonify({
+        'success': True,
+        'model_version': model.version,
+        'drift': monitor.report(category_names)
+    })
+
+@app.route('/drift/reset', methods=['POST'])
+def drift_reset():
+    """Start the drift windows over, e.g. after an expected change in traffic"""
+    if not admin_authorized():
+        return jsonify({
+            'success': False,
+            'error': 'Invalid admin token'
+        }), 403
+
+    model = active_model
+    if model is not None and model.drift_monitor is not None:
+        model.drift_monitor.reset()
+    return jsonify({'success': True})
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
+    model = active_model
     return jsonify({
         'status': 'healthy',
         'model_loaded': model is not None,
-        'version': '1.0.0'
+        'model_version': model.version if model else None,
+        'model_engine': model.forest.engine if model else None,
+        'model_reload': dict(reload_status),
+        'unknown_categories': dict(unknown_category_counts),
+        'provider_history': provider_store.stats(),
+        'claim_index': claim_index.stats(),
+        'audit_log': audit_log.stats(),
+        'micro_batching': batcher.stats(),
+        'prediction_cache': prediction_cache.stats()
     })
 
 @app.route('/predict', methods=['POST'])
@@ -86,6 +528,7 @@ def predict():
     }
     """
 
+    model = active_model
     if model is None:
         return jsonify({
             'success': False,
@@ -93,143 +536,452 @@ def predict():
         }), 503
 
     try:
-        data = request.get_json()
+        with metrics.time('predict', 'parse'):
+            data = request.get_json()
+            top_k = explanation_top_k(model)
 
         # Validate required fields
-        required_fields = [
-            'hospital_code', 'doctor_id', 'icd10_code',
-            'patient_gender', 'care_class', 'tarif_inacbg', 'tarif_rs'
-        ]
+        with metrics.time('predict', 'validate'):
+            error = validate_claim(data)
+        if error:
+            return jsonify({
+                'success': False,
+                'error': error
+            }), 400
+
+        # Before the provider history, so a re-scored claim is not counted again
+        with metrics.time('predict', 'cache'):
+            cache_key = claim_key(data, model.version, top_k)
+            cached = prediction_cache.get(cache_key)
+
+        if cached is None:
+            # Extract and encode features
+            with metrics.time('predict', 'provider_history'):
+                claim = with_provider_history(data)
+            with metrics.time('predict', 'encode'):
+                encoded = encode_categoricals(claim, model)
+            with metrics.time('predict', 'features'):
+                features = prepare_features(claim, model, encoded)
+        else:
+            claim, features, prediction = cached
 
-        for field in required_fields:
-            if field not in data:
+        # Not part of the cached prediction: the same claim can be a
+        # duplicate today and was not yesterday
+        with metrics.time('predict', 'claim_index'):
+            duplicate_check = claim_index.check(data)
+
+        if cached is not None:
+            observe_drift(model, features, prediction)
+            audit_decision(claim, features, prediction, model, duplicate_check)
+            with metrics.time('predict', 'serialize'):
                 return jsonify({
-                    'success': False,
-                    'error': f'Missing required field: {field}'
-                }), 400
+                    'success': True,
+                    'model_version': model.version,
+                    'prediction': prediction,
+                    'duplicate_check': duplicate_check
+                })
+
+        # Make prediction (probability and label from one forest pass),
+        # coalesced with concurrent requests when the micro-batcher is running
+        with metrics.time('predict', 'forest'):
+            if batcher.running:
+                fraud_probability, fraud_prediction = batcher.predict(features, model.forest.predict)
+            else:
+                fraud_probabilities, fraud_predictions = model.forest.predict(features)
+                fraud_probability = fraud_probabilities[0]
+                fraud_prediction = fraud_predictions[0]
+
+        with metrics.time('predict', 'explain'):
+            explanation = get_feature_contributions([features], model, top_k)[0] if top_k else None
+            prediction = build_prediction(fraud_probability, fraud_prediction, explanation)
+        prediction_cache.put(cache_key, (claim, features, prediction))
+        observe_drift(model, features, prediction)
+        audit_decision(claim, features, prediction, model, duplicate_check)
 
-        # Extract and encode features
-        features = prepare_features(data)
+        with metrics.time('predict', 'serialize'):
+            return jsonify({
+                'success': True,
+                'model_version': model.version,
+                'prediction': prediction,
+                'duplicate_check': duplicate_check
+            })
 
-        # Make prediction
-        fraud_probability = model.predict_proba([features])[0][1]  # Probability of fraud
-        fraud_prediction = model.predict([features])[0]  # Binary prediction
+    except Exception as e:
+        print(f"❌ Prediction error: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
 
-        risk_score = int(fraud_probability * 100)
-        risk_level = get_risk_level(risk_score)
+@app.route('/predict_batch', methods=['POST'])
+def predict_batch():
+    """
+    Batch fraud detection endpoint
 
-        # Get feature importance for this prediction (top contributing features)
-        feature_contributions = get_feature_contributions(features)
+    Scores all valid claims with a single vectorized model call. Invalid
+    claims get a per-item error instead of failing the whole batch.
 
+    Request body:
+    {
+      "claims": [ { ...same fields as /predict... }, ... ]
+    }
+    """
+
+    model = active_model
+    if model is None:
         return jsonify({
-            'success': True,
-            'prediction': {
-                'is_fraud': bool(fraud_prediction),
-                'fraud_probability': float(fraud_probability),
-                'risk_score': risk_score,
-                'risk_level': risk_level,
-                'top_risk_factors': feature_contributions[:5],  # Top 5
-                'recommendation': get_recommendation(risk_level, risk_score)
+            'success': False,
+            'error': 'Model not loaded. Please train the model first.'
+        }), 503
+
+    with metrics.time('predict_batch', 'parse'):
+        data = request.get_json(silent=True)
+        top_k = explanation_top_k(model)
+    claims = data.get('claims') if isinstance(data, dict) else None
+
+    if not isinstance(claims, list):
+        return jsonify({
+            'success': False,
+            'error': 'Request body must contain a "claims" list'
+        }), 400
+
+    if len(claims) > MAX_BATCH_SIZE:
+        return jsonify({
+            'success': False,
+            'error': f'Batch too large: {len(claims)} claims (max {MAX_BATCH_SIZE})'
+        }), 413
+
+    try:
+        results = [None] * len(claims)
+        scored = {}           # claim index -> (claim with provider history, features, prediction)
+        misses = []           # (claim index, cache key)
+        rows = []             # (claim index, cache key, claim with provider history, features)
+        duplicate_checks = {}
+
+        with metrics.time('predict_batch', 'validate'):
+            errors = [validate_claim(claim) for claim in claims]
+            valid_indices = [i for i, error in enumerate(errors) if error is None]
+
+        # Serve unchanged claims from the cache before they touch the provider history
+        with metrics.time('predict_batch', 'cache'):
+            for i in valid_indices:
+                cache_key = claim_key(claims[i], model.version, top_k)
+                cached = prediction_cache.get(cache_key)
+                if cached is None:
+                    misses.append((i, cache_key))
+                else:
+                    scored[i] = cached
+
+        # Encode categorical columns for all claims to score at once
+        with metrics.time('predict_batch', 'encode'):
+            encoded = encode_categoricals_batch([claims[i] for i, _ in misses], model)
+
+        # Prepare each claim, collecting per-item errors
+        with metrics.time('predict_batch', 'features'):
+            for (i, cache_key), claim_encoded in zip(misses, encoded):
+                try:
+                    claim = with_provider_history(claims[i])
+                    rows.append((i, cache_key, claim, prepare_features(claim, model, claim_encoded)))
+                except (TypeError, ValueError) as e:
+                    errors[i] = f'Invalid field value: {e}'
+
+        row_indices = sorted([*scored, *(i for i, _, _, _ in rows)])
+
+        # In request order, so a claim repeated within the batch is flagged too
+        with metrics.time('predict_batch', 'claim_index'):
+            for i in row_indices:
+                duplicate_checks[i] = claim_index.check(claims[i])
+
+        for i, error in enumerate(errors):
+            if error is not None:
+                results[i] = {
+                    'index': i,
+                    'claim_id': claims[i].get('claim_id') if isinstance(claims[i], dict) else None,
+                    'success': False,
+                    'error': error
+                }
+
+        # Score the cache misses in one forest pass
+        if rows:
+            with metrics.time('predict_batch', 'forest'):
+                X = np.asarray([features for _, _, _, features in rows], dtype=np.float64)
+                probabilities, labels = model.forest.predict(X)
+
+            with metrics.time('predict_batch', 'explain'):
+                # One vectorized attribution pass for every scored claim
+                explanations = get_feature_contributions(X, model, top_k) if top_k else [None] * len(rows)
+
+                for (i, cache_key, claim, features), proba, label, explanation in zip(
+                        rows, probabilities, labels, explanations):
+                    scored[i] = (claim, features, build_prediction(proba, label, explanation))
+                    prediction_cache.put(cache_key, scored[i])
+
+        for i in row_indices:
+            results[i] = {
+                'index': i,
+                'claim_id': claims[i].get('claim_id'),
+                'success': True,
+                'prediction': scored[i][2],
+                'duplicate_check': duplicate_checks[i]
             }
-        })
+
+        with metrics.time('predict_batch', 'drift'):
+            monitor = model.drift_monitor
+            if monitor is not None and row_indices:
+                monitor.observe_many([scored[i][1] for i in row_indices],
+                                     [scored[i][2]['fraud_probability'] for i in row_indices])
+
+        with metrics.time('predict_batch', 'audit'):
+            if audit_log.running:
+                audit_log.record_many([
+                    ('predict_batch', *scored[i], model.version, duplicate_checks[i])
+                    for i in row_indices
+                ])
+
+        with metrics.time('predict_batch', 'serialize'):
+            return jsonify({
+                'success': True,
+                'model_version': model.version,
+                'results': results,
+                'summary': {
+                    'total': len(claims),
+                    'succeeded': len(row_indices),
+                    'failed': len(claims) - len(row_indices)
+                }
+            })
 
     except Exception as e:
-        print(f"❌ Prediction error: {e}")
+        print(f"❌ Batch prediction error: {e}")
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
-def prepare_features(data):
-    """Prepare feature vector from input data"""
+@app.route('/admin/reload', methods=['GET', 'POST'])
+def admin_reload():
+    """
+    Hot reload the model from disk (POST) or report the last reload (GET)
+
+    The new model is loaded, validated and warmed up in the background while
+    the current one keeps serving. Requires the X-Admin-Token header when
+    ADMIN_TOKEN is set.
+    """
+
+    if not admin_authorized():
+        return jsonify({
+            'success': False,
+            'error': 'Invalid admin token'
+        }), 403
 
-    # Calculate derived features
+    if request.method == 'GET':
+        return jsonify({
+            'success': True,
+            'model_version': active_model.version if active_model else None,
+            'reload': dict(reload_status)
+        })
+
+    if reload_lock.locked():
+        return jsonify({
+            'success': False,
+            'error': 'A reload is already in progress',
+            'reload': dict(reload_status)
+        }), 409
+
+    threading.Thread(target=reload_model, args=('admin endpoint',), daemon=True).start()
+
+    return jsonify({
+        'success': True,
+        'message': 'Reload started',
+        'model_version': active_model.version if active_model else None
+    }), 202
+
+def observe_drift(model, features, prediction):
+    """Count one scored claim in the drift monitor of the model that scored it"""
+    monitor = model.drift_monitor
+    if monitor is not None:
+        with metrics.time('predict', 'drift'):
+            monitor.observe(features, prediction['fraud_probability'])
+
+def audit_decision(claim, features, prediction, model, duplicate_check):
+    """Queue one /predict decision for the audit log"""
+    if audit_log.running:
+        with metrics.time('predict', 'audit'):
+            audit_log.record('predict', claim, features, prediction, model.version, duplicate_check)
+
+def with_provider_history(data):
+    """Fill provider features from the online provider store
+
+    Every scored claim is recorded in the per-doctor and per-hospital
+    history; all provider features, provider_claims_count included, are
+    30/90-day windows as of its submitted_date (the latest day in the store
+    without one). Values supplied by the caller take precedence over the
+    stored ones.
+    """
     tarif_rs = float(data['tarif_rs'])
     tarif_inacbg = float(data['tarif_inacbg'])
-    los_days = int(data.get('los_days', 1))
-    num_procedures = int(data.get('num_procedures', 0))
-
     tariff_ratio = tarif_rs / tarif_inacbg if tarif_inacbg > 0 else 1.0
-    tariff_difference = tarif_rs - tarif_inacbg
-    tariff_diff_percentage = ((tarif_rs - tarif_inacbg) / tarif_inacbg * 100) if tarif_inacbg > 0 else 0
-    tariff_per_day = tarif_rs / los_days if los_days > 0 else tarif_rs
-    procedure_intensity = num_procedures / los_days if los_days > 0 else num_procedures
-
-    # Encode categorical variables
-    hospital_encoded = safe_encode(encoders['hospital'], data['hospital_code'])
-    doctor_encoded = safe_encode(encoders['doctor'], data['doctor_id'])
-    icd10_encoded = safe_encode(encoders['icd10'], data['icd10_code'])
-    gender_encoded = safe_encode(encoders['gender'], data['patient_gender'])
-    care_class_encoded = safe_encode(encoders['care_class'], data['care_class'])
-
-    # Binary flags
-    is_high_cost = int(tariff_ratio > 1.3)
-    is_long_stay = int(los_days > 5)
-    has_procedures = int(num_procedures > 0)
-
-    # Build feature vector (must match training feature order!)
-    features = [
-        # Tariff features
-        tariff_ratio,
-        tariff_diff_percentage,
-        tariff_difference,
-        tarif_inacbg,
-        tarif_rs,
-        tariff_per_day,
-
-        # Clinical features
-        los_days,
-        num_procedures,
-        procedure_intensity,
-        int(data.get('patient_age', 50)),
-
-        # Provider features (use defaults if not provided)
-        int(data.get('provider_claims_count', 1)),
-        float(data.get('provider_high_cost_rate', 0.0)),
-
-        # Encoded categoricals
-        hospital_encoded,
-        doctor_encoded,
-        icd10_encoded,
-        gender_encoded,
-        care_class_encoded,
-
-        # Binary flags
-        is_high_cost,
-        is_long_stay,
-        has_procedures
-    ]
 
-    return features
+    history = provider_store.observe(
+        data['doctor_id'], data['hospital_code'], tariff_ratio, data.get('claim_id'),
+        data.get('submitted_date')
+    )
 
-def safe_encode(encoder, value):
-    """Safely encode categorical value, return 0 if unknown"""
-    try:
-        return encoder.transform([value])[0]
-    except:
-        # Unknown category, return 0 (most common class)
+    claim = dict(data)
+    for field in HISTORY_FIELDS:
+        claim.setdefault(field, history[field])
+    return claim
+
+def validate_claim(data):
+    """Return an error message if the claim is missing or has invalid fields"""
+    if not isinstance(data, dict):
+        return 'Claim must be a JSON object'
+
+    for field in REQUIRED_FIELDS:
+        if field not in data:
+            return f'Missing required field: {field}'
+
+    # Encoded column-wise for a whole batch, so reject what cannot be a category key
+    for field in CATEGORICAL_FIELDS.values():
+        if isinstance(data[field], (dict, list)):
+            return f'Invalid categorical field: {field}'
+    if isinstance(data.get(PATIENT_ID_FIELD), (dict, list)):
+        return f'Invalid categorical field: {PATIENT_ID_FIELD}'
+
+    for field, parse in NUMERIC_FIELDS.items():
+        if field in data:
+            try:
+                parse(data[field])
+            except (TypeError, ValueError):
+                return f'Invalid numeric field: {field}'
+
+    return None
+
+def build_prediction(fraud_probability, fraud_prediction, explanation=None):
+    """Build the prediction payload for one scored claim
+
+    explanation: one entry of get_feature_contributions, or None to omit risk factors
+    """
+    risk_score = int(fraud_probability * 100)
+    risk_level = get_risk_level(risk_score)
+
+    prediction = {
+        'is_fraud': bool(fraud_prediction),
+        'fraud_probability': float(fraud_probability),
+        'risk_score': risk_score,
+        'risk_level': risk_level,
+        'recommendation': get_recommendation(risk_level, risk_score)
+    }
+
+    if explanation is not None:
+        prediction['base_fraud_probability'] = explanation['base_fraud_probability']
+        prediction['top_risk_factors'] = explanation['top_risk_factors']
+
+    return prediction
+
+def explanation_top_k(model):
+    """Number of risk factors requested via ?top_k= / ?explain=, 0 means none"""
+    if request.args.get('explain', 'true').lower() in ('0', 'false', 'no'):
         return 0
+    top_k = request.args.get('top_k', DEFAULT_TOP_K, type=int)
+    return max(0, min(top_k, len(model.feature_names)))
 
-def get_feature_contributions(features):
-    """Get top contributing features for this prediction"""
+def prepare_features(data, model, encoded=None):
+    """Prepare feature vector from input data (scalar kernel of feature_spec)
 
-    # Get feature importances from trained model
-    importances = model.feature_importances_
+    model: the ModelBundle whose encoders and peer-group table to use
+    encoded: optional precomputed categorical codes (see encode_categoricals_batch)
+    """
+    if encoded is None:
+        encoded = encode_categoricals(data, model)
+    # Peer statistics always come from the model, never from the request
+    return scalar_features({**data, **model.peer_groups.lookup(data)}, encoded)
 
-    # Combine with actual feature values
-    contributions = []
-    for i, (fname, fvalue, importance) in enumerate(zip(feature_names, features, importances)):
-        contributions.append({
-            'feature': fname,
-            'value': float(fvalue),
-            'importance': float(importance),
-            'contribution_score': float(fvalue * importance)  # Simple heuristic
-        })
+def encode_categoricals(data, model):
+    """Encode the categorical fields of one claim via the lookup tables
+
+    Unknown categories map to code 0 and are counted per field.
+    """
+    encoded = {}
+    unknown = []
+
+    for name, field in CATEGORICAL_FIELDS.items():
+        encoded[name], known = model.encoders[name].encode(data[field])
+        if not known:
+            unknown.append(name)
+
+    if unknown:
+        record_unknown_categories({name: 1 for name in unknown})
+
+    return encoded
+
+def encode_categoricals_batch(claims, model):
+    """Vectorized encode_categoricals for many claims, one dict per claim"""
+    if not claims:
+        return []
+
+    columns = encode_categorical_columns(
+        {field: [claim[field] for claim in claims] for field in CATEGORICAL_FIELDS.values()}, model
+    )
+    codes = {name: columns[f'{name}_encoded'].tolist() for name in CATEGORICAL_FIELDS}
 
-    # Sort by contribution score
-    contributions.sort(key=lambda x: abs(x['contribution_score']), reverse=True)
+    return [
+        {name: codes[name][i] for name in CATEGORICAL_FIELDS}
+        for i in range(len(claims))
+    ]
+
+def encode_categorical_columns(columns, model):
+    """Encode whole categorical columns, returns {'<name>_encoded': codes} for columnar_features"""
+    encoded = {}
+    unknown = {}
+
+    for name, field in CATEGORICAL_FIELDS.items():
+        codes, known = model.encoders[name].encode_many(columns[field])
+        encoded[f'{name}_encoded'] = codes
+        unknown[name] = int((~known).sum())
+
+    record_unknown_categories(unknown)
+    return encoded
 
-    return contributions
+def record_unknown_categories(counts):
+    """Add per-field unknown category counts to the service metrics"""
+    with unknown_category_lock:
+        for name, count in counts.items():
+            unknown_category_counts[name] += count
+
+    for name, count in counts.items():
+        if count:
+            metrics.inc('unknown_categories_total', count, field=name)
+
+def get_feature_contributions(rows, model, top_k=DEFAULT_TOP_K):
+    """Top contributing features for each scored row
+
+    Contributions are exact tree-path attributions (see
+    CompiledForest.contributions): how much each feature moved this claim's
+    fraud probability away from the model's base rate, computed for all
+    rows and trees in one vectorized pass.
+    """
+    X = np.asarray(rows, dtype=np.float64)
+    base, contributions = model.forest.contributions(X)
+
+    # Largest absolute contributions first
+    order = np.argsort(-np.abs(contributions), axis=1, kind='stable')[:, :top_k]
+
+    explanations = []
+    for row, contribution, top in zip(X, contributions, order):
+        explanations.append({
+            'base_fraud_probability': base,
+            'top_risk_factors': [
+                {
+                    'feature': model.feature_names[j],
+                    'value': float(row[j]),
+                    'importance': float(model.feature_importances[j]),
+                    'contribution_score': float(contribution[j])
+                }
+                for j in top
+            ]
+        })
+
+    return explanations
 
 def get_risk_level(risk_score):
     """Determine risk level from score"""
@@ -275,14 +1027,35 @@ if __name__ == '__main__':
 
     # Load model
     if load_model_artifacts():
+        load_provider_history()
+        load_claim_history()
+        provider_store.start_snapshots(PROVIDER_SNAPSHOT_INTERVAL)
+        if AUDIT_LOG_ENABLED:
+            audit_log.start()
+        if MICRO_BATCH_ENABLED:
+            batcher.start()
+        if MODEL_WATCH_INTERVAL > 0:
+            start_model_watcher(MODEL_WATCH_INTERVAL)
+
         print("\n✅ Service ready!")
         print("📡 Listening on http://localhost:5001")
         print("\nEndpoints:")
         print("  GET  /health  - Health check")
         print("  POST /predict - Fraud prediction")
+        print("  POST /predict_batch - Batch fraud prediction")
+        print("  POST /admin/reload - Hot reload the model from disk")
+        print("  GET  /metrics - Stage latency histograms and counters")
+        print("  GET  /drift - Feature and probability drift vs the training baseline")
+        print("  POST /admin/profile - Start the sampling profiler")
         print("\n" + "="*60 + "\n")
 
-        app.run(host='0.0.0.0', port=5001, debug=False)
+        try:
+            app.run(host='0.0.0.0', port=5001, debug=False)
+        finally:
+            batcher.stop()
+            provider_store.stop_snapshots()
+            # Write the decisions still queued
+            audit_log.close()
     else:
         print("\n❌ Failed to start service. Please train the model first:")
         print("   python train_fraud_model.py")
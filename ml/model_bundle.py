@@ -0,0 +1,343 @@
+"""
+Versioned, memory-mappable model bundle
+Replaces the separate pickle artifacts with one directory holding a
+manifest (hashes, feature order, training metadata), the flattened forest as
+plain .npy buffers, the encoder tables and the peer-group table
+
+The forest buffers are memory-mapped read-only, so every serving process on
+a machine shares one physical copy through the page cache.
+
+BUNDLE_PATH is a symlink to a versioned directory next to it
+(fraud_model_bundle.<model_version>). A new bundle is written to its own
+directory and published by atomically replacing the symlink, so the path
+always names one complete bundle.
+
+Run: python model_bundle.py  (build a bundle from the existing .pkl artifacts)
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import re
+import shutil
+from datetime import datetime
+import numpy as np
+
+from forest_engine import ENGINES, CompiledForest, compile_model, model_feature_importances
+from category_encoding import CategoryTable
+from drift_monitor import DriftBaseline
+from peer_groups import PeerGroupTable
+
+BUNDLE_PATH = 'fraud_model_bundle'
+BUNDLE_FORMAT_VERSION = 1
+MANIFEST_FILE = 'manifest.json'
+ENCODERS_FILE = 'encoders.json'
+IMPORTANCES_FILE = 'feature_importances.npy'
+PEER_GROUPS_FILE = 'peer_groups.json'
+DRIFT_BASELINE_FILE = 'drift_baseline.json'
+# Versioned directories kept after a publish: the new one and the one before it,
+# which a reader that resolved the old symlink may still be loading
+KEEP_VERSIONS = 2
+
+
+# model_version: creation time and bundle hash prefix
+VERSION_SUFFIX = re.compile(r'\d{14}-[0-9a-f]{8}')
+
+
+class BundleError(Exception):
+    """Raised when a bundle is missing, corrupt or internally inconsistent"""
+
+
+class ModelBundle:
+    """Everything serving needs from one training run"""
+
+    def __init__(self, forest, encoders, feature_names, feature_importances, manifest, peer_groups=None,
+                 drift_baseline=None):
+        self.forest = forest
+        self.encoders = encoders                  # name -> CategoryTable
+        self.feature_names = list(feature_names)
+        self.feature_importances = feature_importances
+        self.manifest = manifest
+        self.peer_groups = peer_groups            # PeerGroupTable, None for models without one
+        self.drift_baseline = drift_baseline      # DriftBaseline, None for models without one
+        self.drift_monitor = None                 # DriftMonitor, attached when ml_service installs it
+
+    @property
+    def version(self):
+        return self.manifest['model_version']
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _encoder_classes(encoder):
+    if isinstance(encoder, CategoryTable):
+        return np.asarray(encoder.classes)
+    return np.asarray(encoder.classes_)
+
+
+def _bundle_hash(files, feature_names):
+    """Hash over every file hash and the feature order"""
+    digest = hashlib.sha256()
+    for name in sorted(files):
+        digest.update(f"{name}:{files[name]['sha256']}\n".encode())
+    digest.update(json.dumps(feature_names).encode())
+    return digest.hexdigest()
+
+
+def save_bundle(model, encoders, feature_names, path=BUNDLE_PATH, metadata=None,
+                feature_importances=None, peer_groups=None, drift_baseline=None):
+    """Write a bundle for a fitted model (or an already compiled engine) and its encoders
+
+    encoders may be fitted LabelEncoders or CategoryTables. feature_importances
+    defaults to the model's own importances (zeros for an already compiled model).
+    peer_groups, the PeerGroupTable the model's features were computed with,
+    and drift_baseline, the DriftBaseline of its training data, are stored
+    alongside the encoders.
+    The bundle is assembled in a temporary directory, renamed to its
+    versioned directory once complete and published by swapping the path
+    symlink, so readers never see a half-written or missing bundle.
+    """
+    compiled = isinstance(model, CompiledForest)
+    forest = model if compiled else compile_model(model)
+    importances = feature_importances
+    if importances is None:
+        importances = np.zeros(len(feature_names)) if compiled else model_feature_importances(model)
+
+    tmp_path = f'{path}.tmp-{os.getpid()}'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    for name, array in forest.to_arrays().items():
+        np.save(os.path.join(tmp_path, f'{name}.npy'), np.ascontiguousarray(array))
+    np.save(os.path.join(tmp_path, IMPORTANCES_FILE), np.asarray(importances, dtype=np.float64))
+
+    with open(os.path.join(tmp_path, ENCODERS_FILE), 'w') as f:
+        json.dump({name: _encoder_classes(e).tolist() for name, e in encoders.items()}, f)
+
+    if peer_groups is not None:
+        with open(os.path.join(tmp_path, PEER_GROUPS_FILE), 'w') as f:
+            json.dump(peer_groups.to_dict(), f)
+
+    if drift_baseline is not None:
+        with open(os.path.join(tmp_path, DRIFT_BASELINE_FILE), 'w') as f:
+            json.dump(drift_baseline.to_dict(), f)
+
+    files = {}
+    for filename in sorted(os.listdir(tmp_path)):
+        file_path = os.path.join(tmp_path, filename)
+        files[filename] = {'sha256': _sha256(file_path), 'bytes': os.path.getsize(file_path)}
+
+    bundle_hash = _bundle_hash(files, list(feature_names))
+    created_at = datetime.now()
+    manifest = {
+        'format_version': BUNDLE_FORMAT_VERSION,
+        'model_version': f"{created_at.strftime('%Y%m%d%H%M%S')}-{bundle_hash[:8]}",
+        'bundle_hash': bundle_hash,
+        'created_at': created_at.isoformat(timespec='seconds'),
+        'engine': forest.engine,
+        'engine_params': forest.engine_params(),
+        'n_trees': forest.n_trees,
+        'n_nodes': forest.n_nodes,
+        'max_depth': forest.max_depth,
+        'classes': forest.classes.tolist(),
+        'feature_names': list(feature_names),
+        'files': files,
+        'metadata': metadata or {}
+    }
+
+    with open(os.path.join(tmp_path, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    version_path = f"{path}.{manifest['model_version']}"
+    if os.path.exists(version_path):
+        # Same bundle saved again within a second
+        shutil.rmtree(tmp_path)
+    else:
+        os.rename(tmp_path, version_path)
+    publish(path, version_path)
+
+    return manifest
+
+
+def publish(path, version_path):
+    """Atomically point the path symlink at version_path, then drop old versions"""
+    if os.path.isdir(path) and not os.path.islink(path):
+        # Bundle written before the symlink layout: becomes one of the versions
+        os.rename(path, f"{path}.{read_manifest(path)['model_version']}")
+
+    link_path = f'{path}.link-{os.getpid()}'
+    if os.path.lexists(link_path):
+        os.remove(link_path)
+    os.symlink(os.path.basename(version_path), link_path)
+    os.replace(link_path, path)
+
+    directory, name = os.path.split(os.path.abspath(path))
+    versions = [
+        os.path.join(directory, entry) for entry in os.listdir(directory)
+        if entry.startswith(f'{name}.') and VERSION_SUFFIX.fullmatch(entry[len(name) + 1:])
+        and entry != os.path.basename(version_path)
+    ]
+    versions.sort(key=lambda version: (os.path.getmtime(version), version))
+    for version in versions[:max(len(versions) - (KEEP_VERSIONS - 1), 0)]:
+        shutil.rmtree(version, ignore_errors=True)
+
+
+def read_manifest(path=BUNDLE_PATH):
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        raise BundleError(f'No bundle manifest at {manifest_path}')
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def load_bundle(path=BUNDLE_PATH, mmap=True, verify=True):
+    """Load and validate a bundle; forest buffers are memory-mapped read-only"""
+    # Resolve the symlink once, so a publish during the load cannot mix two versions
+    path = os.path.realpath(path)
+    manifest = read_manifest(path)
+
+    if manifest.get('format_version') != BUNDLE_FORMAT_VERSION:
+        raise BundleError(f"Unsupported bundle format: {manifest.get('format_version')}")
+
+    engine = ENGINES.get(manifest.get('engine', 'random_forest'))
+    if engine is None:
+        raise BundleError(f"Unsupported model engine: {manifest.get('engine')}")
+
+    files = manifest['files']
+    expected = {f'{name}.npy' for name in engine.ARRAYS} | {ENCODERS_FILE, IMPORTANCES_FILE}
+    missing = expected - set(files)
+    if missing:
+        raise BundleError(f'Manifest does not list: {sorted(missing)}')
+
+    if verify:
+        for filename, info in files.items():
+            file_path = os.path.join(path, filename)
+            if not os.path.exists(file_path):
+                raise BundleError(f'Missing bundle file: {filename}')
+            if _sha256(file_path) != info['sha256']:
+                raise BundleError(f'Checksum mismatch for {filename}: artifact does not belong to this bundle')
+        if _bundle_hash(files, manifest['feature_names']) != manifest['bundle_hash']:
+            raise BundleError('Bundle hash mismatch')
+
+    mmap_mode = 'r' if mmap else None
+    arrays = {
+        # asarray drops the memmap subclass but keeps the shared mapping
+        name: np.asarray(np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode))
+        for name in engine.ARRAYS
+    }
+    forest = engine.from_arrays(arrays, manifest['classes'], manifest['max_depth'],
+                                **manifest.get('engine_params', {}))
+
+    with open(os.path.join(path, ENCODERS_FILE)) as f:
+        encoders = {name: CategoryTable(classes) for name, classes in json.load(f).items()}
+
+    peer_groups = None
+    if PEER_GROUPS_FILE in files:
+        with open(os.path.join(path, PEER_GROUPS_FILE)) as f:
+            try:
+                peer_groups = PeerGroupTable.from_dict(json.load(f))
+            except (KeyError, ValueError) as e:
+                raise BundleError(f'Invalid peer group table: {e}')
+
+    drift_baseline = None
+    if DRIFT_BASELINE_FILE in files:
+        with open(os.path.join(path, DRIFT_BASELINE_FILE)) as f:
+            try:
+                drift_baseline = DriftBaseline.from_dict(json.load(f))
+            except (KeyError, ValueError) as e:
+                raise BundleError(f'Invalid drift baseline: {e}')
+
+    importances = np.load(os.path.join(path, IMPORTANCES_FILE))
+    feature_names = manifest['feature_names']
+
+    # Cross-artifact consistency checks
+    if forest.n_trees != manifest['n_trees'] or forest.n_nodes != manifest['n_nodes']:
+        raise BundleError('Forest arrays do not match the manifest')
+    if len(importances) != len(feature_names):
+        raise BundleError('Feature importances do not match the feature list')
+    if forest.n_nodes and int(forest.feature.max()) >= len(feature_names):
+        raise BundleError('Forest splits on a feature index outside the feature list')
+
+    if drift_baseline is not None and drift_baseline.feature_names != feature_names:
+        raise BundleError('Drift baseline does not match the feature list')
+
+    return ModelBundle(forest, encoders, feature_names, importances, manifest, peer_groups, drift_baseline)
+
+
+def load_legacy_artifacts(model_path, encoders_path, features_path, peer_groups_path=None,
+                          drift_baseline_path=None):
+    """Build an in-memory ModelBundle from the separate pickle artifacts"""
+    with open(model_path, 'rb') as f:
+        model = pickle.load(f)
+    with open(encoders_path, 'rb') as f:
+        encoders = pickle.load(f)
+    with open(features_path, 'rb') as f:
+        feature_names = pickle.load(f)
+    peer_groups = None
+    if peer_groups_path is not None and os.path.exists(peer_groups_path):
+        with open(peer_groups_path, 'rb') as f:
+            peer_groups = pickle.load(f)
+    drift_baseline = None
+    if drift_baseline_path is not None and os.path.exists(drift_baseline_path):
+        with open(drift_baseline_path, 'rb') as f:
+            drift_baseline = pickle.load(f)
+        if drift_baseline.feature_names != list(feature_names):
+            raise BundleError(f'{drift_baseline_path} does not match {features_path}')
+
+    if getattr(model, 'n_features_in_', len(feature_names)) != len(feature_names):
+        raise BundleError(
+            f'{model_path} expects {model.n_features_in_} features but '
+            f'{features_path} lists {len(feature_names)}'
+        )
+
+    forest = compile_model(model)
+    manifest = {
+        'format_version': BUNDLE_FORMAT_VERSION,
+        'model_version': f'legacy-{_sha256(model_path)[:8]}',
+        'engine': forest.engine,
+        'engine_params': forest.engine_params(),
+        'n_trees': forest.n_trees,
+        'n_nodes': forest.n_nodes,
+        'max_depth': forest.max_depth,
+        'classes': forest.classes.tolist(),
+        'feature_names': list(feature_names),
+        'metadata': {'source': 'legacy pickle artifacts'}
+    }
+    tables = {name: CategoryTable.from_encoder(e) for name, e in encoders.items()}
+
+    return ModelBundle(forest, tables, feature_names, model_feature_importances(model), manifest,
+                       peer_groups, drift_baseline)
+
+
+if __name__ == '__main__':
+    from train_fraud_model import (
+        MODEL_PATH, ENCODERS_PATH, FEATURES_PATH, PEER_GROUPS_PATH, DRIFT_BASELINE_PATH
+    )
+
+    print("📦 Building model bundle from pickle artifacts")
+    with open(MODEL_PATH, 'rb') as f:
+        model = pickle.load(f)
+    with open(ENCODERS_PATH, 'rb') as f:
+        encoders = pickle.load(f)
+    with open(FEATURES_PATH, 'rb') as f:
+        feature_names = pickle.load(f)
+    peer_groups = None
+    if os.path.exists(PEER_GROUPS_PATH):
+        with open(PEER_GROUPS_PATH, 'rb') as f:
+            peer_groups = pickle.load(f)
+    drift_baseline = None
+    if os.path.exists(DRIFT_BASELINE_PATH):
+        with open(DRIFT_BASELINE_PATH, 'rb') as f:
+            drift_baseline = pickle.load(f)
+
+    manifest = save_bundle(model, encoders, feature_names,
+                           metadata={'source': 'converted from pickle artifacts'},
+                           peer_groups=peer_groups, drift_baseline=drift_baseline)
+    print(f"✅ Bundle saved: {BUNDLE_PATH} (version {manifest['model_version']})")
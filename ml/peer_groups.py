@@ -0,0 +1,179 @@
+"""
+Peer-group tariff and length-of-stay statistics
+Training computes tarif_rs and los_days quantiles per (icd10_code,
+care_class, hospital_code) group in one groupby per level and stores them
+as a compact lookup table in the model artifacts. Groups with fewer than
+MIN_GROUP_CLAIMS claims back off to (icd10_code, care_class), then
+icd10_code, then all claims, so every claim has peers.
+
+Serving turns a claim's peer median and robust scale into deviation
+features (see feature_spec.py) with at most four dict lookups; training
+and bulk scoring look up whole columns at once.
+
+Run: python peer_groups.py  (print the table fitted on the training dataset)
+"""
+
+import numpy as np
+import pandas as pd
+
+from category_encoding import normalize_category
+
+# Most specific grouping first; backing off drops columns from the end
+GROUP_COLUMNS = ('icd10_code', 'care_class', 'hospital_code')
+LEVELS = (3, 2, 1, 0)
+MIN_GROUP_CLAIMS = 10
+
+QUANTILES = (0.25, 0.5, 0.75)
+STAT_COLUMNS = (
+    'claims',
+    'tariff_p25', 'tariff_p50', 'tariff_p75',
+    'los_p25', 'los_p50', 'los_p75'
+)
+
+# IQR of a normal distribution in standard deviations
+IQR_TO_SIGMA = 1.349
+# Scale floors, so a tight group cannot turn small differences into huge deviations
+MIN_TARIFF_SCALE_FRACTION = 0.05   # of the group's median tariff
+MIN_LOS_SCALE = 1.0                # days
+
+# Claim fields the table fills in for feature_spec, in this order
+PEER_FIELDS = ('peer_tariff_median', 'peer_tariff_scale', 'peer_los_median', 'peer_los_scale')
+
+
+class PeerGroupTable:
+    """Peer statistics keyed by normalized (icd10, care_class, hospital) prefixes"""
+
+    def __init__(self, keys, stats, min_claims=MIN_GROUP_CLAIMS):
+        self.keys = [tuple(key) for key in keys]
+        self.stats = np.asarray(stats, dtype=np.float64).reshape(len(self.keys), len(STAT_COLUMNS))
+        self.min_claims = min_claims
+
+        self.rows = {key: i for i, key in enumerate(self.keys)}
+        if () not in self.rows:
+            raise ValueError('Peer group table has no overall (level 0) row')
+
+        self.inputs = peer_inputs(self.stats)
+        # One shared dict per group, returned as-is by lookup
+        self.fields = [dict(zip(PEER_FIELDS, row)) for row in self.inputs.tolist()]
+
+    @classmethod
+    def fit(cls, df, min_claims=MIN_GROUP_CLAIMS):
+        """Fit from claims with the GROUP_COLUMNS, tarif_rs and los_days columns"""
+        codes, labels = zip(*(_factorize(df[column]) for column in GROUP_COLUMNS))
+        values = pd.DataFrame({
+            'tarif_rs': np.asarray(df['tarif_rs'], dtype=np.float64),
+            'los_days': np.asarray(df['los_days'], dtype=np.float64)
+        })
+
+        keys = []
+        stats = []
+        for level in LEVELS:
+            if level:
+                grouped = values.groupby(list(codes[:level]), sort=True)
+                counts = grouped.size()
+                quantiles = grouped.quantile(list(QUANTILES)).unstack()
+                # Groups always come back as tuples, even for one column
+                groups = [group if isinstance(group, tuple) else (group,) for group in counts.index]
+            else:
+                counts = pd.Series([len(values)])
+                quantiles = values.quantile(list(QUANTILES)).unstack().to_frame().T
+                groups = [()]
+
+            table = np.column_stack([
+                counts.to_numpy(dtype=np.float64),
+                *(quantiles[('tarif_rs', q)].to_numpy() for q in QUANTILES),
+                *(quantiles[('los_days', q)].to_numpy() for q in QUANTILES)
+            ])
+            for group, row in zip(groups, table):
+                if level and row[0] < min_claims:
+                    continue
+                keys.append(tuple(labels[j][code] for j, code in enumerate(group)))
+                stats.append(row)
+
+        return cls(keys, np.asarray(stats), min_claims)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _row(self, key):
+        for level in LEVELS:
+            row = self.rows.get(key[:level])
+            if row is not None:
+                return row
+
+    def lookup(self, data):
+        """PEER_FIELDS values for one claim dict (shared dict, do not modify)"""
+        key = tuple(normalize_category(data.get(column)) for column in GROUP_COLUMNS)
+        return self.fields[self._row(key)]
+
+    def lookup_many(self, columns):
+        """PEER_FIELDS arrays for whole columns (DataFrame or dict of arrays)
+
+        Each distinct group combination is resolved once with the scalar
+        backoff, so columns and single claims always get the same peers.
+        """
+        codes, labels = zip(*(_factorize(columns[column]) for column in GROUP_COLUMNS))
+
+        combined = np.zeros(len(codes[0]), dtype=np.int64)
+        for column_codes, column_labels in zip(codes, labels):
+            combined = combined * len(column_labels) + column_codes
+        unique, inverse = np.unique(combined, return_inverse=True)
+
+        rows = np.empty(len(unique), dtype=np.int64)
+        for i, value in enumerate(unique.tolist()):
+            key = []
+            for column_labels in reversed(labels):
+                value, code = divmod(value, len(column_labels))
+                key.append(column_labels[code])
+            rows[i] = self._row(tuple(reversed(key)))
+
+        values = self.inputs[rows[inverse]]
+        return {field: values[:, j] for j, field in enumerate(PEER_FIELDS)}
+
+    def level_counts(self):
+        """Groups kept per level (number of key columns)"""
+        counts = {level: 0 for level in LEVELS}
+        for key in self.keys:
+            counts[len(key)] += 1
+        return counts
+
+    def to_dict(self):
+        """JSON-serializable form (bundle file)"""
+        return {
+            'group_columns': list(GROUP_COLUMNS),
+            'stat_columns': list(STAT_COLUMNS),
+            'min_claims': self.min_claims,
+            'keys': [list(key) for key in self.keys],
+            'stats': self.stats.tolist()
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if list(data['group_columns']) != list(GROUP_COLUMNS) or list(data['stat_columns']) != list(STAT_COLUMNS):
+            raise ValueError('Peer group table was built for different columns')
+        return cls(data['keys'], data['stats'], data['min_claims'])
+
+
+def peer_inputs(stats):
+    """(n, len(PEER_FIELDS)) median and robust scale per table row"""
+    column = {name: stats[:, i] for i, name in enumerate(STAT_COLUMNS)}
+    tariff_scale = np.maximum((column['tariff_p75'] - column['tariff_p25']) / IQR_TO_SIGMA,
+                              MIN_TARIFF_SCALE_FRACTION * column['tariff_p50'])
+    los_scale = np.maximum((column['los_p75'] - column['los_p25']) / IQR_TO_SIGMA, MIN_LOS_SCALE)
+    return np.column_stack([column['tariff_p50'], tariff_scale, column['los_p50'], los_scale])
+
+
+def _factorize(values):
+    """(codes, labels): codes index labels, the distinct normalized categories"""
+    codes, uniques = pd.factorize(pd.Series(values), use_na_sentinel=False)
+    normalized = np.asarray([normalize_category(None if pd.isna(u) else u) for u in uniques], dtype=object)
+    # "2" and 2 are one category
+    label_codes, labels = pd.factorize(normalized)
+    return label_codes[codes], list(labels)
+
+
+if __name__ == '__main__':
+    table = PeerGroupTable.fit(pd.read_csv('claims_fraud_dataset.csv'))
+    print(f"📊 {len(table)} peer groups (min {table.min_claims} claims), by level: {table.level_counts()}")
+    print(pd.DataFrame(table.stats, columns=STAT_COLUMNS,
+                       index=['|'.join(key) or '*' for key in table.keys]).round(1).to_string())
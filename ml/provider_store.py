@@ -0,0 +1,432 @@
+"""
+In-process provider history store for serving
+Keeps claims per doctor, hospital and submitted day for the point-in-time
+provider features: claims and high-cost rate of the doctor and the hospital
+over the ROLLING_WINDOWS days before a claim's submitted_date. Claims
+submitted on the same day or later never count, so the value does not
+depend on the order claims arrive in. provider_claims_count and
+provider_high_cost_rate are generate_fraud_data's running doctor statistics
+bounded the same way: the longest window plus the claim itself, so served
+values stay in the range training saw however long the service runs.
+rolling_provider_columns computes the same values for whole datasets
+(training, bulk scoring) with one sort and binary searches instead of a
+loop over claims.
+
+In the pre-fork server (serve.py) every worker keeps its own copy and
+share() replicates the claims each worker counts to the others through a
+SharedLog (shared_log.py).
+"""
+
+import os
+import pickle
+import threading
+from datetime import date
+import numpy as np
+import pandas as pd
+
+from shared_log import SYNC_INTERVAL, SharedLog
+
+# Same cut-off generate_fraud_data uses for a "high cost" claim
+HIGH_COST_RATIO = 1.2
+
+# Recently scored claim IDs remembered so re-scoring does not double count
+MAX_TRACKED_CLAIMS = 100000
+
+# Rolling provider history windows, in days before the claim's submitted_date
+ROLLING_WINDOWS = (30, 90)
+ROLLING_KEYS = {'provider': 'doctor_id', 'hospital': 'hospital_code'}
+# Claim fields the rolling history fills in for feature_spec, in this order
+ROLLING_FIELDS = tuple(
+    f'{prefix}_{stat}_{window}d'
+    for prefix in ROLLING_KEYS
+    for window in ROLLING_WINDOWS
+    for stat in ('claims', 'high_cost_rate')
+)
+# Running doctor statistics: this window before the claim, plus the claim itself
+PROVIDER_COUNT_WINDOW = max(ROLLING_WINDOWS)
+PROVIDER_COUNT_FIELDS = ('provider_claims_count', 'provider_high_cost_rate')
+# Every claim field the provider history fills in
+HISTORY_FIELDS = PROVIDER_COUNT_FIELDS + ROLLING_FIELDS
+
+SNAPSHOT_VERSION = 2
+
+class ProviderFeatureStore:
+    """Thread-safe running claim counters per doctor and per hospital"""
+
+    def __init__(self, snapshot_path=None, max_tracked_claims=MAX_TRACKED_CLAIMS):
+        self.snapshot_path = snapshot_path
+        self.max_tracked_claims = max_tracked_claims
+        self.doctors = {}      # doctor_id -> [claims, high_cost_claims]
+        self.hospitals = {}    # hospital_code -> [claims, high_cost_claims]
+        self.claim_ids = {}    # claim_id -> None, insertion ordered
+        # ROLLING_KEYS prefix -> {doctor_id / hospital_code -> DailyCounts}
+        self.daily = {prefix: {} for prefix in ROLLING_KEYS}
+        self.latest_day = None
+        self.dirty = False
+        self.log = None        # SharedLog once share() is called
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def observe(self, doctor_id, hospital_code, tariff_ratio, claim_id=None, submitted_date=None):
+        """Record one scored claim and return its HISTORY_FIELDS
+
+        The features are as of submitted_date. A claim without a
+        valid one is dated the latest day the store has recorded (today for
+        an empty store), so on a replayed or backfilled history it lands
+        next to the claims around it instead of months later. A claim_id
+        seen before is not counted again, so retries and re-scoring return
+        the current statistics unchanged.
+        """
+        is_high_cost = int(tariff_ratio > HIGH_COST_RATIO)
+        day = submitted_day(submitted_date)
+
+        with self.lock:
+            if day < 0:
+                day = self.latest_day if self.latest_day is not None else date.today().toordinal()
+
+            entry = (doctor_id, hospital_code, is_high_cost, claim_id, day)
+            if self._count(*entry) and self.log is not None:
+                self.log.append(entry)
+
+            features = {}
+            for prefix, key in (('provider', doctor_id), ('hospital', hospital_code)):
+                counts = self.daily[prefix].get(key)
+                sums = counts.windows(day) if counts is not None else [(0, 0)] * len(ROLLING_WINDOWS)
+                for window, window_counts in zip(ROLLING_WINDOWS, sums):
+                    features[f'{prefix}_claims_{window}d'] = window_counts[0]
+                    features[f'{prefix}_high_cost_rate_{window}d'] = _rate(window_counts)
+                    if prefix == 'provider' and window == PROVIDER_COUNT_WINDOW:
+                        claims, high_cost = window_counts
+
+            features['provider_claims_count'] = claims + 1
+            features['provider_high_cost_rate'] = (high_cost + is_high_cost) / (claims + 1)
+            return features
+
+    def _count(self, doctor_id, hospital_code, is_high_cost, claim_id, day):
+        """Count one claim unless its claim_id was counted before (caller holds the lock)"""
+        doctor = self.doctors.setdefault(doctor_id, [0, 0])
+        hospital = self.hospitals.setdefault(hospital_code, [0, 0])
+        if claim_id is not None and claim_id in self.claim_ids:
+            return False
+
+        doctor[0] += 1
+        doctor[1] += is_high_cost
+        hospital[0] += 1
+        hospital[1] += is_high_cost
+        self._add_day(day, ((doctor_id, hospital_code, 1, is_high_cost),))
+        self.dirty = True
+
+        if claim_id is not None:
+            self.claim_ids[claim_id] = None
+            if len(self.claim_ids) > self.max_tracked_claims:
+                del self.claim_ids[next(iter(self.claim_ids))]
+        return True
+
+    def _add_day(self, day, claims):
+        """Count (doctor_id, hospital_code, claims, high_cost_claims) on day (caller holds the lock)"""
+        for doctor_id, hospital_code, count, high_cost in claims:
+            for prefix, key in (('provider', doctor_id), ('hospital', hospital_code)):
+                counts = self.daily[prefix].get(key)
+                if counts is None:
+                    counts = self.daily[prefix][key] = DailyCounts()
+                counts.add(day, count, high_cost)
+
+        # Days older than the longest window before the latest day are never read again
+        # (a claim dated in the future must not prune the history)
+        if (self.latest_day is None or day > self.latest_day) and day <= date.today().toordinal():
+            self.latest_day = day
+            oldest = day - max(ROLLING_WINDOWS)
+            for providers in self.daily.values():
+                for counts in providers.values():
+                    counts.prune(oldest)
+
+    def lookup(self, doctor_id):
+        """Return all-time (claims count, high cost rate) for a doctor without recording"""
+        with self.lock:
+            doctor = self.doctors.get(doctor_id, [0, 0])
+            return doctor[0], _rate(doctor)
+
+    def lookup_hospital(self, hospital_code):
+        """Return all-time (claims count, high cost rate) for a hospital without recording"""
+        with self.lock:
+            hospital = self.hospitals.get(hospital_code, [0, 0])
+            return hospital[0], _rate(hospital)
+
+    def stats(self):
+        with self.lock:
+            stats = {
+                'doctors': len(self.doctors),
+                'hospitals': len(self.hospitals),
+                'tracked_claims': len(self.claim_ids),
+                'latest_submitted_date': (date.fromordinal(self.latest_day).isoformat()
+                                          if self.latest_day is not None else None)
+            }
+        if self.log is not None:
+            stats['shared'] = self.log.stats()
+        return stats
+
+    def share(self, path):
+        """Replicate counted claims with the other pre-fork workers through a new log at path
+
+        Every worker scores from its own copy, so observe() never waits on
+        another process; start_sync() in each worker exchanges the claims
+        every SYNC_INTERVAL. Another worker's claim reaches this history
+        within that interval, and the rolling windows never count the as-of
+        day itself. claim_id deduplication holds across workers.
+        """
+        self.log = SharedLog.create(path)
+
+    def start_sync(self, interval_seconds=SYNC_INTERVAL):
+        """Exchange claims through the shared log in a background thread (in each worker)"""
+        self.log.start(self.apply, interval_seconds)
+
+    def stop_sync(self):
+        """Stop the sync thread and write the claims still queued"""
+        self.log.stop(self.apply)
+
+    def sync(self):
+        """One exchange through the shared log (the parent, before a snapshot)"""
+        self.apply(self.log.sync())
+
+    def apply(self, entries):
+        """Count claims other workers recorded, skipping claim_ids already counted"""
+        with self.lock:
+            for entry in entries:
+                self._count(*entry)
+
+    def seed_from_dataframe(self, df):
+        """Initialize counters from historical claims (claims_fraud_dataset.csv shape)"""
+        high_cost = (df['tarif_rs'] / df['tarif_inacbg'] > HIGH_COST_RATIO).astype(int)
+        days = (submitted_days(df['submitted_date']) if 'submitted_date' in df
+                else np.full(len(df), -1, dtype=np.int64))
+
+        with self.lock:
+            for key, target in (('doctor_id', self.doctors), ('hospital_code', self.hospitals)):
+                grouped = high_cost.groupby(df[key]).agg(['count', 'sum'])
+                for code, (count, high) in grouped.iterrows():
+                    target[code] = [int(count), int(high)]
+
+            # Claims per provider and submitted day, oldest day first
+            dated = days >= 0
+            by_day = high_cost[dated].groupby([df['doctor_id'][dated], df['hospital_code'][dated],
+                                               days[dated]]).agg(['count', 'sum'])
+            by_day = by_day.sort_index(level=2)
+            for (doctor_id, hospital_code, day), (count, high) in zip(by_day.index, by_day.to_numpy()):
+                self._add_day(int(day), ((doctor_id, hospital_code, int(count), int(high)),))
+
+            if 'claim_id' in df:
+                for claim_id in df['claim_id'].tail(self.max_tracked_claims):
+                    self.claim_ids[claim_id] = None
+
+            self.dirty = True
+
+    def save_snapshot(self):
+        """Atomically write the counters to snapshot_path"""
+        if not self.snapshot_path:
+            return False
+
+        with self.lock:
+            if not self.dirty:
+                return False
+            state = {
+                'version': SNAPSHOT_VERSION,
+                'doctors': {k: tuple(v) for k, v in self.doctors.items()},
+                'hospitals': {k: tuple(v) for k, v in self.hospitals.items()},
+                'claim_ids': list(self.claim_ids),
+                'daily': {
+                    prefix: {k: {day: tuple(c) for day, c in counts.days.items()} for k, counts in providers.items()}
+                    for prefix, providers in self.daily.items()
+                },
+                'latest_day': self.latest_day
+            }
+            self.dirty = False
+
+        write_snapshot(self.snapshot_path, state)
+        return True
+
+    def load_snapshot(self):
+        """Restore counters from snapshot_path, returns False if there is none"""
+        state = read_snapshot(self.snapshot_path)
+        if state is None:
+            return False
+
+        with self.lock:
+            self.doctors = {k: list(v) for k, v in state['doctors'].items()}
+            self.hospitals = {k: list(v) for k, v in state['hospitals'].items()}
+            self.claim_ids = dict.fromkeys(state['claim_ids'])
+            self.daily = {
+                prefix: {k: DailyCounts(days) for k, days in state['daily'][prefix].items()}
+                for prefix in ROLLING_KEYS
+            }
+            self.latest_day = state['latest_day']
+            self.dirty = False
+        return True
+
+    def start_snapshots(self, interval_seconds):
+        """Snapshot in a background thread every interval_seconds when changed"""
+        if self._thread is not None:
+            return
+
+        def run():
+            while not self._stop.wait(interval_seconds):
+                try:
+                    self.save_snapshot()
+                except OSError as e:
+                    print(f"⚠️  Provider snapshot failed: {e}")
+
+        self._thread = threading.Thread(target=run, name='provider-snapshot', daemon=True)
+        self._thread.start()
+
+    def stop_snapshots(self):
+        """Stop the background thread and write a final snapshot"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.save_snapshot()
+
+
+class DailyCounts:
+    """One doctor's or hospital's claims per submitted day
+
+    Window sums are cached for the last as-of day asked for. Claims scored
+    today land on the as-of day itself, outside every window, so the cache
+    normally holds for the whole day.
+    """
+
+    __slots__ = ('days', 'cached_day', 'cached')
+
+    def __init__(self, days=None):
+        self.days = {day: list(counts) for day, counts in (days or {}).items()}  # day -> [claims, high_cost]
+        self.cached_day = None
+        self.cached = None
+
+    def add(self, day, claims, high_cost):
+        counts = self.days.get(day)
+        if counts is None:
+            counts = self.days[day] = [0, 0]
+        counts[0] += claims
+        counts[1] += high_cost
+        # A claim on day changes the windows of every later as-of day
+        if self.cached_day is not None and day < self.cached_day:
+            self.cached_day = None
+
+    def prune(self, oldest_day):
+        stale = [day for day in self.days if day < oldest_day]
+        for day in stale:
+            del self.days[day]
+        if stale:
+            self.cached_day = None
+
+    def windows(self, as_of):
+        """[(claims, high_cost_claims)] per ROLLING_WINDOWS, over the days before as_of"""
+        if as_of != self.cached_day:
+            sums = [[0, 0] for _ in ROLLING_WINDOWS]
+            for day, (claims, high_cost) in self.days.items():
+                age = as_of - day
+                if age < 1:
+                    continue
+                for window, window_sums in zip(ROLLING_WINDOWS, sums):
+                    if age <= window:
+                        window_sums[0] += claims
+                        window_sums[1] += high_cost
+            self.cached_day, self.cached = as_of, sums
+        return self.cached
+
+
+def rolling_provider_columns(columns, days=None):
+    """HISTORY_FIELDS arrays for whole columns (DataFrame or dict of arrays)
+
+    Needs doctor_id, hospital_code, tarif_rs, tarif_inacbg and
+    submitted_date (or the parsed submitted_days passed as days). Claims
+    are counted per (provider, day) after one sort; each window is then a
+    binary search and a difference of running sums, never a loop over
+    claims. Rows without a valid submitted_date are not part of any
+    history and get zeros.
+    """
+    tarif_rs = np.asarray(columns['tarif_rs'], dtype=np.float64)
+    tarif_inacbg = np.asarray(columns['tarif_inacbg'], dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        high_cost = (np.where(tarif_inacbg > 0, tarif_rs / tarif_inacbg, 1.0) > HIGH_COST_RATIO).astype(np.int64)
+    if days is None:
+        days = (submitted_days(columns['submitted_date']) if 'submitted_date' in columns
+                else np.full(len(tarif_rs), -1, dtype=np.int64))
+    days = np.asarray(days, dtype=np.int64)
+
+    dated = days >= 0
+    first_day = days[dated].min() if dated.any() else 0
+    # Each provider's days live in their own stride, so no window reaches the previous provider
+    stride = (days[dated].max() - first_day if dated.any() else 0) + max(ROLLING_WINDOWS) + 1
+
+    result = {}
+    for prefix, key in ROLLING_KEYS.items():
+        codes = pd.factorize(pd.Series(columns[key]))[0]
+        valid = dated & (codes >= 0)
+
+        # Rows of one provider on one day share their history: work per (provider, day)
+        keys, inverse = np.unique(codes[valid].astype(np.int64) * stride + (days[valid] - first_day),
+                                  return_inverse=True)
+        claims_before = np.concatenate([[0], np.cumsum(np.bincount(inverse))])
+        high_cost_before = np.concatenate([[0], np.cumsum(np.bincount(inverse, weights=high_cost[valid]))])
+
+        # Claims before the day: [day - window, day)
+        end = np.arange(len(keys))
+        for window in ROLLING_WINDOWS:
+            start = np.searchsorted(keys, keys - window, side='left')
+            claims = np.zeros(len(valid))
+            rate = np.zeros(len(valid))
+            window_claims = claims_before[end] - claims_before[start]
+            claims[valid] = window_claims[inverse]
+            rate[valid] = ((high_cost_before[end] - high_cost_before[start]) / np.maximum(window_claims, 1))[inverse]
+            result[f'{prefix}_claims_{window}d'] = claims
+            result[f'{prefix}_high_cost_rate_{window}d'] = rate
+            if prefix == 'provider' and window == PROVIDER_COUNT_WINDOW:
+                window_high_cost = np.zeros(len(valid))
+                window_high_cost[valid] = (high_cost_before[end] - high_cost_before[start])[inverse]
+                result['provider_claims_count'] = claims + 1
+                result['provider_high_cost_rate'] = (window_high_cost + high_cost) / (claims + 1)
+
+    return {field: result[field] for field in HISTORY_FIELDS}
+
+
+def write_snapshot(path, state):
+    """Atomically pickle a snapshot state to path"""
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path):
+    """Snapshot state at path, None when there is none or it is an older version"""
+    if not path or not os.path.exists(path):
+        return None
+
+    with open(path, 'rb') as f:
+        state = pickle.load(f)
+
+    if state.get('version') != SNAPSHOT_VERSION:
+        # Older snapshots have no daily counts: rebuild from the history instead
+        print(f"⚠️  Ignoring provider snapshot version {state.get('version')} (expected {SNAPSHOT_VERSION})")
+        return None
+    return state
+
+
+def submitted_day(value):
+    """Day ordinal of one submitted_date ('YYYY-MM-DD...'), -1 when missing or invalid"""
+    try:
+        return date.fromisoformat(str(value)[:10]).toordinal()
+    except ValueError:
+        return -1
+
+
+def submitted_days(values):
+    """submitted_day for a whole column; each distinct date is parsed once"""
+    codes, uniques = pd.factorize(pd.Series(values))
+    parsed = np.array([submitted_day(value) for value in uniques], dtype=np.int64)
+    return np.where(codes >= 0, parsed[codes] if len(parsed) else -1, -1)
+
+
+def _rate(counts):
+    return counts[1] / max(counts[0], 1)
@@ -0,0 +1,497 @@
+"""
+Pre-fork production server for the ML fraud detection service
+The parent process loads the model once and forks worker processes that
+share its memory pages copy-on-write and accept on one listening socket
+
+Signals (to the parent):
+  SIGHUP          graceful restart: reload artifacts, start new workers,
+                  then let the old ones finish in-flight requests and exit
+  SIGTERM/SIGINT  graceful shutdown
+
+Run: python serve.py --workers 4 --port 5001
+     python serve.py --benchmark --max-workers 4   (throughput vs workers)
+
+Unix only (uses os.fork).
+"""
+
+import argparse
+import gc
+import json
+import mmap
+import os
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from flask import jsonify, request
+from werkzeug.serving import make_server
+
+import ml_service
+from benchmark_service import sample_claims
+
+DEFAULT_PORT = 5001
+HEARTBEAT_INTERVAL = 1.0      # seconds between worker heartbeats
+HEARTBEAT_TIMEOUT = 30.0      # a worker silent this long is killed and replaced
+SHUTDOWN_TIMEOUT = 30.0       # seconds a worker gets to finish in-flight requests
+LISTEN_BACKLOG = 1024
+
+# Per-worker health table, lives in anonymous shared memory
+SLOT_DTYPE = np.dtype([
+    ('pid', np.int64),
+    ('generation', np.int64),
+    ('started_at', np.float64),
+    ('heartbeat', np.float64),
+    ('requests', np.int64),
+    ('errors', np.int64),
+    ('in_flight', np.int64)
+])
+
+
+class WorkerTable:
+    """Fixed-size table of worker slots shared by the parent and all workers"""
+
+    def __init__(self, slots):
+        self._buffer = mmap.mmap(-1, SLOT_DTYPE.itemsize * slots)
+        self.slots = np.ndarray((slots,), dtype=SLOT_DTYPE, buffer=self._buffer)
+        self.slots[:] = 0
+
+    def claim(self, pid, generation):
+        """Take a free slot for a new worker, returns its index"""
+        free = np.flatnonzero(self.slots['pid'] == 0)
+        if not len(free):
+            raise RuntimeError('No free worker slot')
+        index = int(free[0])
+        now = time.time()
+        self.slots[index] = (pid, generation, now, now, 0, 0, 0)
+        return index
+
+    def release(self, pid):
+        self.slots[self.slots['pid'] == pid] = 0
+
+    def snapshot(self):
+        now = time.time()
+        return [
+            {
+                'pid': int(slot['pid']),
+                'generation': int(slot['generation']),
+                'uptime_seconds': round(now - slot['started_at'], 1),
+                'heartbeat_age_seconds': round(now - slot['heartbeat'], 1),
+                'requests': int(slot['requests']),
+                'errors': int(slot['errors']),
+                'in_flight': int(slot['in_flight'])
+            }
+            for slot in self.slots if slot['pid']
+        ]
+
+
+# Set in each worker after fork
+worker_table = None
+worker_slot = None
+worker_lock = threading.Lock()
+
+
+def _bump(field, delta=1):
+    if worker_slot is None:
+        return
+    with worker_lock:
+        worker_table.slots[worker_slot][field] += delta
+
+
+@ml_service.app.before_request
+def _track_request_start():
+    _bump('in_flight')
+
+
+@ml_service.app.after_request
+def _track_request_end(response):
+    _bump('requests')
+    if response.status_code >= 500:
+        _bump('errors')
+    return response
+
+
+@ml_service.app.teardown_request
+def _track_request_teardown(exc):
+    _bump('in_flight', -1)
+
+
+@ml_service.app.route('/workers', methods=['GET'])
+def workers_health():
+    """Per-worker health of the pre-fork server"""
+    workers = worker_table.snapshot() if worker_table is not None else []
+    return jsonify({
+        'served_by': os.getpid(),
+        'model_version': ml_service.active_model.version if ml_service.active_model else None,
+        'workers': workers
+    })
+
+
+def prefork_reload():
+    """/admin/reload in pre-fork mode: ask the parent for a graceful restart
+
+    Reloading inside one worker would leave the others on the old model, so
+    the parent reloads once and replaces every worker instead.
+    """
+    if not ml_service.admin_authorized():
+        return jsonify({'success': False, 'error': 'Invalid admin token'}), 403
+
+    if request.method == 'GET':
+        return jsonify({
+            'success': True,
+            'model_version': ml_service.active_model.version if ml_service.active_model else None,
+            'generation': int(worker_table.slots[worker_slot]['generation'])
+        })
+
+    os.kill(os.getppid(), signal.SIGHUP)
+    return jsonify({'success': True, 'message': 'Graceful restart requested'}), 202
+
+
+ml_service.app.view_functions['admin_reload'] = prefork_reload
+
+
+def run_worker(listen_socket, table, slot):
+    """Worker process body: serve on the inherited socket until SIGTERM"""
+    global worker_table, worker_slot
+    worker_table = table
+    worker_slot = slot
+
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    server = make_server('0.0.0.0', 0, ml_service.app, threaded=True, fd=listen_socket.fileno())
+    stopping = threading.Event()
+
+    def heartbeat():
+        while not stopping.wait(HEARTBEAT_INTERVAL):
+            table.slots[slot]['heartbeat'] = time.time()
+
+    def graceful_stop(signum, frame):
+        # shutdown() blocks until serve_forever returns, so call it off the main thread
+        stopping.set()
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, graceful_stop)
+    threading.Thread(target=heartbeat, daemon=True).start()
+
+    # Threads do not survive fork, so each worker runs its own batcher,
+    # audit writer and shared history sync
+    ml_service.provider_store.start_sync(ml_service.SHARED_SYNC_INTERVAL)
+    ml_service.claim_index.start_sync(ml_service.SHARED_SYNC_INTERVAL)
+    if ml_service.MICRO_BATCH_ENABLED:
+        ml_service.batcher.start()
+    if ml_service.AUDIT_LOG_ENABLED:
+        ml_service.audit_log.start()
+
+    server.serve_forever()
+
+    # Let in-flight requests finish before exiting
+    deadline = time.time() + SHUTDOWN_TIMEOUT
+    while table.slots[slot]['in_flight'] > 0 and time.time() < deadline:
+        time.sleep(0.05)
+    ml_service.batcher.stop()
+    ml_service.audit_log.close()
+    ml_service.provider_store.stop_sync()
+    ml_service.claim_index.stop_sync()
+
+
+class PreforkServer:
+    """Parent process: owns the socket, forks and supervises workers"""
+
+    def __init__(self, host, port, workers):
+        self.host = host
+        self.port = port
+        self.num_workers = workers
+        self.generation = 0
+        self.workers = {}        # pid -> generation
+        self.table = WorkerTable(workers * 2)
+        self.socket = None
+        self.stopping = False
+        self.restart_requested = False
+        self.loaded_signature = None
+        self.candidate_signature = None
+        self.next_watch = 0.0
+        self.next_snapshot = 0.0
+
+    def load(self):
+        """Load the model in the parent so workers inherit it"""
+        if not ml_service.load_model_artifacts():
+            return False
+        ml_service.load_provider_history()
+        # Every worker must see the claims the others score: each keeps its
+        # own copy and they exchange new claims through a log file
+        ml_service.provider_store.share(ml_service.PROVIDER_SHARED_PATH)
+        self.next_snapshot = time.time() + ml_service.PROVIDER_SNAPSHOT_INTERVAL
+        ml_service.load_claim_history()
+        # Same for the duplicate index: a claim billed twice may reach two workers
+        ml_service.claim_index.share(ml_service.CLAIM_INDEX_SHARED_PATH)
+        self.loaded_signature = self.candidate_signature = ml_service.artifact_signature()
+
+        # Move everything loaded so far out of the GC's reach: collections in
+        # the workers would otherwise touch (and copy) these shared pages
+        gc.collect()
+        gc.freeze()
+        return True
+
+    def spawn(self):
+        # Reserve the slot before forking so concurrent children never race for one
+        slot = self.table.claim(-1, self.generation)
+
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(self.socket, self.table, slot)
+            except BaseException as e:
+                print(f"❌ Worker {os.getpid()} crashed: {e}")
+                code = 1
+            finally:
+                os._exit(code)
+
+        self.table.slots[slot]['pid'] = pid
+        self.workers[pid] = self.generation
+        return pid
+
+    def start_generation(self):
+        self.generation += 1
+        for _ in range(self.num_workers):
+            self.spawn()
+        print(f"👷 Generation {self.generation}: {self.num_workers} workers "
+              f"({', '.join(str(p) for p, g in self.workers.items() if g == self.generation)})")
+
+    def stop_workers(self, pids, timeout=SHUTDOWN_TIMEOUT):
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+        deadline = time.time() + timeout
+        while any(pid in self.workers for pid in pids) and time.time() < deadline:
+            self.reap(respawn=False)
+            time.sleep(0.05)
+
+        for pid in pids:
+            if pid in self.workers:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+                del self.workers[pid]
+                self.table.release(pid)
+
+    def reap(self, respawn=True):
+        """Collect exited workers and replace them if they belong to the current generation"""
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+
+            generation = self.workers.pop(pid, None)
+            self.table.release(pid)
+            if respawn and not self.stopping and generation == self.generation:
+                print(f"⚠️  Worker {pid} exited (status {status}), starting a replacement")
+                self.spawn()
+
+    def check_heartbeats(self):
+        now = time.time()
+        for slot in self.table.slots:
+            pid = int(slot['pid'])
+            if pid in self.workers and now - slot['heartbeat'] > HEARTBEAT_TIMEOUT:
+                print(f"⚠️  Worker {pid} missed heartbeats, killing it")
+                os.kill(pid, signal.SIGKILL)
+
+    def check_artifacts(self):
+        """Request a graceful restart once changed artifacts have been stable for an interval"""
+        self.next_watch = time.time() + ml_service.MODEL_WATCH_INTERVAL
+        current = ml_service.artifact_signature()
+        if current != self.loaded_signature and current == self.candidate_signature:
+            print("📦 Model artifacts changed on disk")
+            self.restart_requested = True
+        self.candidate_signature = current
+
+    def snapshot_provider_history(self):
+        """Catch up with the claims the workers logged, then write the provider snapshot
+
+        Workers forked later start from the parent's copies, so the
+        duplicate index is brought up to date as well.
+        """
+        self.next_snapshot = time.time() + ml_service.PROVIDER_SNAPSHOT_INTERVAL
+        try:
+            ml_service.provider_store.sync()
+            ml_service.claim_index.sync()
+            ml_service.provider_store.save_snapshot()
+        except (OSError, sqlite3.Error) as e:
+            print(f"⚠️  Provider snapshot failed: {e}")
+
+    def graceful_restart(self):
+        print("🔄 Graceful restart: reloading model artifacts...")
+        gc.unfreeze()
+        # Failed artifacts are not retried until they change again
+        self.loaded_signature = ml_service.artifact_signature()
+        if not ml_service.load_model_artifacts():
+            print("❌ Reload failed, keeping current workers")
+            gc.freeze()
+            return
+
+        gc.collect()
+        gc.freeze()
+
+        old = [pid for pid, g in self.workers.items() if g == self.generation]
+        self.start_generation()
+        self.stop_workers(old)
+        print("✅ Restart complete")
+
+    def serve(self):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((self.host, self.port))
+        self.socket.listen(LISTEN_BACKLOG)
+        self.socket.set_inheritable(True)
+
+        def request_stop(signum, frame):
+            self.stopping = True
+
+        def request_restart(signum, frame):
+            self.restart_requested = True
+
+        signal.signal(signal.SIGTERM, request_stop)
+        signal.signal(signal.SIGINT, request_stop)
+        signal.signal(signal.SIGHUP, request_restart)
+
+        self.start_generation()
+        print(f"📡 Listening on http://{self.host}:{self.port} (parent pid {os.getpid()})")
+
+        try:
+            while not self.stopping:
+                time.sleep(0.2)
+                self.reap()
+                self.check_heartbeats()
+                if ml_service.MODEL_WATCH_INTERVAL > 0 and time.time() >= self.next_watch:
+                    self.check_artifacts()
+                if time.time() >= self.next_snapshot:
+                    self.snapshot_provider_history()
+                if self.restart_requested:
+                    self.restart_requested = False
+                    self.graceful_restart()
+        finally:
+            print("🛑 Shutting down workers...")
+            self.stopping = True
+            self.stop_workers(list(self.workers))
+            self.socket.close()
+            # Workers have exited, so the log holds all the claims they counted
+            self.snapshot_provider_history()
+
+
+# Benchmark: throughput vs number of workers
+
+def _load_client(url, claims, duration):
+    """One client process: send claims back to back for duration seconds"""
+    latencies = []
+    bodies = [json.dumps(claim).encode() for claim in claims]
+    deadline = time.perf_counter() + duration
+    i = 0
+
+    while time.perf_counter() < deadline:
+        req = urllib.request.Request(url, data=bodies[i % len(bodies)],
+                                     headers={'Content-Type': 'application/json'})
+        start = time.perf_counter()
+        with urllib.request.urlopen(req) as response:
+            response.read()
+        latencies.append(time.perf_counter() - start)
+        i += 1
+
+    return latencies
+
+
+def _wait_until_ready(port, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/health', timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def benchmark_scaling(max_workers, concurrency, duration, port):
+    """Start the pre-fork server with 1..max_workers workers and measure throughput"""
+    claims = sample_claims()
+    url = f'http://127.0.0.1:{port}/predict'
+    results = []
+
+    for workers in range(1, max_workers + 1):
+        server = subprocess.Popen(
+            [sys.executable, __file__, '--workers', str(workers), '--port', str(port)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            if not _wait_until_ready(port):
+                raise RuntimeError(f'Server with {workers} workers did not start')
+
+            with ProcessPoolExecutor(max_workers=concurrency) as pool:
+                futures = [pool.submit(_load_client, url, claims, duration) for _ in range(concurrency)]
+                latencies = np.concatenate([f.result() for f in futures]) * 1000
+
+            results.append({
+                'workers': workers,
+                'requests': int(len(latencies)),
+                'requests_per_second': len(latencies) / duration,
+                'p50_ms': float(np.percentile(latencies, 50)),
+                'p99_ms': float(np.percentile(latencies, 99))
+            })
+            r = results[-1]
+            print(f"{workers:>3} workers: {r['requests_per_second']:8.1f} req/s   "
+                  f"p50 {r['p50_ms']:7.2f} ms   p99 {r['p99_ms']:7.2f} ms")
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=SHUTDOWN_TIMEOUT + 10)
+
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Pre-fork server for the ML fraud detection service')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='Measure throughput for 1..--max-workers workers instead of serving')
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count())
+    parser.add_argument('--concurrency', type=int, default=None,
+                        help='Benchmark client processes (default: 2 x max workers)')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds per benchmark step')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if args.benchmark:
+        print("🚀 Pre-fork Throughput Benchmark")
+        print("="*60)
+        concurrency = args.concurrency or 2 * args.max_workers
+        benchmark_scaling(args.max_workers, concurrency, args.duration, args.port)
+        return
+
+    print("🚀 Starting ML Fraud Detection Service (pre-fork)")
+    print("="*60)
+
+    server = PreforkServer(args.host, args.port, args.workers)
+    if not server.load():
+        print("\n❌ Failed to start service. Please train the model first:")
+        print("   python train_fraud_model.py")
+        sys.exit(1)
+
+    server.serve()
+
+
+if __name__ == '__main__':
+    main()
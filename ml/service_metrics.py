@@ -0,0 +1,267 @@
+"""
+Low-overhead serving metrics for the ML fraud detection service
+Per-stage latency histograms, request/error counters, a Prometheus-style
+text exposition for /metrics and an opt-in sampling profiler
+"""
+
+import bisect
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+
+# Histogram bucket upper bounds in milliseconds
+LATENCY_BUCKETS_MS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+METRIC_PREFIX = 'fraud_ml'
+
+# Sampling profiler defaults
+PROFILE_INTERVAL_MS = 5.0
+PROFILE_MAX_SECONDS = 300
+# Sampling faster than this costs more than the request being profiled
+PROFILE_MIN_INTERVAL_MS = 1.0
+PROFILE_MAX_INTERVAL_MS = 1000.0
+PROFILE_MAX_DEPTH = 64
+
+
+class LatencyHistogram:
+    """Cumulative-bucket latency histogram (milliseconds)"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, ms):
+        index = bisect.bisect_left(self.buckets, ms)
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += ms
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.counts), self.count, self.total
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding quantile q (inf if in the overflow bucket)"""
+        counts, count, _ = self.snapshot()
+        if not count:
+            return 0.0
+        rank = q * count
+        seen = 0
+        for bound, n in zip(self.buckets, counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+class StageTimer:
+    """Context manager that records its duration into a histogram"""
+
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe((time.perf_counter() - self.start) * 1000.0)
+        return False
+
+
+class MetricsRegistry:
+    """Stage histograms and labelled counters for one process"""
+
+    def __init__(self):
+        self.histograms = {}      # (endpoint, stage) -> LatencyHistogram
+        self.counters = Counter()  # (name, labels tuple) -> value
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+
+    def histogram(self, endpoint, stage):
+        key = (endpoint, stage)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(key, LatencyHistogram())
+        return histogram
+
+    def time(self, endpoint, stage):
+        """with metrics.time('predict', 'forest'): ..."""
+        return StageTimer(self.histogram(endpoint, stage))
+
+    def observe(self, endpoint, stage, ms):
+        self.histogram(endpoint, stage).observe(ms)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] += value
+
+    def stage_summary(self):
+        """p50/p99 (bucket upper bounds) and mean per endpoint stage, for JSON views"""
+        summary = {}
+        for (endpoint, stage), histogram in sorted(self.histograms.items()):
+            _, count, total = histogram.snapshot()
+            summary.setdefault(endpoint, {})[stage] = {
+                'count': count,
+                'mean_ms': total / count if count else 0.0,
+                'p50_ms': histogram.quantile(0.50),
+                'p99_ms': histogram.quantile(0.99)
+            }
+        return summary
+
+    def render(self, gauges=None):
+        """Prometheus text exposition format"""
+        lines = [
+            f'# HELP {METRIC_PREFIX}_stage_latency_ms Latency of each request stage in milliseconds',
+            f'# TYPE {METRIC_PREFIX}_stage_latency_ms histogram'
+        ]
+
+        for (endpoint, stage), histogram in sorted(self.histograms.items()):
+            counts, count, total = histogram.snapshot()
+            labels = f'endpoint="{endpoint}",stage="{stage}"'
+            cumulative = 0
+            for bound, n in zip(histogram.buckets, counts):
+                cumulative += n
+                lines.append(f'{METRIC_PREFIX}_stage_latency_ms_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{METRIC_PREFIX}_stage_latency_ms_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'{METRIC_PREFIX}_stage_latency_ms_sum{{{labels}}} {total:.6f}')
+            lines.append(f'{METRIC_PREFIX}_stage_latency_ms_count{{{labels}}} {count}')
+
+        with self.lock:
+            counters = sorted(self.counters.items())
+
+        declared = set()
+        for (name, labels), value in counters:
+            metric = f'{METRIC_PREFIX}_{name}'
+            if metric not in declared:
+                lines.append(f'# TYPE {metric} counter')
+                declared.add(metric)
+            lines.append(f'{metric}{_format_labels(labels)} {value}')
+
+        gauges = dict(gauges or {})
+        gauges[('uptime_seconds', ())] = time.time() - self.started_at
+        for (name, labels), value in sorted(gauges.items()):
+            metric = f'{METRIC_PREFIX}_{name}'
+            if metric not in declared:
+                lines.append(f'# TYPE {metric} gauge')
+                declared.add(metric)
+            lines.append(f'{metric}{_format_labels(labels)} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in labels) + '}'
+
+
+class SamplingProfiler:
+    """Opt-in wall-clock stack sampler for live traffic
+
+    A background thread snapshots every other thread's stack each interval
+    and counts collapsed stacks ("a;b;c count", the flamegraph.pl input
+    format). Nothing runs until start() is called.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stacks = Counter()
+        self.samples = 0
+        self.started_at = None
+        self.stopped_at = None
+        self.interval_ms = PROFILE_INTERVAL_MS
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds, interval_ms=PROFILE_INTERVAL_MS):
+        """Sample for seconds, returns False if already running
+
+        Raises ValueError unless 0 < seconds <= PROFILE_MAX_SECONDS and
+        PROFILE_MIN_INTERVAL_MS <= interval_ms <= PROFILE_MAX_INTERVAL_MS.
+        """
+        seconds, interval_ms = float(seconds), float(interval_ms)
+        # Written so NaN fails too
+        if not 0 < seconds <= PROFILE_MAX_SECONDS:
+            raise ValueError(f'seconds must be above 0 and at most {PROFILE_MAX_SECONDS}')
+        if not PROFILE_MIN_INTERVAL_MS <= interval_ms <= PROFILE_MAX_INTERVAL_MS:
+            raise ValueError(f'interval_ms must be between {PROFILE_MIN_INTERVAL_MS:g} '
+                             f'and {PROFILE_MAX_INTERVAL_MS:g}')
+        if self.running:
+            return False
+
+        with self.lock:
+            self.stacks = Counter()
+            self.samples = 0
+            self.started_at = time.time()
+            self.stopped_at = None
+            self.interval_ms = interval_ms
+
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, args=(seconds, interval_ms / 1000.0),
+            name='sampling-profiler', daemon=True
+        )
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self, seconds, interval):
+        me = threading.get_ident()
+        deadline = time.monotonic() + seconds
+
+        while not self._stop.is_set() and time.monotonic() < deadline:
+            collected = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                stack = [
+                    f'{entry.name} ({entry.filename.rsplit("/", 1)[-1]}:{entry.lineno})'
+                    for entry in traceback.extract_stack(frame, limit=PROFILE_MAX_DEPTH)
+                ]
+                collected.append(';'.join(stack))
+
+            with self.lock:
+                self.stacks.update(collected)
+                self.samples += 1
+
+            self._stop.wait(interval)
+
+        with self.lock:
+            self.stopped_at = time.time()
+
+    def status(self):
+        with self.lock:
+            return {
+                'running': self.running,
+                'samples': self.samples,
+                'interval_ms': self.interval_ms,
+                'started_at': self.started_at,
+                'stopped_at': self.stopped_at,
+                'distinct_stacks': len(self.stacks)
+            }
+
+    def collapsed(self, top=None):
+        """Collapsed stacks, most frequent first"""
+        with self.lock:
+            items = self.stacks.most_common(top)
+        return '\n'.join(f'{stack} {count}' for stack, count in items) + '\n'
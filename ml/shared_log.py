@@ -0,0 +1,152 @@
+"""
+Append-only change log the pre-fork workers replicate through
+Each worker keeps its own in-memory provider history and duplicate index
+(see provider_store.py, claim_index.py), so scoring never waits on another
+process. What a worker adds is queued here, and a background thread writes
+the queue to a SQLite file in one transaction every SYNC_INTERVAL seconds
+and applies the entries the other workers wrote since its last sync.
+
+Entries are kept for RETENTION_SECONDS: long enough for a worker forked
+from the parent (which syncs with every provider snapshot) to catch up.
+"""
+
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+SYNC_INTERVAL = 0.5
+RETENTION_SECONDS = 600
+# Workers wait this long for another worker's transaction
+BUSY_TIMEOUT_MS = 5000
+
+SCHEMA = """
+CREATE TABLE entries (seq INTEGER PRIMARY KEY AUTOINCREMENT, writer BLOB NOT NULL,
+                      created REAL NOT NULL, entry BLOB NOT NULL);
+CREATE INDEX entries_created ON entries (created);
+"""
+
+
+class SharedLog:
+    """Queue of this process's entries plus the file they are exchanged through"""
+
+    def __init__(self, path, retention=RETENTION_SECONDS):
+        self.path = path
+        self.retention = retention
+        self.lock = threading.Lock()
+        self.pending = []
+        self.last_seq = 0
+        self.entries_written = 0
+        self.entries_applied = 0
+        self._pid = None
+        self._connection = None
+        self._writer = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def create(cls, path, retention=RETENTION_SECONDS):
+        """New, empty log file (the parent creates it before forking)"""
+        for stale in (path, f'{path}-wal', f'{path}-shm'):
+            if os.path.exists(stale):
+                os.remove(stale)
+
+        # Connections must not cross a fork, so this one is closed before workers start
+        connection = _connect(path)
+        try:
+            connection.executescript(SCHEMA)
+        finally:
+            connection.close()
+        return cls(path, retention)
+
+    def _connect(self):
+        """This process's connection and writer ID, renewed after fork (caller holds the lock)"""
+        if self._pid != os.getpid():
+            self._connection = _connect(self.path)
+            # Not the pid: a pid can be reused by a later worker
+            self._writer = os.urandom(8)
+            self._pid = os.getpid()
+        return self._connection
+
+    def append(self, entry):
+        """Queue one entry for the next sync"""
+        with self.lock:
+            self.pending.append(entry)
+
+    def sync(self):
+        """Write the queued entries, return the other processes' entries since the last sync"""
+        with self.lock:
+            connection = self._connect()
+            pending, self.pending = self.pending, []
+            try:
+                if pending:
+                    now = time.time()
+                    connection.execute('BEGIN IMMEDIATE')
+                    try:
+                        connection.executemany(
+                            'INSERT INTO entries (writer, created, entry) VALUES (?, ?, ?)',
+                            [(self._writer, now, pickle.dumps(entry, pickle.HIGHEST_PROTOCOL))
+                             for entry in pending]
+                        )
+                        connection.execute('DELETE FROM entries WHERE created < ?', (now - self.retention,))
+                        connection.execute('COMMIT')
+                    except BaseException:
+                        connection.execute('ROLLBACK')
+                        raise
+                rows = connection.execute('SELECT seq, writer, entry FROM entries WHERE seq > ? ORDER BY seq',
+                                          (self.last_seq,)).fetchall()
+            except BaseException:
+                # Written on the next sync instead
+                self.pending[:0] = pending
+                raise
+
+            self.entries_written += len(pending)
+            if rows:
+                self.last_seq = rows[-1][0]
+            entries = [pickle.loads(entry) for _, writer, entry in rows if writer != self._writer]
+            self.entries_applied += len(entries)
+            return entries
+
+    def start(self, apply, interval_seconds=SYNC_INTERVAL):
+        """Sync every interval in a background thread, passing other workers' entries to apply
+
+        Threads do not survive fork: every worker starts its own.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        def run():
+            while not self._stop.wait(interval_seconds):
+                try:
+                    apply(self.sync())
+                except (OSError, sqlite3.Error) as e:
+                    print(f"⚠️  Shared log sync failed: {e}")
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=run, name='shared-log-sync', daemon=True)
+        self._thread.start()
+
+    def stop(self, apply):
+        """Stop the sync thread and write what is still queued"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        apply(self.sync())
+
+    def stats(self):
+        with self.lock:
+            return {
+                'pending_entries': len(self.pending),
+                'entries_written': self.entries_written,
+                'entries_applied': self.entries_applied
+            }
+
+
+def _connect(path):
+    connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000.0, isolation_level=None,
+                                 check_same_thread=False)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    return connection
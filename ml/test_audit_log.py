@@ -0,0 +1,80 @@
+"""
+Tests for the write-behind audit log
+
+Run: python -m pytest test_audit_log.py
+"""
+
+import sqlite3
+import time
+
+import pytest
+
+from audit_log import AuditLog, query, summary
+
+PREDICTION = {
+    'fraud_probability': 0.91, 'is_fraud': True, 'risk_level': 'critical',
+    'risk_factors': [{'feature': 'tariff_ratio', 'value': 1.8}]
+}
+
+
+def entry(claim_id):
+    return ('predict', {'claim_id': claim_id, 'tarif_rs': 5234000}, [1.8, 3.0], PREDICTION, 'v1', None)
+
+
+def test_decisions_are_written_and_append_only(tmp_path):
+    path = str(tmp_path / 'audit.db')
+    log = AuditLog(path, batch_size=2, flush_interval=60)
+    log.start()
+    log.record(*entry('CLM-1'))
+    log.record_many([entry('CLM-2'), entry('CLM-3')])
+    assert log.flush(timeout=10)
+    log.record(*entry('CLM-1'))
+    # close() writes what is still queued
+    log.close()
+
+    records = query(path, claim_ids=['CLM-1'])
+    assert len(records) == 2
+    assert records[0]['claim'] == {'claim_id': 'CLM-1', 'tarif_rs': 5234000}
+    assert records[0]['prediction']['risk_factors'][0]['feature'] == 'tariff_ratio'
+    assert records[0]['features'] == [1.8, 3.0] and records[0]['risk_level'] == 'critical'
+    assert summary(path)['records'] == 4
+    assert log.stats()['records_written'] == 4
+
+    connection = sqlite3.connect(path)
+    with pytest.raises(sqlite3.DatabaseError, match='append-only'):
+        connection.execute("UPDATE predictions SET is_fraud = 0")
+    with pytest.raises(sqlite3.DatabaseError, match='append-only'):
+        connection.execute("DELETE FROM predictions")
+    connection.close()
+
+
+@pytest.mark.parametrize('overflow, kept', [
+    ('drop_newest', ['CLM-0', 'CLM-1']),
+    ('drop_oldest', ['CLM-3', 'CLM-4']),
+    ('block', ['CLM-0', 'CLM-1'])
+])
+def test_overflow_policy_of_a_full_queue(tmp_path, overflow, kept):
+    path = str(tmp_path / 'audit.db')
+    # Writer not started yet, so the queue fills up ('block' cannot wait for it)
+    log = AuditLog(path, max_queue=2, overflow=overflow, block_timeout=0.01)
+    assert not log.record_many([entry(f'CLM-{i}') for i in range(5)])
+    assert log.stats()['records_dropped'] == 3
+
+    log.start()
+    log.close()
+    assert [record['claim_id'] for record in query(path)] == kept
+
+
+def test_block_waits_once_per_batch(tmp_path):
+    # The writer waits for 10 records, so a queue of 2 stays full
+    log = AuditLog(str(tmp_path / 'audit.db'), max_queue=2, batch_size=10, flush_interval=60,
+                   block_timeout=0.2)
+    log.start()
+    started = time.monotonic()
+    assert not log.record_many([entry(f'CLM-{i}') for i in range(5)])
+    elapsed = time.monotonic() - started
+
+    assert log.stats()['records_dropped'] == 3
+    # One block_timeout for the batch, not one per dropped record
+    assert 0.2 <= elapsed < 0.4
+    log.close()
@@ -0,0 +1,93 @@
+"""
+Tests for offline bulk scoring
+
+Run: python -m pytest test_bulk_score.py
+"""
+
+import json
+
+import pandas as pd
+import pytest
+
+import bulk_score
+import ml_service
+from provider_store import ProviderFeatureStore
+
+
+@pytest.fixture
+def claims_csv(tmp_path):
+    """40 dataset claims, some with empty optional fields and two invalid ones"""
+    df = pd.read_csv('claims_fraud_dataset.csv', nrows=40, dtype=str, keep_default_na=False)
+    df.loc[1, 'los_days'] = ''
+    df.loc[2, 'patient_age'] = ''
+    df.loc[3, ['num_procedures', 'provider_claims_count']] = ''
+    df.loc[4, 'tarif_rs'] = ''
+    df.loc[5, 'los_days'] = 'three'
+    path = tmp_path / 'claims.csv'
+    df.to_csv(path, index=False)
+    return str(path)
+
+
+def read_scores(path):
+    return pd.read_csv(path, dtype={'claim_id': str}, keep_default_na=False)
+
+
+def test_scores_match_predict_batch(claims_csv, tmp_path, monkeypatch):
+    output = str(tmp_path / 'scores.csv')
+    bulk_score.bulk_score([claims_csv], output, chunksize=8, workers=1, top_k=3)
+    scores = read_scores(output)
+
+    # The endpoint with the same claims (empty cells not sent) and the same rolling history
+    monkeypatch.setattr(ml_service, 'provider_store', ProviderFeatureStore())
+    df = pd.read_csv(claims_csv, dtype=str, keep_default_na=False)
+    rolling = bulk_score.rolling_history([claims_csv], 8)
+    claims = [
+        {**{field: value for field, value in claim.items() if value != ''},
+         **{field: float(values[i]) for field, values in rolling.items()}}
+        for i, claim in enumerate(df.to_dict('records'))
+    ]
+    response = ml_service.app.test_client().post('/predict_batch?top_k=3', json={'claims': claims})
+    results = response.get_json()['results']
+
+    assert scores['claim_id'].tolist() == df['claim_id'].tolist()
+    assert scores['success'].tolist() == [result['success'] for result in results]
+    assert scores['success'].sum() == 38
+    assert scores.loc[4, 'error'] == 'Missing required field: tarif_rs'
+    assert scores.loc[5, 'error'] == 'Invalid numeric field: los_days'
+    for row, result in zip(scores.itertuples(), results):
+        if result['success']:
+            assert float(row.fraud_probability) == result['prediction']['fraud_probability']
+            assert row.risk_level == result['prediction']['risk_level']
+            assert row.top_risk_factors == bulk_score.format_factors(result['prediction'])
+
+
+def test_interrupted_run_resumes_to_the_same_output(claims_csv, tmp_path, monkeypatch):
+    complete = str(tmp_path / 'complete.csv')
+    bulk_score.bulk_score([claims_csv], complete, chunksize=8, workers=1)
+
+    output = str(tmp_path / 'scores.csv')
+    columnar_features = bulk_score.columnar_features
+    stop_at = pd.read_csv(claims_csv, usecols=['claim_id'])['claim_id'][24]
+
+    def failing_features(columns):
+        if stop_at in columns['claim_id'].tolist():
+            raise RuntimeError('worker died')
+        return columnar_features(columns)
+
+    # Forked workers inherit the patched module
+    monkeypatch.setattr(bulk_score, 'columnar_features', failing_features)
+    with pytest.raises(RuntimeError):
+        bulk_score.bulk_score([claims_csv], output, chunksize=8, workers=1)
+    with open(output + bulk_score.CHECKPOINT_SUFFIX) as f:
+        checkpoint = json.load(f)
+    assert (checkpoint['chunks_done'], checkpoint['rows_done'], checkpoint['completed']) == (3, 24, False)
+
+    # Bytes written after the last checkpoint are dropped on resume
+    with open(output, 'ab') as f:
+        f.write(b'CLM-partial,True,0.5')
+    monkeypatch.setattr(bulk_score, 'columnar_features', columnar_features)
+    state = bulk_score.bulk_score([claims_csv], output, chunksize=8, workers=1, resume=True)
+
+    assert state['completed'] and state['rows_done'] == 40
+    with open(output, 'rb') as resumed, open(complete, 'rb') as expected:
+        assert resumed.read() == expected.read()
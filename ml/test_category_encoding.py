@@ -0,0 +1,38 @@
+"""
+Tests for the precomputed categorical lookup tables
+
+Run: python -m pytest test_category_encoding.py
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from category_encoding import CategoryTable
+
+
+def test_encode_many_matches_encode_for_any_column_dtype():
+    table = CategoryTable(np.array(['1', '2', 'A09', 'RS001'], dtype=object))
+    columns = [
+        [1, 2.0, ' A09 ', 'RS001', 'RS009', None, np.nan, 2.5, '2.0', np.int64(2)],
+        np.array([1.0, 2.0, np.nan, 2.5, np.inf]),
+        np.array([1, 2, 5]),
+        pd.Series(['RS001', ' 2', 'X'], dtype='string'),
+        pd.Categorical(['A09', 'X'])
+    ]
+
+    for values in columns:
+        codes, known = table.encode_many(values)
+        assert list(zip(codes.tolist(), known.tolist())) == [table.encode(value) for value in values]
+
+
+def test_classes_that_normalize_alike_are_reported(capsys):
+    classes = ['RS001', 'RS001 ', 'RS002']
+    with pytest.raises(ValueError, match='RS001'):
+        CategoryTable(classes, strict=True)
+
+    # Serving still loads the table, and says which classes collide
+    table = CategoryTable(classes)
+    assert table.collisions == {'RS001': ['RS001', 'RS001 ']}
+    assert 'RS001' in capsys.readouterr().out
+    assert table.encode('RS001') == (1, True)
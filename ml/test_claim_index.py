@@ -0,0 +1,137 @@
+"""
+Tests for the duplicate and overlapping-stay index
+
+Run: python -m pytest test_claim_index.py
+"""
+
+import multiprocessing
+
+import pandas as pd
+
+from claim_index import ClaimIndex, claim_signature, claim_signatures
+
+CLAIM = {
+    'claim_id': 'CLM-1', 'patient_id': 'P-001', 'hospital_code': 'RS001',
+    'doctor_id': 'DR001', 'icd10_code': 'J18.9', 'patient_gender': 'L',
+    'patient_age': 45, 'admission_date': '2025-03-01', 'discharge_date': '2025-03-05',
+    'tarif_rs': 5234000, 'tarif_inacbg': 4850000
+}
+
+
+def test_resubmitted_claim_is_a_duplicate_but_rescoring_is_not():
+    index = ClaimIndex()
+    assert not index.check(CLAIM)['is_duplicate']
+
+    # Same claim_id scored again (retry, cache miss) is not its own duplicate
+    assert not index.check(CLAIM)['is_duplicate']
+
+    result = index.check(dict(CLAIM, claim_id='CLM-2', tarif_rs=6000000))
+    assert result['is_duplicate']
+    assert result['duplicate_of'] == ['CLM-1']
+    assert index.stats()['duplicates_flagged'] == 1
+
+
+def test_anonymous_resubmission_with_a_changed_tariff_is_a_duplicate():
+    index = ClaimIndex()
+    anonymous = dict(CLAIM)
+    del anonymous['patient_id']
+    index.check(anonymous)
+
+    result = index.check(dict(anonymous, claim_id='CLM-2', tarif_rs=6000000, tarif_inacbg=5000000))
+    assert result['duplicate_of'] == ['CLM-1']
+    assert not index.check(dict(anonymous, claim_id='CLM-3', discharge_date='2025-03-06'))['is_duplicate']
+
+
+def test_overlapping_stays_across_hospitals():
+    index = ClaimIndex()
+    index.check(CLAIM)
+
+    overlap = index.check(dict(CLAIM, claim_id='CLM-2', hospital_code='RS002',
+                               admission_date='2025-03-04', discharge_date='2025-03-08'))
+    assert overlap['has_overlapping_stay'] and not overlap['is_duplicate']
+    assert overlap['overlapping_stays'] == [{
+        'claim_id': 'CLM-1', 'hospital_code': 'RS001', 'admission_date': '2025-03-01',
+        'discharge_date': '2025-03-05', 'same_hospital': False
+    }]
+
+    # Transfer: admitted on the day the previous stay was discharged
+    transfer = index.check(dict(CLAIM, claim_id='CLM-3', hospital_code='RS003',
+                                admission_date='2025-03-08', discharge_date='2025-03-08'))
+    assert not transfer['has_overlapping_stay']
+
+    # A same-day stay inside another stay overlaps it
+    day_care = index.check(dict(CLAIM, claim_id='CLM-4', icd10_code='K35.8',
+                                admission_date='2025-03-02', discharge_date='2025-03-02'))
+    assert [s['claim_id'] for s in day_care['overlapping_stays']] == ['CLM-1']
+
+    # Without a patient ID there is nothing to compare stays with
+    anonymous = dict(CLAIM, claim_id='CLM-5')
+    del anonymous['patient_id']
+    assert not index.check(anonymous)['has_overlapping_stay']
+
+
+def test_oldest_claims_are_evicted():
+    index = ClaimIndex(max_claims=2)
+    for day in (1, 2, 3):
+        index.check(dict(CLAIM, claim_id=f'CLM-{day}', admission_date=f'2025-03-0{day}',
+                         discharge_date=f'2025-03-0{day + 1}'))
+
+    assert index.stats()['indexed_claims'] == 2
+    assert not index.check(dict(CLAIM, claim_id='CLM-9', admission_date='2025-03-01',
+                                discharge_date='2025-03-02'))['has_overlapping_stay']
+
+
+def test_history_signatures_match_scored_claims():
+    df = pd.read_csv('claims_fraud_dataset.csv')
+    claims = df.head(200).astype(object).where(df.head(200).notna(), None).to_dict('records')
+    assert claim_signatures(df.head(200)) == [claim_signature(claim) for claim in claims]
+
+    index = ClaimIndex()
+    assert index.load_history(df) == len(df)
+    result = index.check(dict(claims[0], claim_id='RESUBMITTED'))
+    assert result['duplicate_of'] == [claims[0]['claim_id']]
+
+    # The dataset carries patient IDs, so stays are checked against the history
+    stay = dict(claims[0], claim_id='TRANSFERRED', hospital_code='RS999')
+    result = index.check(stay)
+    assert not result['is_duplicate']
+    assert claims[0]['claim_id'] in [s['claim_id'] for s in result['overlapping_stays']]
+
+
+def _worker(index, role, barrier, results):
+    """One pre-fork worker: the first indexes CLAIM, the second sees it once they exchanged"""
+    index.start_sync(0.05)
+    if role == 0:
+        index.check(CLAIM)
+        index.stop_sync()
+    barrier.wait()
+    if role == 1:
+        index.sync()
+        results.put([
+            index.check(dict(CLAIM, claim_id='CLM-2')),
+            index.check(dict(CLAIM, claim_id='CLM-3', icd10_code='K35.8', hospital_code='RS002',
+                             admission_date='2025-03-04', discharge_date='2025-03-08'))
+        ])
+        index.stop_sync()
+
+
+def test_forked_workers_see_each_others_claims(tmp_path):
+    index = ClaimIndex()
+    index.share(str(tmp_path / 'claim_index.db'))
+
+    context = multiprocessing.get_context('fork')
+    barrier, results = context.Barrier(2), context.Queue()
+    workers = [context.Process(target=_worker, args=(index, role, barrier, results)) for role in range(2)]
+    for worker in workers:
+        worker.start()
+    resubmitted, overlap = results.get(timeout=60)
+    for worker in workers:
+        worker.join(timeout=60)
+        assert worker.exitcode == 0
+
+    assert resubmitted['duplicate_of'] == ['CLM-1']
+    assert [stay['claim_id'] for stay in overlap['overlapping_stays']] == ['CLM-2', 'CLM-1']
+
+    # The parent catches up from the same log, so later workers start with all three
+    index.sync()
+    assert index.stats()['indexed_claims'] == 3
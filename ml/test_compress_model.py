@@ -0,0 +1,68 @@
+"""
+Tests for the forest compression transforms
+
+Run: python -m pytest test_compress_model.py
+"""
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+from compress_model import (
+    BUNDLE_PATH, auc_columns, compress, load_model, prune_depth, quantize, select_trees, training_split,
+    tree_scores
+)
+from forest_engine import CompiledForest
+from test_forest_engine import load_dataset
+
+
+def small_forest():
+    X, y = load_dataset()
+    model = RandomForestClassifier(n_estimators=12, max_depth=8, random_state=0).fit(X, y)
+    return CompiledForest.from_sklearn(model), X, y
+
+
+def test_lossless_transforms_keep_predictions():
+    """Pruning at full depth, keeping every tree and float32 thresholds change nothing"""
+    forest, X, _ = small_forest()
+    expected = forest.predict_proba(X)
+
+    unchanged = select_trees(prune_depth(forest, forest.max_depth), np.arange(forest.n_trees))
+    narrowed = quantize(forest, value_dtype=np.float64)
+
+    assert unchanged.n_nodes == forest.n_nodes
+    assert np.array_equal(unchanged.predict_proba(X), expected)
+    assert narrowed.threshold.dtype == np.float32
+    assert np.array_equal(narrowed.predict_proba(X), expected)
+
+
+def test_pruned_subset_matches_its_trees():
+    forest, X, _ = small_forest()
+    trees = [1, 4, 7]
+
+    pruned = select_trees(prune_depth(forest, 3), trees)
+    per_tree = tree_scores(prune_depth(forest, 3), X)
+
+    assert pruned.n_trees == 3 and pruned.max_depth <= 3
+    assert np.allclose(pruned.predict(X)[0], per_tree[:, trees].mean(axis=1))
+
+
+def test_auc_columns_matches_sklearn():
+    from sklearn.metrics import roc_auc_score
+
+    forest, X, y = small_forest()
+    per_tree = tree_scores(forest, X)
+
+    expected = [roc_auc_score(y, per_tree[:, i]) for i in range(forest.n_trees)]
+    assert np.allclose(auc_columns(per_tree, y), expected)
+
+
+def test_compress_the_served_model():
+    """The held-out split carries every model feature, rolling history included"""
+    model = load_model(BUNDLE_PATH)
+    X_train, X_test, _, _ = training_split(['claims_fraud_dataset.csv'], model)
+    assert X_train.shape[1] == X_test.shape[1] == len(model.feature_names)
+
+    compressed, report = compress(model, ['claims_fraud_dataset.csv'], max_auc_loss=0.01)
+    assert report['auc_loss'] <= 0.01
+    assert compressed.n_nodes <= model.forest.n_nodes
+    assert compressed.predict(X_test)[0].shape == (len(X_test),)
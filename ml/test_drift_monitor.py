@@ -0,0 +1,69 @@
+"""
+Tests for streaming drift monitoring
+
+Run: python -m pytest test_drift_monitor.py
+"""
+
+import numpy as np
+
+from drift_monitor import DriftBaseline, DriftMonitor
+
+FEATURES = ['tarif_rs', 'los_days', 'hospital_code_encoded']
+
+
+def training_matrix(rows, rng, tariff_scale=1.0):
+    return np.column_stack([
+        rng.lognormal(15, 0.5, rows) * tariff_scale,
+        rng.integers(1, 10, rows),
+        rng.integers(0, 4, rows)
+    ])
+
+
+def fitted_baseline(rng):
+    X = training_matrix(5000, rng)
+    baseline = DriftBaseline.build(X, FEATURES, rng.uniform(0, 1, 5000), {'hospital_code_encoded': 4})
+    return DriftBaseline.from_dict(baseline.to_dict())
+
+
+def test_shifted_traffic_is_flagged():
+    rng = np.random.default_rng(0)
+    baseline = fitted_baseline(rng)
+    assert baseline.kinds == ['numeric', 'numeric', 'categorical']
+
+    stable = DriftMonitor(baseline)
+    stable.observe_many(training_matrix(2000, rng), rng.uniform(0, 1, 2000))
+    report = stable.report()
+    assert report['drifted_features'] == 0
+    assert all(f['status'] == 'stable' for f in report['features'])
+
+    shifted = DriftMonitor(baseline)
+    shifted.observe_many(training_matrix(2000, rng, tariff_scale=1.5), rng.uniform(0, 1, 2000))
+    report = shifted.report(category_names={'hospital_code_encoded': ['RS001', 'RS002', 'RS003', 'RS004']})
+    assert report['features'][0]['feature'] == 'tarif_rs'
+    assert report['features'][0]['status'] == 'significant'
+    assert report['drifted_features'] == 1
+    hospital = next(f for f in report['features'] if f['feature'] == 'hospital_code_encoded')
+    assert hospital['top_shifts'][0]['category'].startswith('RS')
+
+
+def test_single_claims_match_batches_and_windows_rotate():
+    rng = np.random.default_rng(1)
+    baseline = fitted_baseline(rng)
+    X = training_matrix(300, rng)
+    probabilities = rng.uniform(0, 1, 300)
+
+    single, batch = DriftMonitor(baseline), DriftMonitor(baseline)
+    for features, probability in zip(X.tolist(), probabilities.tolist()):
+        single.observe(features, probability)
+    batch.observe_many(X, probabilities)
+    assert single.psi_by_feature() == batch.psi_by_feature()
+    assert single.report() == batch.report()
+
+    # Counts cover the current and the previous window only
+    windowed = DriftMonitor(baseline, window_claims=100)
+    for _ in range(4):
+        windowed.observe_many(X[:100], probabilities[:100])
+    assert windowed.report()['claims_observed'] == 200
+    windowed.reset()
+    assert windowed.report()['claims_observed'] == 0
+    assert windowed.psi_by_feature() == {}
@@ -0,0 +1,111 @@
+"""
+Parity tests for the scalar and columnar feature kernels
+
+Run: python -m pytest test_feature_spec.py
+"""
+
+import traceback
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from feature_spec import FEATURE_NAMES, KERNEL_FILENAME, Expr, columnar_features, scalar_features
+from train_fraud_model import (FEATURE_COLUMNS, engineer_features, load_training_matrix_chunked, select_features,
+                               split_rows)
+
+CATEGORIES = ['hospital', 'doctor', 'icd10', 'gender', 'care_class']
+
+EDGE_CASES = [
+    # Zero-day stay and zero INA-CBG tariff
+    {'tarif_rs': 5000000, 'tarif_inacbg': 0, 'los_days': 0, 'num_procedures': 2},
+    {'tarif_rs': 0, 'tarif_inacbg': 4000000, 'los_days': 0, 'num_procedures': 0},
+    # Optional fields missing entirely
+    {'tarif_rs': 7000000, 'tarif_inacbg': 5000000},
+    # Numbers sent as strings or floats, parsed like int()/float()
+    {'tarif_rs': '6500000.5', 'tarif_inacbg': '5000000', 'los_days': '7', 'num_procedures': 3.0,
+     'patient_age': 71.9, 'provider_claims_count': '12', 'provider_high_cost_rate': '0.4'},
+    # Negative tariff difference, exactly on the flag thresholds
+    {'tarif_rs': 6500000, 'tarif_inacbg': 5000000, 'los_days': 5, 'num_procedures': 0},
+    {'tarif_rs': 1000, 'tarif_inacbg': 3000, 'los_days': 6, 'num_procedures': 1, 'patient_age': 0},
+]
+
+
+def with_codes(claims):
+    return [dict(claim, **{f'{name}_encoded': i % 3 for name in CATEGORIES})
+            for i, claim in enumerate(claims)]
+
+
+def scalar_matrix(claims):
+    rows = [
+        scalar_features(claim, {name: claim[f'{name}_encoded'] for name in CATEGORIES})
+        for claim in claims
+    ]
+    return np.asarray(rows, dtype=np.float64)
+
+
+def test_spec_matches_training_feature_order():
+    assert FEATURE_COLUMNS == FEATURE_NAMES
+
+
+def test_scalar_and_columnar_kernels_agree_on_edge_cases():
+    claims = with_codes(EDGE_CASES)
+    # Columns are filled in where every claim has the field, like a CSV would be
+    columns = pd.DataFrame(claims)
+
+    for i, claim in enumerate(claims):
+        single = columnar_features(pd.DataFrame([claim]))
+        assert np.array_equal(single[0], scalar_matrix([claim])[0]), EDGE_CASES[i]
+
+    full = [c for c in claims if set(c) == set(columns.columns)]
+    assert np.array_equal(columnar_features(pd.DataFrame(full)), scalar_matrix(full))
+
+
+def test_kernel_errors_point_at_the_generated_source():
+    with pytest.raises(TypeError):
+        Expr()
+
+    with pytest.raises(ValueError) as error:
+        scalar_features({'tarif_rs': 'n/a', 'tarif_inacbg': 1}, {name: 0 for name in CATEGORIES})
+    frame = traceback.extract_tb(error.value.__traceback__)[-1]
+    assert frame.filename == KERNEL_FILENAME
+    assert frame.line == "tarif_rs = float(data['tarif_rs'])"
+
+
+def test_zero_day_stay_counts_as_one_day():
+    features = dict(zip(FEATURE_NAMES, scalar_matrix(with_codes(EDGE_CASES[:1]))[0]))
+
+    assert features['tariff_per_day'] == 5000000
+    assert features['procedure_intensity'] == 2
+    assert features['tariff_ratio'] == 1.0
+    assert np.isfinite(list(features.values())).all()
+
+
+def test_training_path_matches_serving_path():
+    """engineer_features + select_features give what prepare_features gives per claim"""
+    df, _, _ = engineer_features(pd.read_csv('claims_fraud_dataset.csv'))
+    X, _, _ = select_features(df)
+
+    claims = df.replace({np.nan: None}).to_dict('records')
+    assert np.array_equal(X.to_numpy(dtype=np.float64), scalar_matrix(claims))
+
+
+def test_chunked_training_matrix_matches_engineer_features():
+    """Streaming ingestion builds the matrix the in-memory path builds, at float32"""
+    df = pd.read_csv('claims_fraud_dataset.csv')
+    train_rows, test_rows = split_rows(df['is_fraud'])
+    df, _, peer_groups = engineer_features(df, train_rows)
+    X, y, _ = select_features(df)
+    X_chunked, y_chunked, _, chunked_peer_groups = load_training_matrix_chunked(
+        ['claims_fraud_dataset.csv'], chunksize=1000, holdout=True
+    )
+
+    assert np.array_equal(y_chunked, y.to_numpy())
+    # sklearn trees split float32 values, so this is what they see on either path
+    assert np.array_equal(X_chunked, X.to_numpy(dtype=np.float32))
+
+    # Held-out claims are not in the peer statistics, on either path
+    for table in (peer_groups, chunked_peer_groups):
+        assert table.stats[table.rows[()]][0] == len(train_rows)
+    assert np.array_equal(chunked_peer_groups.stats, peer_groups.stats)
+    assert np.array_equal(split_rows(y_chunked)[1], test_rows)
@@ -0,0 +1,143 @@
+"""
+Parity tests for the compiled forest evaluator
+(latency is compared in benchmark_engines.py)
+
+Run: python -m pytest test_forest_engine.py
+"""
+
+import pickle
+import numpy as np
+import pandas as pd
+import pytest
+import sklearn
+from sklearn.ensemble import HistGradientBoostingClassifier, RandomForestClassifier
+
+from forest_engine import CompiledBoosting, CompiledForest, compile_model
+from train_fraud_model import engineer_features, select_features
+
+
+def load_dataset():
+    df, _, _ = engineer_features(pd.read_csv('claims_fraud_dataset.csv'))
+    X, y, _ = select_features(df)
+    return X.to_numpy(dtype=np.float64), y.to_numpy()
+
+
+def load_trained_model():
+    with open('fraud_detection_model.pkl', 'rb') as f:
+        return pickle.load(f)
+
+
+def test_parity_with_trained_model():
+    """Compiled forest must reproduce sklearn bit for bit on the training data"""
+    X, _ = load_dataset()
+    model = load_trained_model()
+    forest = CompiledForest.from_sklearn(model)
+
+    probabilities, labels = forest.predict(X)
+
+    assert np.array_equal(forest.predict_proba(X), model.predict_proba(X))
+    assert np.array_equal(probabilities, model.predict_proba(X)[:, 1])
+    assert np.array_equal(labels, model.predict(X))
+
+
+def test_parity_single_row():
+    X, _ = load_dataset()
+    model = load_trained_model()
+    forest = CompiledForest.from_sklearn(model)
+
+    for row in X[:25]:
+        probability, label = forest.predict(row)
+        assert probability[0] == model.predict_proba([row])[0][1]
+        assert label[0] == model.predict([row])[0]
+
+
+def test_parity_with_fresh_forest_and_unseen_values():
+    """Parity also holds for a newly trained forest on perturbed inputs"""
+    X, y = load_dataset()
+    model = RandomForestClassifier(
+        n_estimators=25, max_depth=8, min_samples_leaf=3,
+        class_weight='balanced', random_state=0
+    ).fit(X, y)
+    forest = CompiledForest.from_sklearn(model)
+
+    rng = np.random.default_rng(0)
+    X_new = X * rng.normal(1.0, 0.2, size=X.shape)
+
+    assert np.array_equal(forest.predict_proba(X_new), model.predict_proba(X_new))
+
+
+def test_path_contributions_add_up_to_probability():
+    """Bias plus per-feature contributions reproduces the predicted probability"""
+    X, _ = load_dataset()
+    forest = CompiledForest.from_sklearn(load_trained_model())
+
+    bias, contributions = forest.contributions(X[:500])
+    probabilities, _ = forest.predict(X[:500])
+
+    assert contributions.shape == (500, X.shape[1])
+    assert np.allclose(bias + contributions.sum(axis=1), probabilities, atol=1e-9)
+
+    # A single row gives the same attributions as inside a batch
+    _, single = forest.contributions(X[7])
+    assert np.allclose(single[0], contributions[7])
+
+
+def test_sklearn_still_has_the_boosting_internals_we_read():
+    """CompiledBoosting reads private attributes, which sklearn may rename in any release"""
+    X, y = load_dataset()
+    model = HistGradientBoostingClassifier(max_iter=3, random_state=0).fit(X, y)
+    version = sklearn.__version__
+
+    assert hasattr(model, '_predictors'), \
+        f'scikit-learn {version} has no HistGradientBoostingClassifier._predictors; update forest_engine'
+    assert hasattr(model, '_baseline_prediction'), \
+        f'scikit-learn {version} has no HistGradientBoostingClassifier._baseline_prediction; update forest_engine'
+
+    fields = {'value', 'feature_idx', 'num_threshold', 'missing_go_to_left', 'left', 'right',
+              'depth', 'is_leaf', 'is_categorical'}
+    missing = fields - set(model._predictors[0][0].nodes.dtype.names)
+    assert not missing, f'scikit-learn {version} tree nodes lack {sorted(missing)}; update forest_engine'
+
+    # Without them compiling fails with the reason instead of an AttributeError
+    del model._baseline_prediction
+    with pytest.raises(ValueError, match='_baseline_prediction'):
+        CompiledBoosting.from_sklearn(model)
+
+
+@pytest.mark.parametrize('params', [
+    {'max_iter': 25},
+    {'max_iter': 60, 'learning_rate': 0.3, 'max_depth': 3, 'l2_regularization': 1.0},
+    {'max_iter': 200, 'max_leaf_nodes': 8, 'early_stopping': True, 'validation_fraction': 0.2}
+])
+def test_boosting_matches_predict_proba_on_unseen_claims(params):
+    """Parity on claims the model was not fitted on, in a batch and one at a time"""
+    X, y = load_dataset()
+    model = HistGradientBoostingClassifier(random_state=0, **params).fit(X[:700], y[:700])
+    booster = compile_model(model)
+    unseen = X[700:]
+
+    assert np.array_equal(booster.predict_proba(unseen), model.predict_proba(unseen))
+    for row in unseen[:20]:
+        probabilities, label = booster.predict(row)
+        assert probabilities[0] == model.predict_proba(row.reshape(1, -1))[0, 1]
+        assert label[0] == model.predict(row.reshape(1, -1))[0]
+
+
+def test_boosting_parity_and_contributions():
+    """HistGradientBoosting compiles to the same probabilities, missing values included"""
+    X, y = load_dataset()
+    X = X.copy()
+    X[::9, 3] = np.nan
+    model = HistGradientBoostingClassifier(max_iter=40, class_weight='balanced', random_state=0).fit(X, y)
+    booster = compile_model(model)
+
+    assert isinstance(booster, CompiledBoosting)
+    assert np.array_equal(booster.predict_proba(X), model.predict_proba(X))
+    assert np.array_equal(booster.predict(X)[1], model.predict(X))
+
+    rebuilt = CompiledBoosting.from_arrays(booster.to_arrays(), booster.classes, booster.max_depth,
+                                           **booster.engine_params())
+    assert np.array_equal(rebuilt.predict_proba(X), model.predict_proba(X))
+
+    bias, contributions = booster.contributions(X[:200])
+    assert np.allclose(bias + contributions.sum(axis=1), booster.predict(X[:200])[0], atol=1e-9)
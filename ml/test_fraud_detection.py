@@ -11,6 +11,7 @@ test_claims = [
         "name": "Normal Claim - Low Risk",
         "data": {
             "claim_id": "TEST-001",
+            "patient_id": "P0000001",
             "hospital_code": "RS001",
             "doctor_id": "DR001",
             "patient_age": 45,
@@ -20,6 +21,8 @@ test_claims = [
             "num_procedures": 2,
             "care_class": "2",
             "los_days": 3,
+            "admission_date": "2025-03-01",
+            "discharge_date": "2025-03-04",
             "tarif_inacbg": 4850000,
             "tarif_rs": 5000000  # Small difference (3%)
         },
@@ -29,6 +32,7 @@ test_claims = [
         "name": "Overcharging - High Risk",
         "data": {
             "claim_id": "TEST-002",
+            "patient_id": "P0000002",
             "hospital_code": "RS002",
             "doctor_id": "DR005",
             "patient_age": 35,
@@ -38,6 +42,8 @@ test_claims = [
             "num_procedures": 1,
             "care_class": "3",
             "los_days": 2,
+            "admission_date": "2025-03-02",
+            "discharge_date": "2025-03-04",
             "tarif_inacbg": 3200000,
             "tarif_rs": 5000000  # 56% overcharge!
         },
@@ -47,6 +53,7 @@ test_claims = [
         "name": "Excessive Procedures - Medium/High Risk",
         "data": {
             "claim_id": "TEST-003",
+            "patient_id": "P0000003",
             "hospital_code": "RS003",
             "doctor_id": "DR010",
             "patient_age": 28,
@@ -56,6 +63,8 @@ test_claims = [
             "num_procedures": 4,  # Too many for simple case
             "care_class": "3",
             "los_days": 2,
+            "admission_date": "2025-03-03",
+            "discharge_date": "2025-03-05",
             "tarif_inacbg": 1800000,
             "tarif_rs": 3500000  # 94% higher
         },
@@ -65,6 +74,7 @@ test_claims = [
         "name": "Extended Stay - Medium Risk",
         "data": {
             "claim_id": "TEST-004",
+            "patient_id": "P0000004",
             "hospital_code": "RS004",
             "doctor_id": "DR015",
             "patient_age": 60,
@@ -74,6 +84,8 @@ test_claims = [
             "num_procedures": 1,
             "care_class": "2",
             "los_days": 8,  # Too long for bronchitis
+            "admission_date": "2025-03-04",
+            "discharge_date": "2025-03-12",
             "tarif_inacbg": 2100000,
             "tarif_rs": 3000000  # 43% higher
         },
@@ -0,0 +1,67 @@
+"""
+Tests for the vectorized, sharded claims generator
+
+Run: python -m pytest test_generate_fraud_data.py
+"""
+
+import numpy as np
+import pandas as pd
+
+from generate_fraud_data import _draw_chunk, generate_claims_data_vectorized, generate_sharded_dataset
+
+REFERENCE_DATE = '2025-06-30'
+ROWS = 600
+
+
+def read_bytes(paths):
+    contents = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            contents.append(f.read())
+    return contents
+
+
+def generate(output_dir, shards, workers, seed=42):
+    return generate_sharded_dataset(ROWS, num_shards=shards, workers=workers, seed=seed,
+                                    output_dir=str(output_dir), reference_date=REFERENCE_DATE,
+                                    chunk_size=70)
+
+
+def test_chunk_draws_depend_only_on_seed_shard_and_chunk():
+    first, again = _draw_chunk(42, 1, 2, 50), _draw_chunk(42, 1, 2, 50)
+    assert first.keys() == again.keys()
+    for name in first:
+        assert np.array_equal(first[name], again[name]), name
+
+    assert not np.array_equal(_draw_chunk(42, 2, 2, 50)['tarif_rs'], first['tarif_rs'])
+    assert not np.array_equal(_draw_chunk(43, 1, 2, 50)['tarif_rs'], first['tarif_rs'])
+
+
+def test_same_settings_give_the_same_files_with_any_number_of_workers(tmp_path):
+    single = read_bytes(generate(tmp_path / 'single', shards=3, workers=1))
+    assert read_bytes(generate(tmp_path / 'again', shards=3, workers=1)) == single
+    assert read_bytes(generate(tmp_path / 'parallel', shards=3, workers=2)) == single
+    assert read_bytes(generate(tmp_path / 'other_seed', shards=3, workers=1, seed=7)) != single
+
+
+def test_one_shard_matches_the_in_memory_generator(tmp_path):
+    [path] = generate(tmp_path, shards=1, workers=1)
+    expected = generate_claims_data_vectorized(ROWS, reference_date=REFERENCE_DATE, chunk_size=70)
+    assert read_bytes([path]) == [expected.to_csv(index=False).encode()]
+
+
+def test_sharded_output_has_the_dataset_schema_and_single_stream_provider_totals(tmp_path):
+    paths = generate(tmp_path, shards=3, workers=2)
+    df = pd.concat([pd.read_csv(path) for path in paths], ignore_index=True)
+
+    dataset = pd.read_csv('claims_fraud_dataset.csv')
+    assert df.columns.tolist() == dataset.columns.tolist()
+    assert df.dtypes.to_dict() == dataset.dtypes.to_dict()
+    assert len(df) == ROWS and df['claim_id'].is_unique
+
+    # Running provider statistics continue across shard boundaries
+    by_doctor = df.groupby('doctor_id', sort=False)
+    assert np.array_equal(df['provider_claims_count'], by_doctor.cumcount() + 1)
+    high_cost = (df['tarif_rs'] / df['tarif_inacbg'] > 1.2).astype(int)
+    rate = high_cost.groupby(df['doctor_id']).cumsum() / df['provider_claims_count']
+    assert np.allclose(df['provider_high_cost_rate'], rate.round(4))
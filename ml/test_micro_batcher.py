@@ -0,0 +1,76 @@
+"""
+Tests for the /predict micro-batcher
+
+Run: python -m pytest test_micro_batcher.py
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from micro_batcher import MicroBatcher
+
+
+def row_sum_predict(X):
+    """Stand-in for CompiledForest.predict: probability = row sum"""
+    return X.sum(axis=1), (X.sum(axis=1) > 1).astype(int)
+
+
+def test_concurrent_callers_get_their_own_results():
+    batcher = MicroBatcher(row_sum_predict, max_batch_size=8, max_wait_ms=20)
+    batcher.start()
+    try:
+        rows = [[i, 0.5] for i in range(50)]
+        with ThreadPoolExecutor(16) as pool:
+            results = list(pool.map(batcher.predict, rows))
+    finally:
+        batcher.stop()
+
+    assert [proba for proba, _ in results] == [i + 0.5 for i in range(50)]
+    stats = batcher.stats()
+    assert stats['claims'] == 50
+    assert stats['batches'] < 50
+    assert stats['max_batch_size_seen'] <= 8
+
+
+def test_errors_reach_every_caller_in_the_batch():
+    def failing_predict(X):
+        raise ValueError('model exploded')
+
+    batcher = MicroBatcher(failing_predict, max_batch_size=4, max_wait_ms=5)
+    batcher.start()
+    errors = []
+
+    def call():
+        try:
+            batcher.predict([1.0, 2.0])
+        except ValueError as e:
+            errors.append(str(e))
+
+    try:
+        threads = [threading.Thread(target=call) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        batcher.stop()
+
+    assert errors == ['model exploded'] * 4
+    assert batcher.stats()['queue_depth'] == 0
+
+
+def test_lone_request_does_not_wait_for_a_batch():
+    batcher = MicroBatcher(row_sum_predict, max_batch_size=8, max_wait_ms=500)
+    batcher.start()
+    try:
+        started = time.perf_counter()
+        for i in range(5):
+            assert batcher.predict([i, 0.5])[0] == i + 0.5
+        elapsed = time.perf_counter() - started
+    finally:
+        batcher.stop()
+
+    # Five sequential calls, each well under max_wait
+    assert elapsed < 0.5
+    assert batcher.stats()['batches'] == 5
@@ -0,0 +1,221 @@
+"""
+Tests for the Flask endpoints, in process through app.test_client()
+
+Run: python -m pytest test_ml_service.py
+"""
+
+import copy
+import re
+import threading
+
+import pytest
+
+import ml_service
+from claim_index import ClaimIndex
+from prediction_cache import PredictionCache
+from provider_store import ProviderFeatureStore
+
+CLAIM = {
+    'claim_id': 'TEST-001', 'hospital_code': 'RS001', 'doctor_id': 'DR001',
+    'patient_age': 45, 'patient_gender': 'L', 'icd10_code': 'J18.9',
+    'num_procedures': 2, 'care_class': '2', 'los_days': 3,
+    'tarif_inacbg': 4850000, 'tarif_rs': 5234000, 'submitted_date': '2025-03-10'
+}
+
+
+@pytest.fixture(scope='module')
+def client():
+    assert ml_service.load_model_artifacts()
+    return ml_service.app.test_client()
+
+
+def fresh_state(monkeypatch):
+    """Empty provider history, claim index and cache for the served model"""
+    monkeypatch.setattr(ml_service, 'provider_store', ProviderFeatureStore())
+    monkeypatch.setattr(ml_service, 'claim_index', ClaimIndex())
+    monkeypatch.setattr(ml_service, 'prediction_cache', PredictionCache())
+
+
+@pytest.fixture(autouse=True)
+def isolated(monkeypatch):
+    fresh_state(monkeypatch)
+
+
+def test_batch_keeps_order_reports_bad_items_and_matches_predict(client, monkeypatch):
+    claims = [
+        CLAIM,
+        dict(CLAIM, claim_id='TEST-002', icd10_code=['x']),
+        {'claim_id': 'TEST-003'},
+        dict(CLAIM, claim_id='TEST-004', tarif_rs=9800000, hospital_code='RS002'),
+        dict(CLAIM, claim_id='TEST-005', los_days='three')
+    ]
+    response = client.post('/predict_batch', json={'claims': claims})
+    assert response.status_code == 200
+    body = response.get_json()
+
+    assert [r['index'] for r in body['results']] == list(range(len(claims)))
+    assert [r['success'] for r in body['results']] == [True, False, False, True, False]
+    assert body['results'][1]['error'] == 'Invalid categorical field: icd10_code'
+    assert body['results'][2]['error'].startswith('Missing required field')
+
+    # Same claims one by one from the same (empty) history score the same
+    fresh_state(monkeypatch)
+    for result, claim in zip(body['results'], claims):
+        if result['success']:
+            single = client.post('/predict', json=claim).get_json()
+            assert single['prediction'] == result['prediction']
+            assert single['duplicate_check'] == result['duplicate_check']
+
+
+def test_rescored_claim_is_served_from_the_cache_before_provider_history(client, monkeypatch):
+    reads = []
+    with_provider_history = ml_service.with_provider_history
+    monkeypatch.setattr(ml_service, 'with_provider_history',
+                        lambda data: reads.append(data['claim_id']) or with_provider_history(data))
+
+    first = client.post('/predict', json=CLAIM).get_json()
+    tracked = ml_service.provider_store.stats()['tracked_claims']
+    again = client.post('/predict', json=CLAIM).get_json()
+
+    assert ml_service.prediction_cache.stats()['hits'] == 1
+    assert again['prediction'] == first['prediction']
+    # The hit never reads (or counts into) the provider history
+    assert reads == ['TEST-001']
+    assert ml_service.provider_store.stats()['tracked_claims'] == tracked
+
+    # Another response option is another entry
+    client.post('/predict?top_k=1', json=CLAIM)
+    assert ml_service.prediction_cache.stats()['hits'] == 1
+    assert reads == ['TEST-001', 'TEST-001']
+
+
+SAMPLE = re.compile(r'^([a-z_][a-z0-9_]*)(\{([a-z_]+="[^"]*"(,[a-z_]+="[^"]*")*)?\})? (\S+)$')
+
+
+def scrape(client):
+    """{(metric, labels): value} from /metrics, checking the exposition format on the way"""
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+
+    samples = {}
+    types = {}
+    for line in response.get_data(as_text=True).splitlines():
+        if line.startswith('# TYPE '):
+            _, _, metric, kind = line.split()
+            assert kind in ('counter', 'gauge', 'histogram') and metric not in types
+            types[metric] = kind
+            continue
+        if line.startswith('# HELP '):
+            continue
+        match = SAMPLE.match(line)
+        assert match, line
+        name, labels, value = match.group(1), match.group(3) or '', float(match.group(5))
+        family = re.sub(r'_(bucket|sum|count)$', '', name) if name not in types else name
+        assert family in types, f'{name} has no TYPE line before it'
+        samples[(name, labels)] = value
+    return samples
+
+
+def stage_counts(samples, endpoint):
+    prefix = f'endpoint="{endpoint}",stage="'
+    return {labels[len(prefix):-1]: value for (name, labels), value in samples.items()
+            if name == 'fraud_ml_stage_latency_ms_count' and labels.startswith(prefix)}
+
+
+def test_metrics_scrape_counts_predict_stages(client):
+    before = scrape(client)
+    assert client.post('/predict', json=CLAIM).status_code == 200
+    after = scrape(client)
+
+    assert after[('fraud_ml_model_loaded', '')] == 1
+    requests = ('fraud_ml_requests_total', 'endpoint="predict",status="200"')
+    assert after[requests] == before.get(requests, 0) + 1
+
+    # Every stage of a scored (uncached) claim is timed once
+    counts_before, counts_after = stage_counts(before, 'predict'), stage_counts(after, 'predict')
+    for stage in ('parse', 'validate', 'cache', 'provider_history', 'encode', 'features',
+                  'claim_index', 'forest', 'explain', 'serialize'):
+        assert counts_after[stage] == counts_before.get(stage, 0) + 1, stage
+
+    # Buckets are cumulative and end with +Inf == count
+    labels = 'endpoint="predict",stage="forest"'
+    buckets = [value for (name, bucket_labels), value in after.items()
+               if name == 'fraud_ml_stage_latency_ms_bucket' and bucket_labels.startswith(labels + ',')]
+    assert buckets == sorted(buckets)
+    assert after[('fraud_ml_stage_latency_ms_bucket', labels + ',le="+Inf"')] == counts_after['forest']
+
+
+def next_version(bundle, version):
+    """The same model under another version, as a reload would load it"""
+    bundle = copy.copy(bundle)
+    bundle.manifest = dict(bundle.manifest, model_version=version)
+    return bundle
+
+
+def drift_claims(bundle):
+    return bundle.drift_monitor.snapshot()[2]
+
+
+def test_reload_while_a_request_is_in_flight(client, monkeypatch):
+    old = ml_service.active_model
+    new = next_version(old, 'test-reloaded')
+    # Restored after the test, like the rest of the service state
+    monkeypatch.setattr(ml_service, 'active_model', old)
+    monkeypatch.setattr(ml_service, 'read_model_artifacts', lambda: new)
+
+    entered, release = threading.Event(), threading.Event()
+    with_provider_history = ml_service.with_provider_history
+
+    def blocking_history(data):
+        entered.set()
+        release.wait(10)
+        return with_provider_history(data)
+
+    monkeypatch.setattr(ml_service, 'with_provider_history', blocking_history)
+    responses = []
+    request = threading.Thread(target=lambda: responses.append(client.post('/predict', json=CLAIM).get_json()))
+    old_claims = drift_claims(old)
+    request.start()
+    assert entered.wait(10)
+
+    assert ml_service.reload_model('test')
+    assert ml_service.reload_status['state'] == 'succeeded'
+    assert ml_service.active_model is new
+    release.set()
+    request.join(10)
+
+    # The in-flight request finishes on, and is counted against, the model it started with
+    assert responses[0]['model_version'] == old.version
+    assert drift_claims(old) == old_claims + 1
+    assert drift_claims(new) == 0
+
+    # Installing cleared the cache; what the old model still cached is keyed by its version
+    assert ml_service.prediction_cache.stats()['invalidations'] == 1
+    response = client.post('/predict', json=CLAIM).get_json()
+    assert response['model_version'] == 'test-reloaded'
+    assert ml_service.prediction_cache.stats()['hits'] == 0
+    assert drift_claims(new) == 1
+    assert client.get('/drift').get_json()['model_version'] == 'test-reloaded'
+    health = client.get('/health').get_json()
+    assert health['model_version'] == 'test-reloaded' and 'version' not in health
+
+
+def test_rejected_reload_keeps_serving_the_old_model(client, monkeypatch):
+    old = ml_service.active_model
+    monkeypatch.setattr(ml_service, 'active_model', old)
+    rejected = next_version(old, 'test-rejected')
+    rejected.peer_groups = None
+    monkeypatch.setattr(ml_service, 'load_legacy_artifacts', lambda *paths: rejected)
+
+    client.post('/predict', json=CLAIM)
+    assert ml_service.reload_model('test')
+    assert ml_service.reload_status['state'] == 'failed'
+    assert 'peer-group' in ml_service.reload_status['error']
+    assert ml_service.active_model is old
+
+    # Still served, from the cache of the old model
+    hits = ml_service.prediction_cache.stats()['hits']
+    response = client.post('/predict', json=CLAIM).get_json()
+    assert response['model_version'] == old.version
+    assert ml_service.prediction_cache.stats()['hits'] == hits + 1
@@ -0,0 +1,51 @@
+"""
+Tests for publishing and loading model bundles
+
+Run: python -m pytest test_model_bundle.py
+"""
+
+import os
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+from category_encoding import CategoryTable
+from model_bundle import load_bundle, save_bundle
+
+FEATURES = ['tarif_rs', 'los_days', 'hospital_encoded']
+
+
+def small_model(seed):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(200, len(FEATURES)))
+    y = (X[:, 0] + rng.normal(size=200) > 0).astype(int)
+    return RandomForestClassifier(n_estimators=5, max_depth=4, random_state=seed).fit(X, y), X
+
+
+def test_publish_swaps_a_symlink_and_keeps_the_previous_version(tmp_path):
+    path = str(tmp_path / 'fraud_model_bundle')
+    encoders = {'hospital': CategoryTable(['RS001', 'RS002'])}
+
+    # A bundle directory from before the symlink layout is taken over
+    model, X = small_model(0)
+    first = save_bundle(model, encoders, FEATURES, f'{path}.plain')
+    os.rename(os.path.realpath(f'{path}.plain'), path)
+
+    model, X = small_model(1)
+    versions = [first['model_version'], save_bundle(model, encoders, FEATURES, path)['model_version']]
+    assert os.path.islink(path)
+
+    # A reader that resolved the path before a publish still loads its own version
+    reading = os.path.realpath(path)
+    model, X = small_model(2)
+    versions.append(save_bundle(model, encoders, FEATURES, path)['model_version'])
+    assert load_bundle(reading).version == versions[1]
+
+    bundle = load_bundle(path)
+    assert bundle.version == versions[2]
+    assert np.array_equal(bundle.forest.predict_proba(X), model.predict_proba(X))
+
+    # The current and the previous version stay on disk, older ones are removed
+    kept = sorted(entry for entry in os.listdir(tmp_path) if entry.startswith('fraud_model_bundle.2'))
+    assert kept == sorted(f'fraud_model_bundle.{version}' for version in versions[1:])
+    assert os.path.realpath(path) == str(tmp_path / f'fraud_model_bundle.{versions[-1]}')
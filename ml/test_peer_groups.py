@@ -0,0 +1,47 @@
+"""
+Tests for the peer-group statistics table
+
+Run: python -m pytest test_peer_groups.py
+"""
+
+import numpy as np
+import pandas as pd
+
+from peer_groups import PEER_FIELDS, PeerGroupTable
+
+
+def claims(icd10_code, care_class, hospital_code, tariffs, stays):
+    return pd.DataFrame({
+        'icd10_code': icd10_code, 'care_class': care_class, 'hospital_code': hospital_code,
+        'tarif_rs': tariffs, 'los_days': stays
+    })
+
+
+def test_small_groups_back_off_to_broader_peers():
+    df = pd.concat([
+        claims('J18.9', '2', 'RS001', np.linspace(4e6, 6e6, 12), [3] * 12),
+        claims('J18.9', '2', 'RS002', [9e6, 9e6], [8, 8]),
+        claims('I25.1', 2, 'RS001', np.linspace(14e6, 16e6, 10), [5] * 10)
+    ], ignore_index=True)
+    table = PeerGroupTable.fit(df, min_claims=10)
+
+    assert ('J18.9', '2', 'RS001') in table.rows
+    assert ('J18.9', '2', 'RS002') not in table.rows
+    # The two RS002 claims are compared with every J18.9 class-2 claim
+    peers = table.lookup({'icd10_code': 'J18.9', 'care_class': 2, 'hospital_code': 'RS002'})
+    assert peers['peer_tariff_median'] == np.median(df['tarif_rs'][:14])
+
+    # Unknown diagnosis: all claims
+    unknown = table.lookup({'icd10_code': 'Z99', 'care_class': '1', 'hospital_code': 'RS009'})
+    assert unknown['peer_los_median'] == np.median(df['los_days'])
+    assert unknown['peer_los_scale'] >= 1.0
+
+
+def test_column_lookup_matches_single_claims():
+    df = pd.read_csv('claims_fraud_dataset.csv')
+    table = PeerGroupTable.from_dict(PeerGroupTable.fit(df).to_dict())
+
+    columns = table.lookup_many(df.astype({'care_class': 'category'}))
+    singles = [table.lookup(claim) for claim in df.to_dict('records')]
+    for field in PEER_FIELDS:
+        assert np.array_equal(columns[field], [peers[field] for peers in singles])
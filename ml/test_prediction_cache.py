@@ -0,0 +1,58 @@
+"""
+Tests for the LRU + TTL prediction cache
+
+Run: python -m pytest test_prediction_cache.py
+"""
+
+import prediction_cache
+from prediction_cache import PredictionCache, claim_key
+
+CLAIM = {'claim_id': 'CLM-1', 'tarif_rs': 5234000, 'los_days': 3}
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = PredictionCache(max_entries=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    stats = cache.stats()
+    assert (stats['entries'], stats['evictions'], stats['hits'], stats['misses']) == (2, 1, 3, 1)
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(prediction_cache.time, 'monotonic', lambda: now[0])
+    cache = PredictionCache(ttl_seconds=10)
+    cache.put('a', 1)
+
+    now[0] += 9.9
+    assert cache.get('a') == 1
+    now[0] += 0.1
+    assert cache.get('a') is None
+    assert cache.stats()['expirations'] == 1
+    assert cache.stats()['entries'] == 0
+
+
+def test_key_covers_model_version_and_options_and_clear_drops_everything():
+    key = claim_key(CLAIM, 'v1', 5)
+    # Field order does not matter, the model version and response options do
+    assert claim_key(dict(reversed(list(CLAIM.items()))), 'v1', 5) == key
+    assert claim_key(CLAIM, 'v2', 5) != key
+    assert claim_key(CLAIM, 'v1', 0) != key
+
+    cache = PredictionCache()
+    cache.put(key, 1)
+    cache.clear()
+    assert cache.get(key) is None
+    assert cache.stats()['invalidations'] == 1
+
+
+def test_disabled_cache_stores_nothing():
+    cache = PredictionCache(max_entries=0)
+    cache.put('a', 1)
+    assert cache.get('a') is None
+    assert cache.stats()['entries'] == 0
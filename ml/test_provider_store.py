@@ -0,0 +1,138 @@
+"""
+Tests for the point-in-time rolling provider history
+
+Run: python -m pytest test_provider_store.py
+"""
+
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+from provider_store import HISTORY_FIELDS, ROLLING_FIELDS, ProviderFeatureStore, rolling_provider_columns
+
+
+def claims(doctor_id, submitted_date, tarif_rs, hospital_code='RS001'):
+    return pd.DataFrame({
+        'claim_id': [f'CLM-{doctor_id}-{i}' for i in range(len(submitted_date))],
+        'doctor_id': doctor_id, 'hospital_code': hospital_code,
+        'submitted_date': submitted_date, 'tarif_rs': tarif_rs, 'tarif_inacbg': 1000000
+    })
+
+
+def test_windows_only_count_earlier_days_in_any_row_order():
+    df = pd.concat([
+        claims('DR001', ['2025-03-31', '2025-03-01', '2025-01-15', '2025-03-31', '2025-04-30'],
+               [1500000, 1000000, 1500000, 1000000, 1000000]),
+        claims('DR002', ['2025-03-20', 'not a date'], [1500000, 1500000])
+    ], ignore_index=True)
+    rolling = pd.DataFrame(rolling_provider_columns(df), index=df['claim_id'])
+
+    # 2025-03-31: the 03-01 claim is within 30 days, 01-15 within 90; the
+    # other claim of the same day and the later one never count
+    first = rolling.loc['CLM-DR001-0']
+    assert (first['provider_claims_30d'], first['provider_high_cost_rate_30d']) == (1, 0.0)
+    assert (first['provider_claims_90d'], first['provider_high_cost_rate_90d']) == (2, 0.5)
+    # The running count is the 90-day window plus the claim itself
+    assert (first['provider_claims_count'], first['provider_high_cost_rate']) == (3, 2 / 3)
+    assert rolling.loc['CLM-DR001-1', 'provider_claims_count'] == 2
+    assert rolling.loc['CLM-DR001-2', 'provider_claims_90d'] == 0
+    # Hospital history includes the other doctor; undated claims count nowhere
+    assert rolling.loc['CLM-DR001-0', 'hospital_claims_30d'] == 2
+    assert (rolling.loc['CLM-DR002-1', list(ROLLING_FIELDS)] == 0).all()
+    assert rolling.loc['CLM-DR002-1', 'provider_claims_count'] == 1
+
+    shuffled = df.sample(frac=1, random_state=0)
+    again = pd.DataFrame(rolling_provider_columns(shuffled), index=shuffled['claim_id'])
+    assert again.loc[rolling.index].equals(rolling)
+
+
+def test_serving_store_matches_training_columns():
+    df = pd.read_csv('claims_fraud_dataset.csv')
+    rolling = rolling_provider_columns(df)
+
+    # Claims arrive by submission day, in any order within a day
+    order = df.assign(shuffle=np.random.default_rng(0).random(len(df))).sort_values(['submitted_date', 'shuffle'])
+    store = ProviderFeatureStore()
+    for i, claim in zip(order.index, order.to_dict('records')):
+        history = store.observe(claim['doctor_id'], claim['hospital_code'],
+                                claim['tarif_rs'] / claim['tarif_inacbg'], claim['claim_id'],
+                                claim['submitted_date'])
+        assert [history[field] for field in HISTORY_FIELDS] == [rolling[field][i] for field in HISTORY_FIELDS]
+
+
+def _worker(store, claims, barrier, results):
+    """One pre-fork worker: score its claims, exchange them, re-score every claim"""
+    store.start_sync(0.05)
+    for claim in claims[0]:
+        store.observe(*claim)
+    store.stop_sync()
+    barrier.wait()
+    store.sync()
+    results.put([store.observe(*claim) for claim in claims[1]])
+
+
+def test_forked_workers_see_each_others_history(tmp_path):
+    df = pd.read_csv('claims_fraud_dataset.csv').sort_values('submitted_date', kind='stable')
+    seed, scored = df.iloc[:500], df.iloc[500:1500]
+    claims = [(claim['doctor_id'], claim['hospital_code'], claim['tarif_rs'] / claim['tarif_inacbg'],
+               claim['claim_id'], claim['submitted_date']) for claim in scored.to_dict('records')]
+
+    expected = ProviderFeatureStore()
+    expected.seed_from_dataframe(seed)
+    for claim in claims:
+        expected.observe(*claim)
+    # Re-scoring the latest claims, nothing is counted again
+    rescored = claims[-50:]
+    wanted = [expected.observe(*claim) for claim in rescored]
+
+    shared = ProviderFeatureStore()
+    shared.seed_from_dataframe(seed)
+    shared.share(str(tmp_path / 'provider_history.db'))
+
+    # Every other claim per worker, and the first one scored by both
+    context = multiprocessing.get_context('fork')
+    barrier, results = context.Barrier(2), context.Queue()
+    workers = [
+        context.Process(target=_worker, args=(shared, (claims[i::2] + claims[:1], rescored), barrier, results))
+        for i in range(2)
+    ]
+    for worker in workers:
+        worker.start()
+    outcomes = [results.get(timeout=60) for _ in workers]
+    for worker in workers:
+        worker.join(timeout=60)
+        assert worker.exitcode == 0
+
+    assert outcomes == [wanted, wanted]
+
+    # The parent catches up from the same log before it writes a snapshot
+    shared.sync()
+    assert shared.doctors == expected.doctors and shared.hospitals == expected.hospitals
+    assert [shared.observe(*claim) for claim in rescored] == wanted
+
+
+def test_dateless_claim_is_dated_the_latest_recorded_day():
+    store = ProviderFeatureStore()
+    store.seed_from_dataframe(claims('DR001', ['2025-02-20', '2025-03-01', '2025-03-10'],
+                                     [1500000, 1000000, 1500000]))
+
+    dated = store.observe('DR001', 'RS001', 1.0, 'CLM-dated', '2025-03-10')
+    dateless = store.observe('DR001', 'RS001', 1.0, 'CLM-dateless')
+    # As of 2025-03-10, not today, where a history from March is out of every window
+    assert dated['provider_claims_30d'] == 2
+    assert [dateless[field] for field in HISTORY_FIELDS] == [dated[field] for field in HISTORY_FIELDS]
+
+
+def test_running_count_stays_bounded_in_a_long_running_service():
+    store = ProviderFeatureStore()
+    start = pd.Timestamp('2025-01-01')
+    counts = [
+        store.observe('DR001', 'RS001', 1.5, f'CLM-{day}-{i}',
+                      (start + pd.Timedelta(days=day)).strftime('%Y-%m-%d'))['provider_claims_count']
+        for day in range(400) for i in range(3)
+    ]
+
+    # Three claims a day: the 90 days before plus the claim itself, never the whole history
+    assert max(counts) == 3 * 90 + 1
+    assert counts[-1] == 3 * 90 + 1
@@ -0,0 +1,78 @@
+"""
+Tests for the evaluation and incremental training paths of train_fraud_model.py
+
+Run: python -m pytest test_train_fraud_model.py
+"""
+
+import pickle
+import numpy as np
+import pandas as pd
+from sklearn.metrics import roc_auc_score
+
+from model_bundle import load_legacy_artifacts
+from train_fraud_model import (
+    CATEGORICAL_COLUMNS, encode_with_encoders, engineer_features, extend_encoders, oob_roc_auc,
+    select_features, train_model, update_model_incrementally
+)
+
+
+def dataset_windows():
+    """The dataset split in two date-ordered windows, the later one with an unseen hospital"""
+    df = pd.read_csv('claims_fraud_dataset.csv').sort_values('submitted_date', kind='stable')
+    old, new = df.iloc[:600].reset_index(drop=True), df.iloc[600:].reset_index(drop=True)
+    new.loc[new.index[:40], 'hospital_code'] = 'RS999'
+    return old, new
+
+
+def test_oob_auc_skips_rows_without_oob_prediction():
+    df, _, _ = engineer_features(pd.read_csv('claims_fraud_dataset.csv'))
+    X, y, _ = select_features(df)
+    # So few trees that some rows are in-bag for all of them
+    model = train_model(X, y, params={'n_estimators': 3})
+    oob = model.oob_decision_function_
+    unscored = oob.sum(axis=1) == 0
+    assert unscored.any()
+
+    scored = ~unscored
+    assert oob_roc_auc(model, y) == roc_auc_score(y[scored], oob[scored, 1])
+    assert oob_roc_auc(model, y) != roc_auc_score(y, oob[:, 1])
+
+
+def test_incremental_update_grows_the_forest_and_keeps_old_codes(tmp_path):
+    old, new = dataset_windows()
+    old, encoders, peer_groups = engineer_features(old)
+    X_old, y_old, feature_names = select_features(old)
+    model = train_model(X_old, y_old, params={'n_estimators': 20})
+
+    tables, added = extend_encoders(encoders, new)
+    assert added['hospital'] == 1
+    for name, encoder in encoders.items():
+        # Existing codes keep their meaning, new categories come after them
+        codes, known = tables[name].encode_many(encoder.classes_)
+        assert known.all() and np.array_equal(codes, np.arange(len(encoder.classes_)))
+        assert np.array_equal(encoder.classes_, np.sort(encoder.classes_))
+    assert tables['hospital'].encode('RS999') == (len(encoders['hospital'].classes_), True)
+
+    new = encode_with_encoders(new, tables, peer_groups)
+    X_new, y_new, _ = select_features(new)
+    before = model.predict_proba(X_old)
+    old_trees = list(model.estimators_)
+
+    model = update_model_incrementally(model, X_new, y_new, new_trees=10)
+    assert len(model.estimators_) == 30 and model.trees_grown_ == 30
+    assert model.estimators_[:20] == old_trees
+    model = update_model_incrementally(model, X_new, y_new, new_trees=10, max_trees=25)
+    assert len(model.estimators_) == 25 and model.trees_grown_ == 40
+    assert not np.array_equal(model.predict_proba(X_old), before)
+
+    # Saved and reloaded the way serving loads it, the model scores the same
+    paths = {name: tmp_path / f'{name}.pkl' for name in ('model', 'encoders', 'features', 'peers')}
+    for name, value in zip(paths, (model, tables, feature_names, peer_groups)):
+        with open(paths[name], 'wb') as f:
+            pickle.dump(value, f)
+    bundle = load_legacy_artifacts(paths['model'], paths['encoders'], paths['features'], paths['peers'])
+
+    for name, column in CATEGORICAL_COLUMNS.items():
+        assert np.array_equal(bundle.encoders[name].encode_many(new[column])[0], new[f'{name}_encoded'])
+    X = X_new.to_numpy(dtype=np.float64)
+    assert np.array_equal(bundle.forest.predict_proba(X), model.predict_proba(X))
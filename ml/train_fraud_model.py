@@ -1,13 +1,25 @@
 """
-Train fraud detection model using Random Forest
+Train fraud detection model using Random Forest (or histogram gradient boosting)
 Features: tariff ratio, LOS, procedures, provider history, etc.
+
+Run: python train_fraud_model.py
+     python train_fraud_model.py --engine hist_gradient_boosting
+     python train_fraud_model.py --data generated_claims/*.csv --chunksize 500000
+     python train_fraud_model.py --incremental --data new_claims.csv --new-trees 50
 """
 
+import argparse
+import os
+import sys
+import time
+from contextlib import contextmanager
 import pandas as pd
+from pandas.api.types import union_categoricals
 import numpy as np
 import pickle
+import sklearn
 from sklearn.model_selection import train_test_split, cross_val_score
-from sklearn.ensemble import RandomForestClassifier
+from sklearn.ensemble import HistGradientBoostingClassifier, RandomForestClassifier
 from sklearn.preprocessing import LabelEncoder
 from sklearn.metrics import (
     classification_report,
@@ -19,9 +31,134 @@ from sklearn.metrics import (
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+from category_encoding import CategoryTable
+from feature_spec import DERIVED_FEATURES, FEATURE_NAMES, columnar_features
+from forest_engine import model_feature_importances
+from drift_monitor import DriftBaseline, category_counts
+from model_bundle import BUNDLE_PATH, save_bundle
+from peer_groups import GROUP_COLUMNS, PeerGroupTable
+from provider_store import ROLLING_KEYS, rolling_provider_columns, submitted_days
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
 # Configuration
 RANDOM_STATE = 42
 TEST_SIZE = 0.2
+DEFAULT_DATA_PATH = 'claims_fraud_dataset.csv'
+MODEL_PATH = 'fraud_detection_model.pkl'
+ENCODERS_PATH = 'label_encoders.pkl'
+FEATURES_PATH = 'feature_names.pkl'
+PEER_GROUPS_PATH = 'peer_groups.pkl'
+DRIFT_BASELINE_PATH = 'drift_baseline.pkl'
+
+# Incremental training defaults
+DEFAULT_NEW_TREES = 50
+
+# Default hyperparameters (search alternatives with tune_fraud_model.py)
+MODEL_PARAMS = {
+    'n_estimators': 200,         # Number of trees
+    'max_depth': 15,             # Maximum depth
+    'min_samples_split': 10,     # Minimum samples to split
+    'min_samples_leaf': 5,       # Minimum samples per leaf
+    'max_features': 'sqrt',      # Features to consider for split
+    'class_weight': 'balanced',  # Handle class imbalance
+    'random_state': RANDOM_STATE,
+    'n_jobs': -1                 # Use all CPU cores
+}
+
+# Histogram gradient boosting alternative (--engine hist_gradient_boosting)
+HGB_PARAMS = {
+    'max_iter': 200,             # Boosting rounds (trees)
+    'learning_rate': 0.1,
+    'max_leaf_nodes': 31,        # Leaves per tree
+    'min_samples_leaf': 20,
+    'l2_regularization': 0.0,
+    'class_weight': 'balanced',  # Handle class imbalance
+    'early_stopping': 'auto',    # On when training on more than 10k rows
+    'random_state': RANDOM_STATE
+}
+
+ENGINES = ('random_forest', 'hist_gradient_boosting')
+DEFAULT_ENGINE = 'random_forest'
+
+# Model inputs and their definitions live in feature_spec.py
+FEATURE_COLUMNS = list(FEATURE_NAMES)
+
+# Encoder name -> source column for each categorical feature
+CATEGORICAL_COLUMNS = {
+    'hospital': 'hospital_code',
+    'doctor': 'doctor_id',
+    'icd10': 'icd10_code',
+    'gender': 'patient_gender',
+    'care_class': 'care_class'
+}
+
+# Compact dtypes for streaming ingestion. Tariffs stay float64: rupiah amounts
+# in the millions lose whole rupiahs in float32, and the derived ratio and
+# difference must be computed exactly like prepare_features computes them.
+CHUNK_DTYPES = {
+    'hospital_code': 'category',
+    'doctor_id': 'category',
+    'icd10_code': 'category',
+    'patient_gender': 'category',
+    'care_class': 'category',
+    'patient_age': np.int16,
+    'num_procedures': np.int8,
+    'los_days': np.int16,
+    'tarif_inacbg': np.float64,
+    'tarif_rs': np.float64,
+    'tariff_difference': np.float64,
+    'tariff_ratio': np.float64,
+    'tariff_diff_percentage': np.float64,
+    'is_fraud': np.int8
+}
+
+class MemoryTracker:
+    """Records peak and current process memory after each pipeline stage"""
+
+    def __init__(self):
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        yield
+        self.stages.append({
+            'stage': name,
+            'seconds': time.perf_counter() - start,
+            'peak_rss_mb': peak_memory_mb(),
+            'current_rss_mb': current_memory_mb()
+        })
+
+    def report(self):
+        print("\n🧠 Memory by stage:")
+        print(f"{'Stage':<12} {'Time (s)':>10} {'Peak RSS (MB)':>15} {'Current RSS (MB)':>18}")
+        for s in self.stages:
+            peak = f"{s['peak_rss_mb']:.1f}" if s['peak_rss_mb'] is not None else 'n/a'
+            current = f"{s['current_rss_mb']:.1f}" if s['current_rss_mb'] is not None else 'n/a'
+            print(f"{s['stage']:<12} {s['seconds']:>10.2f} {peak:>15} {current:>18}")
+
+def peak_memory_mb():
+    """Peak resident set size of this process so far, in MB"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def current_memory_mb():
+    """Current resident set size in MB (Linux only)"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
 
 def load_and_prepare_data(csv_path='claims_fraud_dataset.csv'):
     """Load dataset and prepare features"""
@@ -33,8 +170,22 @@ def load_and_prepare_data(csv_path='claims_fraud_dataset.csv'):
 
     return df
 
-def engineer_features(df):
-    """Create additional features for better prediction"""
+def split_rows(y):
+    """(train_rows, test_rows) positions, the split train_test_split(X, y) makes"""
+    return train_test_split(
+        np.arange(len(y)),
+        test_size=TEST_SIZE,
+        random_state=RANDOM_STATE,
+        stratify=y  # Maintain class distribution
+    )
+
+def engineer_features(df, fit_rows=None):
+    """Create additional features for better prediction
+
+    Returns (df, encoders, peer_groups). The peer-group table is fitted on
+    the fit_rows positions only (all rows when None), so held-out claims are
+    not part of the statistics their own deviations are measured against.
+    """
 
     # Encode categorical variables
     le_hospital = LabelEncoder()
@@ -49,12 +200,15 @@ def engineer_features(df):
     df['gender_encoded'] = le_gender.fit_transform(df['patient_gender'])
     df['care_class_encoded'] = le_care_class.fit_transform(df['care_class'])
 
+    # Peer-group statistics per (icd10, care_class, hospital)
+    peer_groups = PeerGroupTable.fit(df if fit_rows is None else df.iloc[fit_rows])
+    add_peer_columns(df, peer_groups)
+
+    # 30/90-day provider history as of each claim's submitted_date
+    add_rolling_columns(df, rolling_provider_columns(df))
+
     # Additional engineered features
-    df['is_high_cost'] = (df['tariff_ratio'] > 1.3).astype(int)
-    df['is_long_stay'] = (df['los_days'] > 5).astype(int)
-    df['has_procedures'] = (df['num_procedures'] > 0).astype(int)
-    df['tariff_per_day'] = df['tarif_rs'] / df['los_days']
-    df['procedure_intensity'] = df['num_procedures'] / df['los_days']
+    add_engineered_columns(df)
 
     # Save encoders for later use
     encoders = {
@@ -64,65 +218,189 @@ def engineer_features(df):
         'gender': le_gender,
         'care_class': le_care_class
     }
+    # Serving encodes through CategoryTable, which cannot tell apart classes that normalize alike
+    for encoder in encoders.values():
+        CategoryTable.from_encoder(encoder, strict=True)
+
+    return df, encoders, peer_groups
+
+def add_peer_columns(df, peer_groups):
+    """Add the peer-group statistic columns that feature_spec reads, in place"""
+    for field, values in peer_groups.lookup_many(df).items():
+        df[field] = values
+    return df
+
+def add_rolling_columns(df, rolling):
+    """Add the rolling provider history columns that feature_spec reads, in place"""
+    for field, values in rolling.items():
+        df[field] = values
+    return df
 
-    return df, encoders
+def add_engineered_columns(df):
+    """Add the derived feature columns in place (columnar kernel of feature_spec)
+
+    Tariff ratio, difference and percentage are recomputed from the two
+    tariffs, exactly as serving computes them, replacing the rounded values
+    stored in the dataset.
+    """
+    features = columnar_features(df)
+    for name in DERIVED_FEATURES:
+        df[name] = features[:, FEATURE_NAMES.index(name)]
+    return df
+
+def scan_dataset(csv_paths, chunksize, holdout=False):
+    """First streaming pass: row count, categorical vocabularies, the peer-group
+    table and the rolling provider history of every row
+
+    Both need all rows at once (a window can reach into any earlier chunk),
+    so their columns are kept in compact dtypes (categorical codes, int16
+    stay, int32 day; tariffs stay float64) until they are computed. The rolling
+    columns are returned as float32 arrays in file order. With holdout, the
+    peer-group table is fitted on the split_rows training rows only.
+    """
+    total_rows = 0
+    fraud_rows = 0
+    vocabularies = {name: set() for name in CATEGORICAL_COLUMNS}
+    columns = list(CATEGORICAL_COLUMNS.values()) + ['tarif_rs', 'tarif_inacbg', 'los_days', 'is_fraud', 'submitted_date']
+    dtypes = {column: CHUNK_DTYPES.get(column, 'category') for column in columns}
+    categorical = list(dict.fromkeys(list(GROUP_COLUMNS) + list(ROLLING_KEYS.values())))
+    kept_columns = categorical + ['tarif_rs', 'tarif_inacbg', 'los_days']
+    kept_chunks = []
+    day_chunks = []
+    label_chunks = []
+
+    for path in csv_paths:
+        for chunk in pd.read_csv(path, usecols=columns, dtype=dtypes, chunksize=chunksize):
+            total_rows += len(chunk)
+            fraud_rows += int(chunk['is_fraud'].sum())
+            for name, column in CATEGORICAL_COLUMNS.items():
+                vocabularies[name].update(chunk[column].cat.categories)
+            kept_chunks.append(chunk[kept_columns])
+            day_chunks.append(submitted_days(chunk['submitted_date']).astype(np.int32))
+            label_chunks.append(chunk['is_fraud'].to_numpy())
+
+    data = {
+        column: (union_categoricals([c[column] for c in kept_chunks]) if column in categorical
+                 else np.concatenate([c[column].to_numpy() for c in kept_chunks]))
+        for column in kept_columns
+    }
+    days = np.concatenate(day_chunks)
+    labels = np.concatenate(label_chunks)
+    del kept_chunks, day_chunks, label_chunks
+    if holdout:
+        train_rows, _ = split_rows(labels)
+        peer_groups = PeerGroupTable.fit({column: data[column][train_rows] for column in kept_columns})
+    else:
+        peer_groups = PeerGroupTable.fit(data)
+    rolling = {field: values.astype(np.float32) for field, values in rolling_provider_columns(data, days).items()}
+
+    return total_rows, fraud_rows, vocabularies, peer_groups, rolling
+
+def encoders_from_vocabularies(vocabularies):
+    """Fit LabelEncoders from category sets, same codes as fit_transform on the full data"""
+    encoders = {}
+    for name, values in vocabularies.items():
+        encoder = LabelEncoder()
+        encoder.fit(np.array(sorted(values), dtype=object))
+        encoders[name] = encoder
+    return encoders
+
+def load_training_matrix_chunked(csv_paths, chunksize, tracker=None, holdout=False):
+    """Stream CSVs into a preallocated float32 training matrix
+
+    Reads with compact dtypes, engineers features per chunk and copies each
+    chunk straight into its slice of the final matrix, so peak memory is the
+    matrix plus one chunk regardless of dataset size. holdout is passed to
+    scan_dataset; split the matrix with split_rows(y) afterwards.
+    """
+    tracker = tracker or MemoryTracker()
+
+    print(f"📂 Scanning {len(csv_paths)} file(s) in chunks of {chunksize:,} rows...")
+    with tracker.stage('scan'):
+        total_rows, fraud_rows, vocabularies, peer_groups, rolling = scan_dataset(csv_paths, chunksize, holdout)
+        encoders = encoders_from_vocabularies(vocabularies)
+        tables = {name: CategoryTable.from_encoder(e, strict=True) for name, e in encoders.items()}
+
+    print(f"✅ Found {total_rows:,} records")
+    print(f"📊 Fraud rate: {fraud_rows / max(total_rows, 1) * 100:.2f}%")
+
+    with tracker.stage('allocate'):
+        X = np.empty((total_rows, len(FEATURE_COLUMNS)), dtype=np.float32)
+        y = np.empty(total_rows, dtype=np.int8)
+
+    print("⚙️  Engineering features per chunk...")
+    with tracker.stage('ingest'):
+        usecols = [c for c in CHUNK_DTYPES]
+        offset = 0
+        for path in csv_paths:
+            for chunk in pd.read_csv(path, usecols=usecols, dtype=CHUNK_DTYPES, chunksize=chunksize):
+                for name, column in CATEGORICAL_COLUMNS.items():
+                    chunk[f'{name}_encoded'] = tables[name].encode_many(chunk[column])[0].astype(np.int32)
+                add_peer_columns(chunk, peer_groups)
+
+                end = offset + len(chunk)
+                add_rolling_columns(chunk, {field: values[offset:end] for field, values in rolling.items()})
+                X[offset:end] = columnar_features(chunk)
+                y[offset:end] = chunk['is_fraud'].to_numpy()
+                offset = end
+
+    return X, y, encoders, peer_groups
+
+def extend_encoders(encoders, df):
+    """Code tables that also know the categories in df, without renumbering existing ones
+
+    Returns (tables, added): a CategoryTable per encoder with the unseen
+    categories appended, so every code the existing trees were trained on
+    keeps its meaning. The encoders themselves are left untouched:
+    LabelEncoder.transform needs sorted classes_, which appending breaks.
+    """
+    tables = {}
+    added = {}
+
+    for name, column in CATEGORICAL_COLUMNS.items():
+        tables[name], added[name] = CategoryTable.from_encoder(encoders[name]).extend(df[column])
+
+    return tables, added
+
+def encode_with_encoders(df, encoders, peer_groups):
+    """Add *_encoded, peer and rolling history columns using existing encoders (or code tables)
+    and peer-group table
+
+    The rolling history only sees the claims in df, so a new data window
+    starts without the history before it.
+    """
+    for name, column in CATEGORICAL_COLUMNS.items():
+        table = CategoryTable.from_encoder(encoders[name])
+        df[f'{name}_encoded'] = table.encode_many(df[column])[0]
+    add_peer_columns(df, peer_groups)
+    add_rolling_columns(df, rolling_provider_columns(df))
+    return add_engineered_columns(df)
 
 def select_features(df):
     """Select features for model training"""
 
-    feature_columns = [
-        # Tariff-related features (most important)
-        'tariff_ratio',
-        'tariff_diff_percentage',
-        'tariff_difference',
-        'tarif_inacbg',
-        'tarif_rs',
-        'tariff_per_day',
-
-        # Clinical features
-        'los_days',
-        'num_procedures',
-        'procedure_intensity',
-        'patient_age',
-
-        # Provider features
-        'provider_claims_count',
-        'provider_high_cost_rate',
-
-        # Categorical encoded
-        'hospital_encoded',
-        'doctor_encoded',
-        'icd10_encoded',
-        'gender_encoded',
-        'care_class_encoded',
-
-        # Binary flags
-        'is_high_cost',
-        'is_long_stay',
-        'has_procedures'
-    ]
+    feature_columns = list(FEATURE_COLUMNS)
 
     X = df[feature_columns]
     y = df['is_fraud']
 
     return X, y, feature_columns
 
-def train_model(X_train, y_train):
-    """Train Random Forest Classifier"""
+def train_model(X_train, y_train, params=None, oob_score=True, engine=DEFAULT_ENGINE):
+    """Train the classifier for the selected engine
 
-    print("\n🎯 Training Random Forest model...")
+    params: overrides for MODEL_PARAMS (or HGB_PARAMS)
+    oob_score: keep out-of-bag predictions so evaluation needs no refits (forest only)
+    engine: 'random_forest' or 'hist_gradient_boosting'
+    """
 
-    # Initialize model with optimized hyperparameters
-    model = RandomForestClassifier(
-        n_estimators=200,         # Number of trees
-        max_depth=15,             # Maximum depth
-        min_samples_split=10,     # Minimum samples to split
-        min_samples_leaf=5,       # Minimum samples per leaf
-        max_features='sqrt',      # Features to consider for split
-        class_weight='balanced',  # Handle class imbalance
-        random_state=RANDOM_STATE,
-        n_jobs=-1                 # Use all CPU cores
-    )
+    if engine == 'hist_gradient_boosting':
+        print("\n🎯 Training Histogram Gradient Boosting model...")
+        model = HistGradientBoostingClassifier(**{**HGB_PARAMS, **(params or {})})
+    else:
+        print("\n🎯 Training Random Forest model...")
+        # Initialize model with optimized hyperparameters
+        model = RandomForestClassifier(**{**MODEL_PARAMS, **(params or {})}, oob_score=oob_score)
 
     # Train model
     model.fit(X_train, y_train)
@@ -131,15 +409,76 @@ def train_model(X_train, y_train):
 
     return model
 
-def evaluate_model(model, X_train, y_train, X_test, y_test, feature_names):
-    """Evaluate model performance"""
+def update_model_incrementally(model, X_new, y_new, new_trees=DEFAULT_NEW_TREES, max_trees=None):
+    """Add trees trained on a new data window to an existing forest
+
+    Existing trees are kept as they are (warm_start). With max_trees set, the
+    oldest trees are retired so the forest never exceeds that size.
+
+    warm_start skips one seed per tree still in the forest, so after a
+    retirement it would hand the new trees the seeds of trees already
+    there. Every increment instead draws from its own seed stream, derived
+    from the number of trees ever grown (kept on the model as trees_grown_).
+    """
+    if len(np.unique(y_new)) < 2:
+        raise ValueError('New data window must contain both fraud and legitimate claims')
+
+    existing = len(model.estimators_)
+    print(f"\n🌱 Adding {new_trees} trees to the existing {existing}-tree forest...")
+
+    # Models saved before trees_grown_ existed have never been incrementally updated
+    grown = getattr(model, 'trees_grown_', existing)
+    random_state = int(np.random.SeedSequence([RANDOM_STATE, grown]).generate_state(1)[0])
+
+    # OOB indices of the old trees refer to their own training data, not this window
+    model.set_params(warm_start=True, n_estimators=existing + new_trees, oob_score=False,
+                     random_state=random_state)
+    model.fit(X_new, y_new)
+    model.trees_grown_ = grown + new_trees
+
+    if max_trees is not None and len(model.estimators_) > max_trees:
+        retired = len(model.estimators_) - max_trees
+        model.estimators_ = model.estimators_[retired:]
+        model.n_estimators = max_trees
+        print(f"♻️  Retired {retired} oldest trees")
+
+    model.set_params(warm_start=False)
+    for attribute in ('oob_score_', 'oob_decision_function_'):
+        if hasattr(model, attribute):
+            delattr(model, attribute)
+    print(f"✅ Forest now has {len(model.estimators_)} trees")
+
+    return model
+
+def oob_roc_auc(model, y_train):
+    """ROC-AUC of the out-of-bag predictions, None if the model has none"""
+    oob = getattr(model, 'oob_decision_function_', None)
+    if oob is None:
+        return None
+
+    # Rows that were in-bag for every tree have no OOB prediction: sklearn
+    # leaves them all zeros (NaN in older releases), never a probability row
+    scored = oob.sum(axis=1) > 0
+    return roc_auc_score(np.asarray(y_train)[scored], oob[scored, 1])
+
+def evaluate_model(model, X_train, y_train, X_test, y_test, feature_names, cv_folds=0):
+    """Evaluate model performance
+
+    cv_folds: 0 uses the forest's out-of-bag score (no refits); k > 0 runs
+    k-fold cross-validation, which refits the whole forest k times.
+    """
 
     print("\n📊 Model Evaluation")
     print("="*60)
 
-    # Cross-validation on training set
-    cv_scores = cross_val_score(model, X_train, y_train, cv=5, scoring='roc_auc')
-    print(f"\n🔄 Cross-Validation ROC-AUC: {cv_scores.mean():.4f} (+/- {cv_scores.std()*2:.4f})")
+    if cv_folds:
+        # Cross-validation on training set
+        cv_scores = cross_val_score(model, X_train, y_train, cv=cv_folds, scoring='roc_auc')
+        print(f"\n🔄 Cross-Validation ROC-AUC: {cv_scores.mean():.4f} (+/- {cv_scores.std()*2:.4f})")
+    else:
+        oob_auc = oob_roc_auc(model, y_train)
+        if oob_auc is not None:
+            print(f"\n🔄 Out-of-Bag ROC-AUC: {oob_auc:.4f} (accuracy: {model.oob_score_:.4f})")
 
     # Predictions
     y_pred_train = model.predict(X_train)
@@ -171,7 +510,7 @@ def evaluate_model(model, X_train, y_train, X_test, y_test, feature_names):
     # Feature Importance
     feature_importance = pd.DataFrame({
         'feature': feature_names,
-        'importance': model.feature_importances_
+        'importance': model_feature_importances(model)
     }).sort_values('importance', ascending=False)
 
     print("\n🔍 Top 10 Most Important Features:")
@@ -179,56 +518,192 @@ def evaluate_model(model, X_train, y_train, X_test, y_test, feature_names):
 
     return y_pred_proba_test, feature_importance
 
-def save_model_and_artifacts(model, encoders, feature_names, feature_importance):
+def build_training_metadata(model, mode, data_paths, y_train, y_test, y_pred_proba):
+    """Training run summary stored in the model bundle manifest"""
+    params = {
+        k: v for k, v in model.get_params().items()
+        if isinstance(v, (str, int, float, bool, type(None)))
+    }
+    oob_auc = oob_roc_auc(model, y_train)
+
+    return {
+        'mode': mode,
+        'engine': 'hist_gradient_boosting' if isinstance(model, HistGradientBoostingClassifier) else 'random_forest',
+        'data': list(data_paths),
+        'train_rows': int(len(y_train)),
+        'test_rows': int(len(y_test)),
+        'train_fraud_rate': float(np.mean(y_train)),
+        'test_roc_auc': float(roc_auc_score(y_test, y_pred_proba)),
+        'oob_roc_auc': float(oob_auc) if oob_auc is not None else None,
+        'params': params,
+        'trees_grown': getattr(model, 'trees_grown_', None),
+        'sklearn_version': sklearn.__version__
+    }
+
+def build_drift_baseline(X_train, feature_names, y_pred_proba, encoders):
+    """Serving drift baseline: training feature bins and held-out probabilities"""
+    return DriftBaseline.build(X_train, feature_names, y_pred_proba,
+                               category_counts(encoders, feature_names))
+
+def save_model_and_artifacts(model, encoders, peer_groups, feature_names, feature_importance,
+                             metadata=None, drift_baseline=None):
     """Save trained model and artifacts"""
 
     print("\n💾 Saving model and artifacts...")
 
     # Save model
-    with open('fraud_detection_model.pkl', 'wb') as f:
+    with open(MODEL_PATH, 'wb') as f:
         pickle.dump(model, f)
-    print("✅ Model saved: fraud_detection_model.pkl")
+    print(f"✅ Model saved: {MODEL_PATH}")
 
     # Save encoders
-    with open('label_encoders.pkl', 'wb') as f:
+    with open(ENCODERS_PATH, 'wb') as f:
         pickle.dump(encoders, f)
-    print("✅ Encoders saved: label_encoders.pkl")
+    print(f"✅ Encoders saved: {ENCODERS_PATH}")
+
+    # Save peer-group table
+    with open(PEER_GROUPS_PATH, 'wb') as f:
+        pickle.dump(peer_groups, f)
+    print(f"✅ Peer groups saved: {PEER_GROUPS_PATH} ({len(peer_groups)} groups)")
+
+    # Save drift baseline
+    if drift_baseline is not None:
+        with open(DRIFT_BASELINE_PATH, 'wb') as f:
+            pickle.dump(drift_baseline, f)
+        print(f"✅ Drift baseline saved: {DRIFT_BASELINE_PATH}")
 
     # Save feature names
-    with open('feature_names.pkl', 'wb') as f:
+    with open(FEATURES_PATH, 'wb') as f:
         pickle.dump(feature_names, f)
-    print("✅ Feature names saved: feature_names.pkl")
+    print(f"✅ Feature names saved: {FEATURES_PATH}")
 
     # Save feature importance
     feature_importance.to_csv('feature_importance.csv', index=False)
     print("✅ Feature importance saved: feature_importance.csv")
 
+    # Save the versioned, memory-mappable bundle used by ml_service
+    importances = feature_importance.set_index('feature').loc[list(feature_names), 'importance']
+    manifest = save_bundle(model, encoders, feature_names, BUNDLE_PATH, metadata,
+                           feature_importances=importances.to_numpy(), peer_groups=peer_groups,
+                           drift_baseline=drift_baseline)
+    print(f"✅ Model bundle saved: {BUNDLE_PATH} (version {manifest['model_version']})")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Train the fraud detection model')
+    parser.add_argument('--data', nargs='+', default=[DEFAULT_DATA_PATH],
+                        help='Training CSV file(s)')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='Stream the CSVs in chunks of this many rows '
+                             '(compact dtypes, preallocated float32 matrix)')
+    parser.add_argument('--engine', choices=ENGINES, default=DEFAULT_ENGINE,
+                        help='Model engine (same features, artifacts and serving path)')
+    parser.add_argument('--evaluation', choices=['oob', 'cv'], default='oob',
+                        help='oob: out-of-bag ROC-AUC (default, forest only), cv: 5-fold cross-validation')
+    parser.add_argument('--incremental', action='store_true',
+                        help=f'Add trees trained on --data to the existing {MODEL_PATH}')
+    parser.add_argument('--new-trees', type=int, default=DEFAULT_NEW_TREES,
+                        help='Trees to add in incremental mode')
+    parser.add_argument('--max-trees', type=int, default=None,
+                        help='Retire the oldest trees beyond this forest size (incremental mode)')
+    return parser.parse_args()
+
+def incremental_main(args):
+    """Incremental pipeline: extend encoders and add trees for a new data window"""
+
+    print("🚀 Fraud Detection Incremental Training")
+    print("="*60)
+
+    with open(MODEL_PATH, 'rb') as f:
+        model = pickle.load(f)
+    with open(ENCODERS_PATH, 'rb') as f:
+        encoders = pickle.load(f)
+    with open(PEER_GROUPS_PATH, 'rb') as f:
+        peer_groups = pickle.load(f)
+    if not isinstance(model, RandomForestClassifier):
+        raise ValueError(f'Incremental training needs a random_forest model, {MODEL_PATH} '
+                         f'holds a {type(model).__name__}')
+    print(f"✅ Loaded {len(model.estimators_)}-tree model from {MODEL_PATH}")
+
+    # 1. Load the new data window
+    df = pd.concat([load_and_prepare_data(path) for path in args.data], ignore_index=True)
+
+    # 2. Extend the code tables with new categories, then encode with them.
+    # The peer-group table is kept as is: the existing trees split on deviations from it
+    encoders, added = extend_encoders(encoders, df)
+    for name, count in added.items():
+        if count:
+            print(f"➕ {name}: {count} new categories")
+    df = encode_with_encoders(df, encoders, peer_groups)
+
+    # 3. Select features and hold out part of the window for evaluation
+    X, y, feature_names = select_features(df)
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y,
+        test_size=TEST_SIZE,
+        random_state=RANDOM_STATE,
+        stratify=y
+    )
+
+    # 4. Grow the forest on the new window only
+    model = update_model_incrementally(model, X_train, y_train, args.new_trees, args.max_trees)
+
+    # 5. Evaluate on the held-out part of the window
+    y_pred_proba, feature_importance = evaluate_model(
+        model, X_train, y_train, X_test, y_test, feature_names
+    )
+
+    # 6. Save artifacts
+    metadata = build_training_metadata(model, 'incremental', args.data, y_train, y_test, y_pred_proba)
+    drift_baseline = build_drift_baseline(X_train, feature_names, y_pred_proba, encoders)
+    save_model_and_artifacts(model, encoders, peer_groups, feature_names, feature_importance,
+                             metadata, drift_baseline)
+
+    print("\n✅ Incremental update completed successfully!")
+
 def main():
     """Main training pipeline"""
 
+    args = parse_args()
+    if args.incremental:
+        return incremental_main(args)
+
+    tracker = MemoryTracker()
+
     print("🚀 Fraud Detection Model Training Pipeline")
     print("="*60)
 
-    # 1. Load data
-    df = load_and_prepare_data()
+    if args.chunksize:
+        # 1-3. Stream, engineer and select features chunk by chunk
+        X, y, encoders, peer_groups = load_training_matrix_chunked(args.data, args.chunksize, tracker,
+                                                                   holdout=True)
+        feature_names = list(FEATURE_COLUMNS)
+    else:
+        with tracker.stage('load'):
+            # 1. Load data
+            df = pd.concat([load_and_prepare_data(path) for path in args.data], ignore_index=True)
 
-    # 2. Engineer features
-    df, encoders = engineer_features(df)
+        with tracker.stage('engineer'):
+            # 2. Engineer features, peer groups from the training rows only
+            df, encoders, peer_groups = engineer_features(df, split_rows(df['is_fraud'])[0])
 
-    # 3. Select features
-    X, y, feature_names = select_features(df)
+            # 3. Select features
+            X, y, feature_names = select_features(df)
 
     print(f"\n📊 Dataset shape: {X.shape}")
     print(f"Features: {len(feature_names)}")
     print(f"Samples: {len(X)}")
 
     # 4. Split data
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y,
-        test_size=TEST_SIZE,
-        random_state=RANDOM_STATE,
-        stratify=y  # Maintain class distribution
-    )
+    with tracker.stage('split'):
+        # The same rows the peer-group table was fitted on
+        train_rows, test_rows = split_rows(y)
+        if args.chunksize:
+            X_train, X_test, y_train, y_test = X[train_rows], X[test_rows], y[train_rows], y[test_rows]
+            # The split copies are all training needs from here on
+            del X, y
+        else:
+            X_train, X_test = X.iloc[train_rows], X.iloc[test_rows]
+            y_train, y_test = y.iloc[train_rows], y.iloc[test_rows]
 
     print(f"\nTrain set: {len(X_train)} samples")
     print(f"Test set: {len(X_test)} samples")
@@ -236,15 +711,23 @@ def main():
     print(f"Test fraud rate: {y_test.mean()*100:.2f}%")
 
     # 5. Train model
-    model = train_model(X_train, y_train)
+    with tracker.stage('train'):
+        model = train_model(X_train, y_train, engine=args.engine)
 
     # 6. Evaluate model
-    y_pred_proba, feature_importance = evaluate_model(
-        model, X_train, y_train, X_test, y_test, feature_names
-    )
+    with tracker.stage('evaluate'):
+        y_pred_proba, feature_importance = evaluate_model(
+            model, X_train, y_train, X_test, y_test, feature_names,
+            cv_folds=5 if args.evaluation == 'cv' else 0
+        )
 
     # 7. Save artifacts
-    save_model_and_artifacts(model, encoders, feature_names, feature_importance)
+    metadata = build_training_metadata(model, 'full', args.data, y_train, y_test, y_pred_proba)
+    drift_baseline = build_drift_baseline(X_train, feature_names, y_pred_proba, encoders)
+    save_model_and_artifacts(model, encoders, peer_groups, feature_names, feature_importance,
+                             metadata, drift_baseline)
+
+    tracker.report()
 
     print("\n✅ Training pipeline completed successfully!")
     print("\nYou can now use the model for fraud detection in production.")
@@ -0,0 +1,240 @@
+"""
+Successive-halving hyperparameter search for the fraud detection forest
+Candidates are scored by out-of-bag ROC-AUC (no cross-validation refits) and
+single-claim latency; the training matrix is memory-mapped and shared by
+all worker processes instead of being pickled to each one
+
+Run: python tune_fraud_model.py
+     python tune_fraud_model.py --data generated_claims/*.csv --chunksize 500000 --workers 8
+"""
+
+import argparse
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import train_test_split
+
+from forest_engine import CompiledForest
+from train_fraud_model import (
+    DEFAULT_DATA_PATH,
+    MODEL_PARAMS,
+    RANDOM_STATE,
+    TEST_SIZE,
+    engineer_features,
+    load_and_prepare_data,
+    load_training_matrix_chunked,
+    oob_roc_auc,
+    select_features
+)
+
+# Search space
+PARAM_GRID = {
+    'n_estimators': [50, 100, 200, 400],
+    'max_depth': [8, 12, 15, None],
+    'min_samples_leaf': [1, 5, 10, 20]
+}
+
+# Successive halving: keep 1/ETA candidates and multiply rows by ETA each round
+ETA = 3
+MIN_RESOURCES = 500
+LATENCY_SAMPLES = 200
+REPORT_PATH = 'tuning_report.json'
+
+# Memory-mapped arrays, opened once per worker process
+_shared = {}
+
+
+def _init_worker(data_dir):
+    """Open the shared training matrix read-only in this worker"""
+    for name in ('X_train', 'y_train', 'X_test', 'y_test'):
+        _shared[name] = np.load(os.path.join(data_dir, f'{name}.npy'), mmap_mode='r')
+
+
+def _evaluate_candidate(params, n_rows):
+    """Fit one candidate on the first n_rows of the shared (pre-shuffled) matrix"""
+    # A leading slice of a memmap is a view: nothing is copied into the worker
+    X = _shared['X_train'][:n_rows]
+    y = _shared['y_train'][:n_rows]
+
+    model = RandomForestClassifier(
+        **{**MODEL_PARAMS, **params, 'n_jobs': 1},
+        oob_score=True
+    )
+
+    start = time.perf_counter()
+    model.fit(X, y)
+    fit_seconds = time.perf_counter() - start
+
+    X_test = np.asarray(_shared['X_test'])
+    y_test = np.asarray(_shared['y_test'])
+
+    forest = CompiledForest.from_sklearn(model)
+    timings = []
+    for row in X_test[:LATENCY_SAMPLES]:
+        start = time.perf_counter()
+        forest.predict(row)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    return {
+        'params': params,
+        'n_rows': int(n_rows),
+        'fit_seconds': fit_seconds,
+        'oob_auc': oob_roc_auc(model, y),
+        'test_auc': roc_auc_score(y_test, forest.predict(X_test)[0]),
+        'latency_p50_ms': float(np.percentile(timings, 50)),
+        'latency_p99_ms': float(np.percentile(timings, 99)),
+        'total_nodes': int(sum(e.tree_.node_count for e in model.estimators_))
+    }
+
+
+def build_candidates(max_candidates=None, seed=RANDOM_STATE):
+    """All grid combinations, optionally a random subset of them"""
+    keys = list(PARAM_GRID)
+    candidates = [dict(zip(keys, values)) for values in itertools.product(*PARAM_GRID.values())]
+
+    if max_candidates and max_candidates < len(candidates):
+        rng = np.random.default_rng(seed)
+        picked = rng.choice(len(candidates), max_candidates, replace=False)
+        candidates = [candidates[i] for i in sorted(picked)]
+
+    return candidates
+
+
+def share_training_data(X_train, y_train, X_test, y_test, data_dir):
+    """Shuffle once and write the matrices as .npy files for memory-mapping"""
+    order = np.random.default_rng(RANDOM_STATE).permutation(len(X_train))
+    arrays = {
+        'X_train': np.ascontiguousarray(np.asarray(X_train, dtype=np.float32)[order]),
+        'y_train': np.asarray(y_train)[order],
+        'X_test': np.ascontiguousarray(np.asarray(X_test, dtype=np.float32)),
+        'y_test': np.asarray(y_test)
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(data_dir, f'{name}.npy'), array)
+
+
+def successive_halving(candidates, total_rows, workers, data_dir,
+                       min_resources=MIN_RESOURCES, eta=ETA):
+    """Run successive halving over training rows, returning every round's results"""
+    rounds = []
+    n_rows = min(min_resources, total_rows)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(data_dir,)) as pool:
+        while True:
+            print(f"\n🔁 Round {len(rounds) + 1}: {len(candidates)} candidates on {n_rows:,} rows")
+            start = time.perf_counter()
+            results = list(pool.map(_evaluate_candidate, candidates, [n_rows] * len(candidates)))
+            print(f"   done in {time.perf_counter() - start:.1f}s")
+
+            results.sort(key=lambda r: -(r['oob_auc'] or 0.0))
+            rounds.append({
+                'n_rows': n_rows,
+                'pareto_front': pareto_front(results),
+                'results': results
+            })
+
+            for r in results[:3]:
+                print(f"   OOB AUC {r['oob_auc']:.4f}  p99 {r['latency_p99_ms']:.3f} ms  {r['params']}")
+
+            if len(results) <= 1 or n_rows >= total_rows:
+                break
+
+            candidates = [r['params'] for r in results[:max(1, len(results) // eta)]]
+            n_rows = min(n_rows * eta, total_rows)
+
+    return rounds
+
+
+def pareto_front(results):
+    """Configurations no other result beats on both AUC and p99 latency"""
+    front = []
+    for r in sorted(results, key=lambda r: (r['latency_p99_ms'], -(r['oob_auc'] or 0.0))):
+        if not front or (r['oob_auc'] or 0.0) > (front[-1]['oob_auc'] or 0.0):
+            front.append(r)
+    return front
+
+
+def load_data(args):
+    if args.chunksize:
+        X, y, _, _ = load_training_matrix_chunked(args.data, args.chunksize)
+    else:
+        df = pd.concat([load_and_prepare_data(path) for path in args.data], ignore_index=True)
+        df, _, _ = engineer_features(df)
+        X, y, _ = select_features(df)
+    return X, y
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Successive-halving search for the fraud model')
+    parser.add_argument('--data', nargs='+', default=[DEFAULT_DATA_PATH], help='Training CSV file(s)')
+    parser.add_argument('--chunksize', type=int, default=None, help='Stream CSVs in chunks')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Parallel processes')
+    parser.add_argument('--max-candidates', type=int, default=None,
+                        help='Random subset of the parameter grid to start from')
+    parser.add_argument('--min-resources', type=int, default=MIN_RESOURCES,
+                        help='Training rows in the first round')
+    parser.add_argument('--eta', type=int, default=ETA, help='Halving factor')
+    parser.add_argument('--report', default=REPORT_PATH, help='Output JSON report')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    print("🚀 Fraud Model Hyperparameter Search (successive halving)")
+    print("="*60)
+
+    X, y = load_data(args)
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=TEST_SIZE, random_state=RANDOM_STATE, stratify=y
+    )
+    del X, y
+
+    candidates = build_candidates(args.max_candidates)
+    data_dir = tempfile.mkdtemp(prefix='fraud_tuning_')
+    started = time.perf_counter()
+
+    try:
+        share_training_data(X_train, y_train, X_test, y_test, data_dir)
+        total_rows = len(X_train)
+        del X_train, y_train, X_test, y_test
+
+        rounds = successive_halving(candidates, total_rows, args.workers, data_dir,
+                                    args.min_resources, args.eta)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'data': args.data,
+        'train_rows': total_rows,
+        'workers': args.workers,
+        'eta': args.eta,
+        'elapsed_seconds': time.perf_counter() - started,
+        'param_grid': PARAM_GRID,
+        'best': rounds[-1]['results'][0],
+        'rounds': rounds
+    }
+
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    best = report['best']
+    print(f"\n🏆 Best: {best['params']}")
+    print(f"   OOB AUC {best['oob_auc']:.4f}, test AUC {best['test_auc']:.4f}, "
+          f"p99 {best['latency_p99_ms']:.3f} ms, fit {best['fit_seconds']:.1f}s")
+    print(f"\n✅ Report saved: {args.report}")
+
+
+if __name__ == '__main__':
+    main()